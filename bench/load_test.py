@@ -0,0 +1,98 @@
+# bench/load_test.py
+"""
+Load test for the local query API (src/api.py).
+
+Discovers real county names / station ids from the running server, then fires a
+mix of county, station, top-N and bounding-box requests from N keep-alive
+connections and reports latency percentiles and throughput.
+
+    python src/api.py &                          # start the server first
+    python bench/load_test.py --requests 20000 --concurrency 16
+    python bench/load_test.py --etag             # revalidate with If-None-Match (304s)
+"""
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit, quote
+
+import numpy as np
+
+def get(conn, path, headers=None):
+    conn.request("GET", path, headers=headers or {})
+    resp = conn.getresponse()
+    body = resp.read()
+    return resp.status, resp.getheader("ETag"), body
+
+def request_mix(host, port, seed: int = 0) -> list:
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    counties = [c["county"] for c in json.loads(get(conn, "/counties")[2])["results"] if c["county"]]
+    top = json.loads(get(conn, "/top?n=500")[2])["results"]
+    conn.close()
+    rng = random.Random(seed)
+    paths = ["/counties", "/top?metric=likely_busy_score&n=25", "/top?metric=dcfc_ports&n=200"]
+    paths += [f"/counties/{quote(c)}" for c in counties]
+    paths += [f"/stations?county={quote(c)}&limit=50" for c in counties]
+    paths += [f"/top?n=10&county={quote(c)}" for c in counties]
+    paths += [f"/stations/{s['id']}" for s in top]
+    for s in top[:100]:
+        if s["latitude"] is None:
+            continue
+        d = rng.uniform(0.05, 0.5)
+        paths.append(f"/bbox?min_lat={s['latitude'] - d:.4f}&min_lon={s['longitude'] - d:.4f}"
+                     f"&max_lat={s['latitude'] + d:.4f}&max_lon={s['longitude'] + d:.4f}&limit=200")
+    return paths
+
+def worker(host, port, paths, n, use_etag, seed, out):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    etags, lat, status = {}, [], {}
+    for _ in range(n):
+        path = rng.choice(paths)
+        headers = {"If-None-Match": etags[path]} if use_etag and path in etags else None
+        t0 = time.perf_counter()
+        code, etag, _ = get(conn, path, headers)
+        lat.append(time.perf_counter() - t0)
+        status[code] = status.get(code, 0) + 1
+        if etag:
+            etags[path] = etag
+    conn.close()
+    out.append((lat, status))
+
+def main():
+    ap = argparse.ArgumentParser(description="Load-test the local query API")
+    ap.add_argument("--url", default="http://127.0.0.1:8765")
+    ap.add_argument("--requests", type=int, default=5000, help="total requests")
+    ap.add_argument("--concurrency", type=int, default=8, help="parallel keep-alive connections")
+    ap.add_argument("--etag", action="store_true", help="send If-None-Match after the first response")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    u = urlsplit(args.url)
+    paths = request_mix(u.hostname, u.port or 80, args.seed)
+    per = max(args.requests // args.concurrency, 1)
+    out = []
+    threads = [threading.Thread(target=worker, args=(u.hostname, u.port or 80, paths, per, args.etag, args.seed + i, out))
+               for i in range(args.concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    lat = np.concatenate([np.asarray(l) for l, _ in out]) * 1000
+    status = {}
+    for _, s in out:
+        for k, v in s.items():
+            status[k] = status.get(k, 0) + v
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+    print(f"{len(lat)} requests over {len(paths)} distinct paths, {args.concurrency} connections, {wall:.2f}s")
+    print(f"throughput: {len(lat) / wall:,.0f} req/s")
+    print(f"latency ms: p50 {p50:.2f}  p90 {p90:.2f}  p99 {p99:.2f}  max {lat.max():.2f}")
+    print(f"status: {dict(sorted(status.items()))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# bench/run_bench.py
+"""
+Offline benchmark suite: time and memory-profile every pipeline stage on
+synthetic AFDC-shaped data and compare against a stored baseline.
+
+    python bench/run_bench.py                          # 20k + 100k rows
+    python bench/run_bench.py --scales 20k 1m 10m
+    python bench/run_bench.py --save-baseline          # store results as the new baseline
+    python bench/run_bench.py --tolerance 0.25         # fail if >25% slower / bigger
+
+Time is the best of --repeat runs; memory is the tracemalloc peak of one extra
+run (numpy/pandas buffers included). Results go to bench/results/latest.json
+(ignored); --save-baseline writes bench/baseline.json, which is meant to be committed.
+Without a baseline (and without --save-baseline) the run exits non-zero.
+"""
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+from datetime import datetime, timezone
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "src" / "extract"), str(ROOT / "src" / "transform")]
+
+import numpy as np
+import pandas as pd
+
+import synth_stations as synth
+from afdc_fetch import to_flat_csv
+from make_kpis import clean_stations, make_ports_table, make_county_summary, make_region_summary
+from make_county_supply import derive_county_supply, join_ev_counts, compute_metrics
+from make_station_busy import score_stations, score_stations_gravity
+from make_insights import build_insights
+from opportunity_insights import build_opportunities
+from kpi_cube import build_cube
+
+BENCH_DIR = ROOT / "bench"
+RESULTS_OUT = BENCH_DIR / "results" / "latest.json"
+BASELINE = BENCH_DIR / "baseline.json"   # committed; results/ is per-run output
+
+SCALES = {"20k": 20_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+# to_flat_csv needs one Python dict per station; skip it above this size unless asked
+MAX_DICT_ROWS = 1_000_000
+# ignore ratios on measurements too small to be stable
+NOISE_FLOOR = {"seconds": 0.01, "peak_mb": 1.0}
+
+def measure(fn, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_mb": round(peak / 2**20, 3)}
+
+def stage_cases(n: int, tmpdir: Path, max_dict_rows: int):
+    """Yield (stage name, rows in, zero-arg callable) with inputs prepared outside timing."""
+    typed = synth.make_stations(n)
+    raw = synth.to_raw_frame(typed)
+    xwalk = synth.make_zip_xwalk()
+    ev = synth.make_ev_counts()
+
+    if n <= max_dict_rows:
+        records = synth.to_afdc_records(typed)
+        out_csv = tmpdir / "afdc_stations.csv"
+        yield "to_flat_csv", n, lambda: to_flat_csv(records, out_csv)
+        del records
+    del typed
+
+    yield "clean_stations", n, lambda: clean_stations(raw.copy())
+    stations = clean_stations(raw.copy())
+    del raw
+
+    county = make_county_summary(stations)
+    region = make_region_summary(stations)
+    supply = derive_county_supply(stations, xwalk)
+    merged = join_ev_counts(supply, ev)
+
+    yield "make_ports_table", len(stations), lambda: make_ports_table(stations)
+    yield "make_county_summary", len(stations), lambda: make_county_summary(stations)
+    yield "make_region_summary", len(stations), lambda: make_region_summary(stations)
+    yield "derive_county_supply", len(stations), lambda: derive_county_supply(stations, xwalk)
+    yield "compute_metrics", len(merged), lambda: compute_metrics(merged)
+    yield "score_stations", len(stations), lambda: score_stations(stations, xwalk)
+    yield "score_stations_gravity", len(stations), lambda: score_stations_gravity(stations, xwalk, ev)
+    yield "build_insights", len(county), lambda: build_insights(county)
+    yield "build_opportunities", len(stations), lambda: build_opportunities(stations, region)
+    yield "build_kpi_cube", len(stations), lambda: build_cube(stations, ev)
+
+def run(scales, repeat: int, max_dict_rows: int) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in scales:
+            n = SCALES[label]
+            for stage, rows_in, fn in stage_cases(n, Path(tmp), max_dict_rows):
+                m = measure(fn, repeat)
+                results.append({"scale": label, "rows": n, "stage": stage, "rows_in": rows_in, **m})
+                print(f"{label:>5} {stage:<22} {m['seconds']:>9.4f}s {m['peak_mb']:>10.1f} MB")
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Return regressions: entries slower or bigger than baseline by more than `tolerance`."""
+    base = {(r["scale"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nvs baseline ({baseline['meta'].get('created')}), tolerance {tolerance:.0%}:")
+    for r in current["results"]:
+        b = base.get((r["scale"], r["stage"]))
+        if b is None:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            ratio = r[metric] / b[metric] if b[metric] else 1.0
+            flag = ratio > 1 + tolerance and r[metric] > NOISE_FLOOR[metric]
+            if flag:
+                regressions.append({"scale": r["scale"], "stage": r["stage"], "metric": metric,
+                                    "baseline": b[metric], "current": r[metric], "ratio": round(ratio, 3)})
+            print(f"{r['scale']:>5} {r['stage']:<22} {metric:<8} x{ratio:6.2f}{'  REGRESSION' if flag else ''}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic stations")
+    ap.add_argument("--scales", nargs="+", default=["20k", "100k"], choices=list(SCALES))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--max-dict-rows", type=int, default=MAX_DICT_ROWS,
+                    help="skip to_flat_csv above this many rows (it needs one dict per station)")
+    ap.add_argument("--out", type=Path, default=RESULTS_OUT)
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    args = ap.parse_args()
+
+    current = run(args.scales, args.repeat, args.max_dict_rows)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(current, indent=2))
+    print(f"\nSaved: {args.out}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(current, indent=2))
+        print(f"Saved baseline: {args.baseline}")
+        return
+    if not args.baseline.exists():
+        raise SystemExit(f"ERROR: no baseline at {args.baseline}; nothing to compare against. "
+                         "Run with --save-baseline (and commit it) first")
+    regressions = compare(current, json.loads(args.baseline.read_text()), args.tolerance)
+    current["regressions"] = regressions
+    args.out.write_text(json.dumps(current, indent=2))
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s) vs baseline")
+
+if __name__ == "__main__":
+    main()
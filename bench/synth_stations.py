@@ -0,0 +1,124 @@
+# bench/synth_stations.py
+# Synthetic AFDC-shaped station generator for offline benchmarks.
+# Produces CSV_COLUMNS / KEEP_COLS-shaped data with realistic-looking mixes of
+# networks, counties, port counts and connector strings, at any scale.
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "transform"))   # reference.py
+from reference import FIPS_TO_NAME
+
+NETWORKS = {
+    "ChargePoint Network": 0.42, "Non-Networked": 0.20, "Tesla": 0.09, "SHELL_RECHARGE": 0.06,
+    "Blink Network": 0.04, "EVGO": 0.04, "Electrify America": 0.03, "POWERFLEX": 0.03,
+    "Volta": 0.03, "EV Connect": 0.02, "FLO": 0.02, "AMPUP": 0.02,
+}
+CONNECTORS_L2 = {
+    "J1772": 0.80, "J1772,TESLA": 0.08, "TESLA": 0.06, "J1772,NEMA520": 0.04, "NEMA520": 0.02,
+}
+CONNECTORS_DCFC = {
+    "CHADEMO,J1772,J1772COMBO": 0.40, "J1772COMBO": 0.22, "TESLA": 0.18,
+    "CHADEMO,J1772COMBO": 0.12, "J1772COMBO,NACS": 0.05, "CHADEMO,J1772": 0.03,
+}
+FACILITY_TYPES = {
+    "CAR_DEALER": 0.18, "PARKING_LOT": 0.14, "SHOPPING_CENTER": 0.10, "HOTEL": 0.09,
+    "OFFICE_BLDG": 0.09, "MUNI_GOV": 0.08, "PARKING_GARAGE": 0.08, "UTILITY": 0.05,
+    "COLLEGE_CAMPUS": 0.05, "GROCERY": 0.05, "AIRPORT": 0.02, "": 0.07,
+}
+ACCESS_TIMES = {
+    "24 hours daily": 0.45, "Dealership business hours": 0.15, "24 hours daily; pay lot": 0.10,
+    "Fleet use only": 0.05, "8am-5pm daily": 0.05, "5:30am-9pm; pay lot": 0.05,
+    "MON: 7:00am-6:00pm; TUE: 7:00am-6:00pm; WED: 7:00am-6:00pm; THU: 7:00am-6:00pm; FRI: 7:00am-6:00pm": 0.05,
+    "24 hours daily; parking permit required": 0.05, "": 0.05,
+}
+# rough county size skew (Zipf-like): big metros get most stations
+_COUNTY_NAMES = list(FIPS_TO_NAME.values())
+_COUNTY_FIPS = list(FIPS_TO_NAME)
+ZIPS_PER_COUNTY = 40
+CITIES_PER_COUNTY = 12
+
+def _choice(rng, table: dict, n: int) -> np.ndarray:
+    keys = np.array(list(table), dtype=object)
+    p = np.array(list(table.values()), dtype=float)
+    return keys[rng.choice(len(keys), size=n, p=p / p.sum())]
+
+def county_weights() -> np.ndarray:
+    w = 1.0 / np.arange(1, len(_COUNTY_NAMES) + 1) ** 0.9
+    return w / w.sum()
+
+def make_stations(n: int, seed: int = 0) -> pd.DataFrame:
+    """Typed station frame in CSV_COLUMNS order (ints, floats, strings, NaN gaps)."""
+    rng = np.random.default_rng(seed)
+    county_idx = rng.choice(len(_COUNTY_NAMES), size=n, p=county_weights())
+
+    # Level 2: mostly 1-4 ports with a long tail; DCFC: ~70% none, else small banks
+    l2 = np.minimum(rng.geometric(0.45, size=n), 60)
+    has_dc = rng.random(n) < 0.30
+    dc = np.where(has_dc, np.minimum(rng.geometric(0.35, size=n), 40), 0)
+    l2 = np.where(has_dc & (rng.random(n) < 0.5), 0, l2)
+
+    connectors = np.where(has_dc, _choice(rng, CONNECTORS_DCFC, n), _choice(rng, CONNECTORS_L2, n))
+
+    # county centroids spread over a CA-like box, stations jittered around them
+    c_lat = np.random.default_rng(1).uniform(32.7, 41.8, len(_COUNTY_NAMES))
+    c_lon = np.random.default_rng(2).uniform(-124.0, -114.8, len(_COUNTY_NAMES))
+    lat = c_lat[county_idx] + rng.normal(0, 0.25, n)
+    lon = c_lon[county_idx] + rng.normal(0, 0.25, n)
+
+    names = np.array(_COUNTY_NAMES, dtype=object)
+    county = np.char.add(names[county_idx].astype(str), " County").astype(object)
+    county[rng.random(n) < 0.15] = None                      # AFDC often omits county
+    city_k = rng.integers(0, CITIES_PER_COUNTY, n)
+    city = np.char.add(np.char.add(names[county_idx].astype(str), " City "), city_k.astype(str)).astype(object)
+    zips = (90000 + county_idx * ZIPS_PER_COUNTY + rng.integers(0, ZIPS_PER_COUNTY, n)).astype(str)
+
+    df = pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "station_name": np.char.add("Station ", np.arange(1, n + 1).astype(str)).astype(object),
+        "status_code": "E",
+        "ev_network": _choice(rng, NETWORKS, n),
+        "ev_network_web": None,
+        "city": city,
+        "county": county,
+        "state": "CA",
+        "zip": zips.astype(object),
+        "latitude": lat,
+        "longitude": lon,
+        "ev_dc_fast_num": np.where(dc > 0, dc, np.nan),       # AFDC sends null, not 0
+        "ev_level2_evse_num": np.where(l2 > 0, l2, np.nan),
+        "ev_connector_types": connectors,
+        "access_days_time": _choice(rng, ACCESS_TIMES, n),
+        "facility_type": _choice(rng, FACILITY_TYPES, n),
+        "station_phone": None,
+    })
+    for c in ["access_days_time", "facility_type"]:
+        df.loc[df[c] == "", c] = None
+    return df
+
+def to_raw_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """What make_kpis.load_raw returns: every column as strings, NaN for blanks."""
+    raw = df.astype(object).astype(str)
+    return raw.where(df.notna(), np.nan)
+
+def to_afdc_records(df: pd.DataFrame) -> list:
+    """AFDC JSON-style dicts (connector types as lists) for to_flat_csv."""
+    records = df.to_dict("records")
+    for r in records:
+        ct = r["ev_connector_types"]
+        r["ev_connector_types"] = ct.split(",") if isinstance(ct, str) else []
+    return records
+
+def make_zip_xwalk() -> pd.DataFrame:
+    zips, fips = [], []
+    for i, f in enumerate(_COUNTY_FIPS):
+        for k in range(ZIPS_PER_COUNTY):
+            zips.append(str(90000 + i * ZIPS_PER_COUNTY + k))
+            fips.append(f)
+    return pd.DataFrame({"zip": zips, "county_fips": fips}).astype("string")
+
+def make_ev_counts(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    counts = (county_weights() * 1_500_000 * rng.uniform(0.6, 1.4, len(_COUNTY_NAMES))).astype(int)
+    return pd.DataFrame({"county": _COUNTY_NAMES, "ev_count": counts})
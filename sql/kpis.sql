@@ -1,24 +1,34 @@
+-- Run with: python src/transform/sql_engine.py sql/kpis.sql
+-- (loads data/processed/stations_ca.parquet into the table stations_ca; results go to
+-- data/processed/sql/<annotated path> unless --replace)
+-- Ties are broken like the pandas outputs: county name, missing county last.
+
 -- Total ports by county (Level 2 + DCFC)
+-- output: data/processed/ev_summary_by_county.csv
 SELECT
   county,
   SUM(ev_level2_evse_num) AS level2_ports,
   SUM(ev_dc_fast_num)     AS dcfc_ports,
   SUM(ev_level2_evse_num + ev_dc_fast_num) AS ports_total,
   CASE
-    WHEN SUM(ev_level2_evse_num + ev_dc_fast_num) = 0 THEN 0
-    ELSE CAST(SUM(ev_dc_fast_num) AS FLOAT) / SUM(ev_level2_evse_num + ev_dc_fast_num)
-  END AS dcfc_share
-FROM stations_ca   -- (Assume you’ve imported data/processed/stations_ca.csv into a table)
+    WHEN SUM(ev_level2_evse_num + ev_dc_fast_num) = 0 THEN 0.0
+    ELSE ROUND(CAST(SUM(ev_dc_fast_num) AS FLOAT) / SUM(ev_level2_evse_num + ev_dc_fast_num), 4)
+  END AS dcfc_share,
+  -- ports x share of the week open to the public (availability.py)
+  ROUND(SUM((ev_level2_evse_num + ev_dc_fast_num) * availability_share(access_days_time)), 1) AS effective_ports
+FROM stations_ca
 GROUP BY county
-ORDER BY ports_total DESC;
+ORDER BY ports_total DESC, county IS NULL, county;
 
 -- Top 10 by DCFC share (filtering out tiny counties with 0 total)
+-- output: data/processed/insights/top10_dcfc_share.csv
 WITH summary AS (
   SELECT
     county,
     SUM(ev_level2_evse_num) AS level2_ports,
     SUM(ev_dc_fast_num)     AS dcfc_ports,
-    SUM(ev_level2_evse_num + ev_dc_fast_num) AS ports_total
+    SUM(ev_level2_evse_num + ev_dc_fast_num) AS ports_total,
+    ROUND(SUM((ev_level2_evse_num + ev_dc_fast_num) * availability_share(access_days_time)), 1) AS effective_ports
   FROM stations_ca
   GROUP BY county
 )
@@ -27,8 +37,9 @@ SELECT
   level2_ports,
   dcfc_ports,
   ports_total,
-  CAST(dcfc_ports AS FLOAT) / NULLIF(ports_total, 0) AS dcfc_share
+  ROUND(CAST(dcfc_ports AS FLOAT) / NULLIF(ports_total, 0), 4) AS dcfc_share,
+  effective_ports
 FROM summary
 WHERE ports_total > 0
-ORDER BY dcfc_share DESC
+ORDER BY dcfc_share DESC, ports_total DESC, county IS NULL, county
 LIMIT 10;
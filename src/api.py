@@ -0,0 +1,332 @@
+# src/api.py
+"""
+Local read-only query API over the processed tables.
+
+Loads stations (+ ZIP-derived county and busy score) and the county supply table
+(ZIP-derived county, plus any extra columns of the AFDC county summary) once,
+builds in-memory indexes (station id, county, zip, network, latitude order for
+bounding boxes) and serves JSON:
+
+    GET /health
+    GET /counties                         county KPIs (supply/siting + summary)
+    GET /counties/<county>
+    GET /stations/<id>
+    GET /stations?county=&zip=&network=&limit=&offset=
+    GET /top?metric=likely_busy_score&n=25[&county=][&network=]
+    GET /bbox?min_lat=&min_lon=&max_lat=&max_lon=[&limit=]
+
+Responses carry an ETag and honour If-None-Match (304); rendered responses sit in
+an LRU cache. Files are polled and the tables reloaded (and the cache dropped)
+when any of them changes. The server is a ThreadingHTTPServer: one thread per
+connection, HTTP/1.1 keep-alive.
+
+    python src/api.py                      # http://127.0.0.1:8765
+    python src/api.py --port 9000 --reload-interval 5
+"""
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "src" / "transform")]
+
+import numpy as np
+import pandas as pd
+
+from processed_store import parquet_path, csv_path, read_table
+from reference import ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+from make_station_busy import busy_score
+from make_kpis import COUNTY_SUMMARY_OUT
+from make_county_supply import OUT_CSV as COUNTY_SUPPLY_CSV, derive_county_supply
+
+COUNTY_SUMMARY = ROOT / COUNTY_SUMMARY_OUT
+
+STATION_FIELDS = ["id", "station_name", "city", "zip", "county", "ev_network",
+                  "latitude", "longitude", "level2_ports", "dcfc_ports", "total_ports",
+                  "likely_busy_score"]
+TOP_METRICS = ["likely_busy_score", "dcfc_ports", "level2_ports", "total_ports"]
+MAX_LIMIT = 5000
+DEFAULT_LIMIT = 100
+
+def _int(q: dict, name: str, default: int, minimum: int) -> int:
+    """Integer query parameter; ValueError (-> 400) when malformed or below `minimum`."""
+    value = int(q.get(name, default))
+    if value < minimum:
+        raise ValueError(f"{name} must be >= {minimum}")
+    return value
+
+def _records(df: pd.DataFrame) -> list:
+    # NaN/NA -> null
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+def _key(value) -> str:
+    return str(value).strip().lower()
+
+def _positions(values: pd.Series) -> dict:
+    """value (lower-cased) -> int array of row positions."""
+    keys = values.astype("string").str.strip().str.lower()
+    return {k: np.asarray(v, dtype=np.int64) for k, v in keys.groupby(keys, sort=False).indices.items()}
+
+class Store:
+    """Immutable snapshot of the tables + indexes; replaced wholesale on reload."""
+    def __init__(self, stations: pd.DataFrame, county_summary: pd.DataFrame, county_supply: pd.DataFrame):
+        self.stations = stations.reset_index(drop=True)
+        st = self.stations
+        self.by_id = {int(i): p for p, i in enumerate(st["id"].to_numpy())}
+        self.by_county = _positions(st["county"])
+        self.by_zip = _positions(st["zip"])
+        self.by_network = _positions(st["ev_network"])
+        lat = st["latitude"].to_numpy(dtype=float)
+        self.lat_order = np.argsort(lat, kind="stable")
+        self.lat_sorted = lat[self.lat_order]
+        self.lon = st["longitude"].to_numpy(dtype=float)
+
+        # keyed on the ZIP-derived county of the supply table: the AFDC `county` behind
+        # ev_summary_by_county.csv is blank for CA, so the summary only adds its extra columns
+        counties = county_supply.dropna(subset=["county"]).reset_index(drop=True)
+        extra = [c for c in county_summary.columns if c == "county" or c not in counties.columns]
+        if len(extra) > 1:
+            counties = counties.merge(county_summary[extra].dropna(subset=["county"]), on="county", how="left")
+        self.counties = counties
+        self.county_rows = {_key(c): i for i, c in enumerate(counties["county"]) if pd.notna(c)}
+
+    @classmethod
+    def load(cls) -> "Store":
+        st = read_table("stations_ca", columns=["id", "station_name", "city", "zip", "county", "ev_network",
+                                                "latitude", "longitude", "ev_level2_evse_num", "ev_dc_fast_num"])
+        xw = load_zip_xwalk(ZIP_XWALK).drop_duplicates("zip")
+        if Path(COUNTY_SUPPLY_CSV).exists():
+            supply = pd.read_csv(COUNTY_SUPPLY_CSV, dtype={"county": "string"})
+        else:   # supply step not run yet: ZIP-derived port totals only
+            supply = derive_county_supply(st, xw)
+        st = st.rename(columns={"ev_level2_evse_num": "level2_ports", "ev_dc_fast_num": "dcfc_ports",
+                                "county": "afdc_county"})
+        # county the same way the busy/supply tables do it (ZIP crosswalk), AFDC county as fallback
+        st = attach_county_from_zip(st, xw)
+        st["county"] = st["county"].fillna(st["afdc_county"].astype(object))
+        st["total_ports"] = st["level2_ports"] + st["dcfc_ports"]
+        st["likely_busy_score"] = busy_score(st["dcfc_ports"], st["level2_ports"])
+        return cls(st[STATION_FIELDS], pd.read_csv(COUNTY_SUMMARY, dtype={"county": "string"}), supply)
+
+    # ---- queries ----
+    def station(self, station_id: int) -> dict:
+        pos = self.by_id.get(station_id)
+        if pos is None:
+            raise KeyError(f"station {station_id} not found")
+        return _records(self.stations.iloc[[pos]])[0]
+
+    def county(self, name: str) -> dict:
+        row = self.county_rows.get(_key(name))
+        if row is None:
+            raise KeyError(f"county {name!r} not found")
+        return _records(self.counties.iloc[[row]])[0]
+
+    def select(self, county=None, zip=None, network=None):
+        """Row positions matching every given filter (None = all rows)."""
+        pos = None
+        for index, value in ((self.by_county, county), (self.by_zip, zip), (self.by_network, network)):
+            if value is None:
+                continue
+            hit = index.get(_key(value), np.empty(0, dtype=np.int64))
+            pos = hit if pos is None else np.intersect1d(pos, hit, assume_unique=True)
+        return pos
+
+    def page(self, pos, limit: int, offset: int) -> dict:
+        total = len(self.stations) if pos is None else len(pos)
+        if pos is None:
+            rows = self.stations.iloc[offset:offset + limit]
+        else:
+            rows = self.stations.iloc[np.sort(pos)[offset:offset + limit]]
+        return {"count": total, "offset": offset, "results": _records(rows)}
+
+    def top(self, metric: str, n: int, pos=None) -> dict:
+        values = self.stations[metric].to_numpy(dtype=float)
+        cand = np.arange(len(values)) if pos is None else pos
+        if n < len(cand):
+            # partial selection, then order just the winners
+            cand = cand[np.argpartition(-values[cand], n - 1)[:n]]
+        cand = cand[np.argsort(-values[cand], kind="stable")]
+        return {"metric": metric, "results": _records(self.stations.iloc[cand])}
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon, limit: int) -> dict:
+        lo = np.searchsorted(self.lat_sorted, min_lat, side="left")
+        hi = np.searchsorted(self.lat_sorted, max_lat, side="right")
+        pos = self.lat_order[lo:hi]
+        lon = self.lon[pos]
+        pos = np.sort(pos[(lon >= min_lon) & (lon <= max_lon)])
+        return {"count": len(pos), "results": _records(self.stations.iloc[pos[:limit]])}
+
+class LRUCache:
+    def __init__(self, size: int):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+def watched_files() -> list:
+    stations = parquet_path("stations_ca")
+    return [stations if stations.exists() else csv_path("stations_ca"),
+            COUNTY_SUMMARY, Path(COUNTY_SUPPLY_CSV), ZIP_XWALK]
+
+def _mtimes(paths) -> tuple:
+    return tuple(p.stat().st_mtime_ns if p.exists() else None for p in paths)
+
+class App:
+    def __init__(self, cache_size: int = 1024):
+        self.files = watched_files()
+        self.mtimes = _mtimes(self.files)
+        # (version, store), swapped as one reference on reload; cache keys carry the version,
+        # so a request that started before a reload cannot refill the cache with old data
+        self.current = (0, Store.load())
+        self.cache = LRUCache(cache_size)
+        self.loaded_at = time.time()
+
+    def maybe_reload(self):
+        mtimes = _mtimes(self.files)
+        if mtimes == self.mtimes:
+            return False
+        try:
+            store = Store.load()
+        except Exception as e:   # half-written file: keep serving the old snapshot, retry next poll
+            print(f"reload failed, keeping previous data: {e}")
+            return False
+        self.current = (self.current[0] + 1, store)
+        self.mtimes, self.loaded_at = mtimes, time.time()
+        self.cache.clear()
+        print(f"reloaded: {len(store.stations)} stations")
+        return True
+
+    @property
+    def store(self):
+        return self.current[1]
+
+    def watch(self, interval: float):
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.maybe_reload()
+        threading.Thread(target=loop, daemon=True).start()
+
+    def route(self, path: str, qs: dict, store) -> dict:
+        """JSON payload for a request, answered from one store snapshot."""
+        parts = [unquote(p) for p in path.strip("/").split("/") if p]
+        q = {k: v[-1] for k, v in qs.items()}
+        limit = min(_int(q, "limit", DEFAULT_LIMIT, 1), MAX_LIMIT)
+
+        if parts == ["health"]:
+            return {"status": "ok", "stations": len(store.stations), "loaded_at": self.loaded_at}
+        if parts == ["counties"]:
+            return {"count": len(store.counties), "results": _records(store.counties)}
+        if len(parts) == 2 and parts[0] == "counties":
+            return store.county(parts[1])
+        if parts == ["stations"]:
+            pos = store.select(q.get("county"), q.get("zip"), q.get("network"))
+            return store.page(pos, limit, _int(q, "offset", 0, 0))
+        if len(parts) == 2 and parts[0] == "stations":
+            return store.station(int(parts[1]))
+        if parts == ["top"]:
+            metric = q.get("metric", "likely_busy_score")
+            if metric not in TOP_METRICS:
+                raise ValueError(f"metric must be one of {TOP_METRICS}")
+            n = min(_int(q, "n", 25, 1), MAX_LIMIT)
+            return store.top(metric, n, store.select(q.get("county"), q.get("zip"), q.get("network")))
+        if parts == ["bbox"]:
+            box = [float(q[k]) for k in ("min_lat", "min_lon", "max_lat", "max_lon")]
+            return store.bbox(*box, limit)
+        raise KeyError(f"no route for /{'/'.join(parts)}")
+
+    def respond(self, target: str):
+        """(status, body bytes, etag) for a request target, via the LRU cache."""
+        url = urlsplit(target)
+        version, store = self.current   # one snapshot per request, even if a reload lands mid-way
+        key = (version, url.path + "?" + "&".join(sorted(url.query.split("&"))) if url.query else url.path)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+        try:
+            status, payload = 200, self.route(url.path, parse_qs(url.query), store)
+        except KeyError as e:
+            status, payload = 404, {"error": str(e).strip("'\"")}
+        except (ValueError, TypeError) as e:
+            status, payload = 400, {"error": str(e)}
+        body = json.dumps(payload, default=str).encode()
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        out = (status, body, etag)
+        if status == 200:
+            self.cache.put(key, out)
+        return out
+
+def make_handler(app: App):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive
+        # headers and body go out as separate writes; without TCP_NODELAY the
+        # second one waits on the client's delayed ACK (~40 ms per request)
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            status, body, etag = app.respond(self.path)
+            if status == 200 and etag in (self.headers.get("If-None-Match") or ""):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")       # revalidate with the ETag
+            self.send_header("Access-Control-Allow-Origin", "*")  # web app on another port
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            pass   # per-request logging costs more than the lookups
+
+    return Handler
+
+def main():
+    ap = argparse.ArgumentParser(description="Read-only JSON API over the processed EV tables")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--cache-size", type=int, default=1024, help="LRU entries (rendered responses)")
+    ap.add_argument("--reload-interval", type=float, default=2.0, help="seconds between file checks (0 = off)")
+    args = ap.parse_args()
+
+    app = App(args.cache_size)
+    if args.reload_interval > 0:
+        app.watch(args.reload_interval)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(app))
+    server.daemon_threads = True
+    print(f"Serving {len(app.store.stations)} stations on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,37 @@
 import os
+import sys
 import json
+import csv
 import time
+import random
 import pathlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import pandas as pd
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))   # src/ (shared instrument module)
+from instrument import record_http, run_manifest, step
+
 AFDC_ENDPOINT = "https://developer.nrel.gov/api/alt-fuel-stations/v1.json"
+PAGE_SIZE = 200
+
+# NREL keys default to 1,000 requests/hour. The token bucket allows a burst of
+# RATE_BURST requests (a one-state pull is ~100 pages) and then refills at the
+# remaining budget, so no 60-minute window goes over HOURLY_LIMIT; 429/5xx still back off.
+HOURLY_LIMIT = 1000
+RATE_BURST = 100
+DEFAULT_WORKERS = 4
+DEFAULT_RATE_PER_SEC = (HOURLY_LIMIT - RATE_BURST) / 3600    # 0.25/s sustained
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# raw extracts are partitioned by state: data/raw/afdc_stations_<st>.{json,csv,ndjson}
+DEFAULT_STATE = "CA"
+RAW_DIR = "data/raw"
 
 CSV_COLUMNS = [
     "id", "station_name", "status_code", "ev_network", "ev_network_web",
@@ -15,24 +41,30 @@ CSV_COLUMNS = [
 ]
 
 def ensure_dirs():
-    pathlib.Path("data/raw").mkdir(parents=True, exist_ok=True)
+    pathlib.Path(RAW_DIR).mkdir(parents=True, exist_ok=True)
 
-def fetch_all_stations(api_key: str) -> list:
+def raw_paths(state: str = DEFAULT_STATE) -> dict:
+    stem = f"{RAW_DIR}/afdc_stations_{state.lower()}"
+    return {"json": f"{stem}.json", "csv": f"{stem}.csv", "ndjson": f"{stem}.ndjson"}
+
+def fetch_all_stations(api_key: str, endpoint: str = AFDC_ENDPOINT, state: str = DEFAULT_STATE) -> list:
     stations = []
-    limit = 200
+    limit = PAGE_SIZE
     offset = 0
     session = requests.Session()
     params = {
         "api_key": api_key,
         "fuel_type": "ELEC",
-        "state": "CA",
+        "state": state,
         "status": "E",
         "limit": limit,
         "offset": offset
     }
     while True:
         params["offset"] = offset
-        r = session.get(AFDC_ENDPOINT, params=params, timeout=60)
+        t0 = time.perf_counter()
+        r = session.get(endpoint, params=params, timeout=60)
+        record_http(time.perf_counter() - t0, r.status_code, len(r.content))
         r.raise_for_status()
         payload = r.json()
         batch = payload.get("fuel_stations", [])
@@ -45,45 +77,315 @@ def fetch_all_stations(api_key: str) -> list:
         time.sleep(0.2)
     return stations
 
-def to_flat_csv(stations: list, out_csv: str):
-    def row_map(s):
-        return {
-            "id": s.get("id"),
-            "station_name": s.get("station_name"),
-            "status_code": s.get("status_code"),
-            "ev_network": s.get("ev_network"),
-            "ev_network_web": s.get("ev_network_web"),
-            "city": s.get("city"),
-            "county": s.get("county"),
-            "state": s.get("state"),
-            "zip": s.get("zip"),
-            "latitude": s.get("latitude"),
-            "longitude": s.get("longitude"),
-            "ev_dc_fast_num": s.get("ev_dc_fast_num"),
-            "ev_level2_evse_num": s.get("ev_level2_evse_num"),
-            "ev_connector_types": ",".join(s.get("ev_connector_types") or []) if isinstance(s.get("ev_connector_types"), list) else s.get("ev_connector_types"),
-            "access_days_time": s.get("access_days_time"),
-            "facility_type": s.get("facility_type"),
-            "station_phone": s.get("station_phone"),
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens are added per second up to `capacity`.
+    Every HTTP attempt (including retries) takes one token.
+    """
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def fetch_page(session, params: dict, offset: int, bucket: TokenBucket,
+               endpoint: str = AFDC_ENDPOINT, max_retries: int = MAX_RETRIES) -> dict:
+    """
+    GET one page at `offset`, retrying 429/5xx and connection errors with
+    exponential backoff (full jitter). Honors Retry-After when the API sends it.
+    """
+    page_params = dict(params, offset=offset)
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        t0 = time.perf_counter()
+        try:
+            r = session.get(endpoint, params=page_params, timeout=60)
+        except (requests.ConnectionError, requests.Timeout):
+            record_http(time.perf_counter() - t0, None)
+            if attempt == max_retries:
+                raise
+            retry_after = None
+        else:
+            record_http(time.perf_counter() - t0, r.status_code, len(r.content))
+            if r.status_code not in RETRY_STATUS:
+                r.raise_for_status()
+                return r.json()
+            if attempt == max_retries:
+                r.raise_for_status()
+            retry_after = r.headers.get("Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        print(f"Retrying offset={offset} in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+        time.sleep(delay)
+
+def check_complete(stations: list, total: int) -> list:
+    """
+    Drop repeated station ids (first occurrence wins) and warn when the count is off.
+    Offset paging over live data shifts when stations are added or removed mid-pull,
+    so a page can repeat or skip a record; the next refresh picks up what was missed.
+    """
+    seen, unique = set(), []
+    for s in stations:
+        if s.get("id") not in seen:
+            seen.add(s.get("id"))
+            unique.append(s)
+    if len(unique) < len(stations):
+        print(f"WARNING: AFDC returned {len(stations) - len(unique)} duplicate station ids; kept the first of each")
+    if len(unique) != total:
+        print(f"WARNING: got {len(unique)} stations, total_results={total} (data changed while paging?)")
+    return unique
+
+def fetch_all_stations_concurrent(api_key: str, endpoint: str = AFDC_ENDPOINT,
+                                  max_workers: int = DEFAULT_WORKERS,
+                                  rate_per_sec: float = DEFAULT_RATE_PER_SEC,
+                                  extra_params: dict = None, state: str = DEFAULT_STATE,
+                                  bucket: TokenBucket = None) -> list:
+    """
+    Read total_results from the first page, then fetch the remaining offsets
+    on a thread pool. All requests share one token bucket, so `rate_per_sec`
+    caps the API load regardless of `max_workers` (pass `bucket` to share it
+    across calls). `extra_params` overrides or extends the default query (e.g.
+    status="all" for incremental pulls).
+    """
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+    bucket = bucket or TokenBucket(rate_per_sec, capacity=RATE_BURST)
+    params = {
+        "api_key": api_key,
+        "fuel_type": "ELEC",
+        "state": state,
+        "status": "E",
+        "limit": PAGE_SIZE,
+    }
+    params.update(extra_params or {})
+
+    first = fetch_page(session, params, 0, bucket, endpoint=endpoint)
+    total = first.get("total_results", 0)
+    pages = {0: first.get("fuel_stations", [])}
+    offsets = list(range(PAGE_SIZE, total, PAGE_SIZE))
+    print(f"Fetched {len(pages[0])} / {total} (offset=0); {len(offsets)} pages left, workers={max_workers}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            off: pool.submit(fetch_page, session, params, off, bucket, endpoint)
+            for off in offsets
         }
-    rows = [row_map(s) for s in stations]
+        for off, fut in futures.items():
+            pages[off] = fut.result().get("fuel_stations", [])
+
+    stations = check_complete([s for off in sorted(pages) for s in pages[off]], total)
+    print(f"Fetched {len(stations)} / {total} ({len(pages)} pages)")
+    return stations
+
+def flatten_station(s: dict) -> dict:
+    connectors = s.get("ev_connector_types")
+    return {
+        "id": s.get("id"),
+        "station_name": s.get("station_name"),
+        "status_code": s.get("status_code"),
+        "ev_network": s.get("ev_network"),
+        "ev_network_web": s.get("ev_network_web"),
+        "city": s.get("city"),
+        "county": s.get("county"),
+        "state": s.get("state"),
+        "zip": s.get("zip"),
+        "latitude": s.get("latitude"),
+        "longitude": s.get("longitude"),
+        "ev_dc_fast_num": s.get("ev_dc_fast_num"),
+        "ev_level2_evse_num": s.get("ev_level2_evse_num"),
+        "ev_connector_types": ",".join(connectors or []) if isinstance(connectors, list) else connectors,
+        "access_days_time": s.get("access_days_time"),
+        "facility_type": s.get("facility_type"),
+        "station_phone": s.get("station_phone"),
+    }
+
+def to_flat_csv(stations: list, out_csv: str):
+    rows = [flatten_station(s) for s in stations]
     df = pd.DataFrame(rows, columns=CSV_COLUMNS)
     df.to_csv(out_csv, index=False)
 
+# ---------------- Streaming extract ----------------
+# Pages are appended to NDJSON + CSV as they arrive. After each page both files
+# are fsync'd and a checkpoint records the next offset and the byte size of each
+# file, so an interrupted run truncates any half-written page and resumes there.
+
+def iter_pages(api_key: str, start_offset: int = 0, endpoint: str = AFDC_ENDPOINT,
+               rate_per_sec: float = DEFAULT_RATE_PER_SEC, state: str = DEFAULT_STATE,
+               bucket: TokenBucket = None):
+    """Yield (offset, batch, total_results) one page at a time, with per-page retries."""
+    session = requests.Session()
+    bucket = bucket or TokenBucket(rate_per_sec, capacity=RATE_BURST)
+    params = {
+        "api_key": api_key,
+        "fuel_type": "ELEC",
+        "state": state,
+        "status": "E",
+        "limit": PAGE_SIZE,
+    }
+    offset = start_offset
+    while True:
+        payload = fetch_page(session, params, offset, bucket, endpoint=endpoint)
+        batch = payload.get("fuel_stations", [])
+        total = payload.get("total_results", 0)
+        yield offset, batch, total
+        offset += len(batch)
+        if offset >= total or not batch:
+            return
+
+def iter_ndjson(path: str):
+    """Lazily yield station dicts from an NDJSON extract."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _checkpoint_path(out_ndjson: str) -> pathlib.Path:
+    return pathlib.Path(out_ndjson + ".checkpoint.json")
+
+def _load_checkpoint(out_ndjson: str):
+    p = _checkpoint_path(out_ndjson)
+    if not p.exists():
+        return None
+    with open(p, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_checkpoint(out_ndjson: str, state: dict):
+    p = _checkpoint_path(out_ndjson)
+    tmp = p.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    tmp.replace(p)
+
+def stream_extract(api_key: str, out_ndjson: str, out_csv: str, resume: bool = True,
+                   endpoint: str = AFDC_ENDPOINT, rate_per_sec: float = DEFAULT_RATE_PER_SEC,
+                   state: str = DEFAULT_STATE, bucket: TokenBucket = None) -> int:
+    """
+    Stream every page to `out_ndjson` (raw records, one per line) and `out_csv`
+    (flattened CSV_COLUMNS). Memory use is one page regardless of dataset size.
+    Returns the number of stations written.
+    """
+    ckpt = _load_checkpoint(out_ndjson) if resume else None
+    if ckpt is not None:
+        short = [p for p, size in ((out_ndjson, ckpt["ndjson_bytes"]), (out_csv, ckpt["csv_bytes"]))
+                 if not os.path.exists(p) or os.path.getsize(p) < size]
+        if short:
+            print(f"Checkpoint ignored, output missing or shorter than recorded: {', '.join(short)}; starting over")
+            ckpt = None
+    if ckpt is not None:
+        offset, written = ckpt["next_offset"], ckpt["rows"]
+        for path, size in ((out_ndjson, ckpt["ndjson_bytes"]), (out_csv, ckpt["csv_bytes"])):
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        print(f"Resuming at offset={offset} ({written} stations already written)")
+    else:
+        offset, written = 0, 0
+
+    with open(out_ndjson, "a", encoding="utf-8") as fj, \
+         open(out_csv, "a", encoding="utf-8", newline="") as fc:
+        writer = csv.DictWriter(fc, fieldnames=CSV_COLUMNS)
+        if ckpt is None:
+            fj.truncate(0)
+            fc.truncate(0)
+            writer.writeheader()
+        for page_offset, batch, total in iter_pages(api_key, offset, endpoint, rate_per_sec, state, bucket):
+            for s in batch:
+                fj.write(json.dumps(s, ensure_ascii=False))
+                fj.write("\n")
+                writer.writerow(flatten_station(s))
+            for f in (fj, fc):
+                f.flush()
+                os.fsync(f.fileno())
+            written += len(batch)
+            _save_checkpoint(out_ndjson, {
+                "next_offset": page_offset + len(batch),
+                "rows": written,
+                "total": total,
+                "ndjson_bytes": fj.tell(),
+                "csv_bytes": fc.tell(),
+            })
+            print(f"Streamed {written} / {total} (offset={page_offset})")
+
+    _checkpoint_path(out_ndjson).unlink(missing_ok=True)
+    return written
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Fetch AFDC EV stations (California by default)")
+    ap.add_argument("--states", nargs="+", default=[DEFAULT_STATE], metavar="ST",
+                    help="two-letter state codes; each is written to its own data/raw partition")
+    ap.add_argument("--workers", type=int, default=None,
+                    help=f"concurrent page requests (default {DEFAULT_WORKERS}; 1 = original serial walk; "
+                         "not with --stream)")
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SEC,
+                    help=f"sustained requests per second across all workers and states, after a burst of "
+                         f"{RATE_BURST} (default {DEFAULT_RATE_PER_SEC:.2f}: stays under {HOURLY_LIMIT:,}/hour)")
+    ap.add_argument("--endpoint", default=os.getenv("AFDC_ENDPOINT", AFDC_ENDPOINT),
+                    help="stations endpoint (point at a local stub server for testing)")
+    ap.add_argument("--stream", action="store_true",
+                    help="append pages to NDJSON/CSV as they arrive (constant memory, resumable); "
+                         "pages are fetched one at a time, --rate still applies")
+    ap.add_argument("--no-resume", action="store_true",
+                    help="with --stream, ignore any checkpoint and start from offset 0")
+    args = ap.parse_args()
+    if args.stream and args.workers is not None:
+        ap.error("--workers does not apply to --stream (pages are appended in order, one at a time)")
+    if args.workers is None:
+        args.workers = DEFAULT_WORKERS
+    return args
+
+def extract_state(api_key: str, state: str, args, bucket: TokenBucket = None):
+    paths = raw_paths(state)
+    if args.stream:
+        n = stream_extract(api_key, paths["ndjson"], paths["csv"], resume=not args.no_resume,
+                           endpoint=args.endpoint, rate_per_sec=args.rate, state=state, bucket=bucket)
+        print(f"\nSaved {n} stations ({state})")
+        print(f"- NDJSON: {paths['ndjson']}")
+        print(f"- CSV   : {paths['csv']}")
+        return n
+    if args.workers > 1:
+        stations = fetch_all_stations_concurrent(api_key=api_key, endpoint=args.endpoint,
+                                                 max_workers=args.workers, rate_per_sec=args.rate,
+                                                 state=state, bucket=bucket)
+    else:
+        stations = fetch_all_stations(api_key=api_key, endpoint=args.endpoint, state=state)
+    with open(paths["json"], "w", encoding="utf-8") as f:
+        json.dump({"fuel_stations": stations}, f, ensure_ascii=False, indent=2)
+    to_flat_csv(stations, paths["csv"])
+    print(f"\nSaved {len(stations)} stations ({state})")
+    print(f"- JSON: {paths['json']}")
+    print(f"- CSV : {paths['csv']}")
+    return len(stations)
+
 def main():
+    args = parse_args()
     api_key = os.getenv("NREL_API_KEY")
     if not api_key:
         raise SystemExit('ERROR: NREL_API_KEY not set. In PowerShell: $env:NREL_API_KEY = "YOUR_KEY"')
     ensure_dirs()
-    out_json = "data/raw/afdc_stations_ca.json"
-    out_csv = "data/raw/afdc_stations_ca.csv"
-    stations = fetch_all_stations(api_key=api_key)
-    with open(out_json, "w", encoding="utf-8") as f:
-        json.dump({"fuel_stations": stations}, f, ensure_ascii=False, indent=2)
-    to_flat_csv(stations, out_csv)
-    print(f"\nSaved {len(stations)} stations")
-    print(f"- JSON: {out_json}")
-    print(f"- CSV : {out_csv}")
+    # states one after another, drawing on one token bucket: they share the API key's hourly limit
+    bucket = TokenBucket(args.rate, capacity=RATE_BURST)
+    with run_manifest("afdc_fetch"):
+        for state in args.states:
+            with step(f"extract_{state.upper()}") as st:
+                st.rows_out = extract_state(api_key, state.upper(), args, bucket)
+                paths = raw_paths(state.upper())
+                for kind in (("ndjson", "csv") if args.stream else ("json", "csv")):
+                    st.wrote(paths[kind])
 
 if __name__ == "__main__":
     main()
@@ -4,24 +4,37 @@ import pathlib
 import requests
 
 LAST_UPDATED_ENDPOINT = "https://developer.nrel.gov/api/alt-fuel-stations/v1/last-updated.json"
+LAST_UPDATED_OUT = "data/raw/afdc_last_updated.json"
+
+def fetch_last_updated(api_key: str, endpoint: str = LAST_UPDATED_ENDPOINT) -> dict:
+    r = requests.get(endpoint, params={"api_key": api_key}, timeout=30)
+    r.raise_for_status()
+    return r.json()
+
+def load_saved_last_updated(path: str = LAST_UPDATED_OUT):
+    """Timestamp from the previous run, or None if we have never saved one."""
+    p = pathlib.Path(path)
+    if not p.exists():
+        return None
+    with open(p, encoding="utf-8") as f:
+        return json.load(f).get("last_updated")
+
+def save_last_updated(payload: dict, path: str = LAST_UPDATED_OUT):
+    pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
 
 def main():
     api_key = os.getenv("NREL_API_KEY")
     if not api_key:
         raise SystemExit('ERROR: NREL_API_KEY not set. In PowerShell: $env:NREL_API_KEY = "YOUR_KEY"')
 
-    pathlib.Path("data/raw").mkdir(parents=True, exist_ok=True)
-    r = requests.get(LAST_UPDATED_ENDPOINT, params={"api_key": api_key}, timeout=30)
-    r.raise_for_status()
-    payload = r.json()
-
-    out_path = "data/raw/afdc_last_updated.json"
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    payload = fetch_last_updated(api_key)
+    save_last_updated(payload)
 
     ts = payload.get("last_updated")
     print(f"AFDC last_updated: {ts}")
-    print(f"Saved: {out_path}")
+    print(f"Saved: {LAST_UPDATED_OUT}")
 
 if __name__ == "__main__":
     main()
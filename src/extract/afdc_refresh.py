@@ -0,0 +1,175 @@
+import os
+import json
+import pathlib
+import argparse
+from datetime import datetime, timedelta, timezone
+import requests
+
+from afdc_fetch import (
+    AFDC_ENDPOINT, DEFAULT_STATE, DEFAULT_WORKERS, DEFAULT_RATE_PER_SEC, RATE_BURST,
+    TokenBucket, ensure_dirs, fetch_all_stations_concurrent, fetch_page, to_flat_csv,
+)
+from afdc_last_updated import (
+    LAST_UPDATED_ENDPOINT, fetch_last_updated, load_saved_last_updated, save_last_updated,
+)
+
+STORE_PATH = "data/raw/afdc_station_store.json"
+OUT_JSON = "data/raw/afdc_stations_ca.json"
+OUT_CSV = "data/raw/afdc_stations_ca.csv"
+
+# Query param used for delta pulls; status="all" so stations that left "E"
+# (temporarily unavailable, planned, ...) come back and can be tombstoned.
+UPDATED_SINCE_PARAM = "updated_since"
+
+# Stations deleted outright from AFDC never show up in an updated_since pull. The
+# store is reconciled against the full list of open ids (fields=id, so pages are
+# small) every RECONCILE_DAYS, or sooner when the live open-station count differs
+# from the store's.
+RECONCILE_DAYS = 7
+
+def load_store(path: str = STORE_PATH):
+    """
+    Persistent station store: {"last_updated": <AFDC timestamp>, "reconciled_at": <UTC ISO time>,
+    "stations": {id: station}}.
+    Returns None when no store exists yet (first run -> full pull).
+    """
+    p = pathlib.Path(path)
+    if not p.exists():
+        return None
+    with open(p, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_store(store: dict, path: str = STORE_PATH):
+    tmp = pathlib.Path(path + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False)
+    tmp.replace(path)
+
+def merge_changes(stations: dict, changed: list) -> tuple:
+    """
+    Upsert changed stations by id; anything no longer open (status_code != "E")
+    is a tombstone and is dropped. Returns (upserted, removed) counts.
+    """
+    upserted = removed = 0
+    for s in changed:
+        key = str(s.get("id"))
+        if s.get("status_code", "E") == "E":
+            stations[key] = s
+            upserted += 1
+        elif stations.pop(key, None) is not None:
+            removed += 1
+    return upserted, removed
+
+def reconcile(stations: dict, live_ids) -> int:
+    """Drop stored stations whose id is not among AFDC's open stations. Returns removed count."""
+    live = {str(i) for i in live_ids}
+    gone = [k for k in stations if k not in live]
+    for k in gone:
+        del stations[k]
+    return len(gone)
+
+def live_count(api_key: str, bucket: TokenBucket, endpoint: str = AFDC_ENDPOINT,
+               state: str = DEFAULT_STATE) -> int:
+    """Number of open stations AFDC lists (one single-record page)."""
+    params = {"api_key": api_key, "fuel_type": "ELEC", "state": state, "status": "E", "limit": 1}
+    return fetch_page(requests.Session(), params, 0, bucket, endpoint=endpoint).get("total_results", 0)
+
+def reconcile_due(store: dict, count: int, now: datetime) -> str:
+    """Why the store needs reconciling ("" = it does not)."""
+    if count != len(store["stations"]):
+        return f"AFDC lists {count} open stations, store has {len(store['stations'])}"
+    last = store.get("reconciled_at")
+    if last is None or now - datetime.fromisoformat(last) >= timedelta(days=RECONCILE_DAYS):
+        return f"last reconciled {last or 'never'}"
+    return ""
+
+def write_outputs(stations: dict):
+    ordered = [stations[k] for k in sorted(stations, key=int)]
+    with open(OUT_JSON, "w", encoding="utf-8") as f:
+        json.dump({"fuel_stations": ordered}, f, ensure_ascii=False, indent=2)
+    to_flat_csv(ordered, OUT_CSV)
+    return len(ordered)
+
+def refresh(api_key: str, full: bool = False, endpoint: str = AFDC_ENDPOINT,
+            last_updated_endpoint: str = LAST_UPDATED_ENDPOINT,
+            max_workers: int = DEFAULT_WORKERS, rate_per_sec: float = DEFAULT_RATE_PER_SEC,
+            force_reconcile: bool = False) -> bool:
+    """
+    Bring the local station store up to date. Returns False when AFDC has not
+    changed since the last run (nothing fetched, nothing rewritten).
+    """
+    live = fetch_last_updated(api_key, endpoint=last_updated_endpoint)
+    live_ts = live.get("last_updated")
+    saved_ts = load_saved_last_updated()
+    store = None if full else load_store()
+    now = datetime.now(timezone.utc)
+    # every request of this run draws on one bucket: they share the key's hourly limit
+    bucket = TokenBucket(rate_per_sec, capacity=RATE_BURST)
+
+    if (store is not None and not force_reconcile and live_ts is not None
+            and live_ts == saved_ts == store.get("last_updated")):
+        print(f"AFDC unchanged since {saved_ts}; skipping refresh")
+        return False
+
+    if store is None:
+        print("Full refresh (no station store or --full)")
+        batch = fetch_all_stations_concurrent(api_key, endpoint=endpoint, max_workers=max_workers,
+                                              rate_per_sec=rate_per_sec, bucket=bucket)
+        store = {"stations": {}}
+        upserted, removed = merge_changes(store["stations"], batch)
+        store["reconciled_at"] = now.isoformat(timespec="seconds")
+    else:
+        since = store.get("last_updated")
+        print(f"Incremental refresh: stations updated since {since}")
+        batch = fetch_all_stations_concurrent(
+            api_key, endpoint=endpoint, max_workers=max_workers, rate_per_sec=rate_per_sec,
+            extra_params={"status": "all", UPDATED_SINCE_PARAM: since}, bucket=bucket,
+        )
+        upserted, removed = merge_changes(store["stations"], batch)
+
+        reason = "--reconcile" if force_reconcile else \
+            reconcile_due(store, live_count(api_key, bucket, endpoint=endpoint), now)
+        if reason:
+            print(f"Reconciling station ids ({reason})")
+            ids = fetch_all_stations_concurrent(api_key, endpoint=endpoint, max_workers=max_workers,
+                                                rate_per_sec=rate_per_sec, extra_params={"fields": "id"},
+                                                bucket=bucket)
+            deleted = reconcile(store["stations"], (s.get("id") for s in ids))
+            print(f"Removed {deleted} stations no longer listed by AFDC")
+            removed += deleted
+            store["reconciled_at"] = now.isoformat(timespec="seconds")
+
+    store["last_updated"] = live_ts
+    save_store(store)
+    save_last_updated(live)
+    n = write_outputs(store["stations"])
+    print(f"Merged {len(batch)} fetched stations: {upserted} upserted, {removed} removed; store={n}")
+    return True
+
+def main():
+    ap = argparse.ArgumentParser(description="Incremental AFDC refresh driven by last-updated")
+    ap.add_argument("--full", action="store_true", help="ignore the store and re-download everything")
+    ap.add_argument("--reconcile", action="store_true",
+                    help=f"check the store against AFDC's full id list now (default: every {RECONCILE_DAYS} "
+                         "days or when the open-station count differs)")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SEC)
+    ap.add_argument("--endpoint", default=os.getenv("AFDC_ENDPOINT", AFDC_ENDPOINT))
+    ap.add_argument("--last-updated-endpoint",
+                    default=os.getenv("AFDC_LAST_UPDATED_ENDPOINT", LAST_UPDATED_ENDPOINT))
+    args = ap.parse_args()
+
+    api_key = os.getenv("NREL_API_KEY")
+    if not api_key:
+        raise SystemExit('ERROR: NREL_API_KEY not set. In PowerShell: $env:NREL_API_KEY = "YOUR_KEY"')
+    ensure_dirs()
+    changed = refresh(api_key, full=args.full, endpoint=args.endpoint,
+                      last_updated_endpoint=args.last_updated_endpoint,
+                      max_workers=args.workers, rate_per_sec=args.rate, force_reconcile=args.reconcile)
+    if changed:
+        print(f"- Store: {STORE_PATH}")
+        print(f"- JSON : {OUT_JSON}")
+        print(f"- CSV  : {OUT_CSV}")
+
+if __name__ == "__main__":
+    main()
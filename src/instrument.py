@@ -0,0 +1,308 @@
+# src/instrument.py
+"""
+Shared instrumentation for the entry-point scripts.
+
+    with run_manifest("make_kpis"):
+        with step("load_raw", reads=[RAW_CSV]) as st:
+            df = load_raw()
+            st.rows_out = len(df)
+
+Each step records wall and CPU time, peak RSS, rows in/out, bytes read/written and,
+for the extract, per-page HTTP latencies (record_http). Steps nest ("build_kpis/
+clean_stations"). Outside a run_manifest() block, step() is a no-op, so library
+functions can be instrumented without affecting the pipeline or benchmarks.
+
+On exit the run is written to data/runs/<name>-<timestamp>.json (+ <name>-latest.json).
+
+Profiling: functions decorated with @profiled are profiled when EV_PROFILE names them
+("clean_stations,score_stations" or "all"); EV_PROFILER=pyinstrument uses
+pyinstrument when installed, cProfile otherwise. Output goes to data/runs/profiles/.
+
+    python src/instrument.py show data/runs/make_kpis-latest.json
+    python src/instrument.py compare data/runs/make_kpis-20260101T010000Z.json data/runs/make_kpis-latest.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import threading
+import functools
+from pathlib import Path
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parents[1]
+RUNS_DIR = ROOT / "data" / "runs"
+PROFILES_DIR = RUNS_DIR / "profiles"
+
+_active = None          # the current Run (one per process)
+_lock = threading.Lock()
+
+def peak_rss_mb():
+    """Process high-water RSS in MB (None if it can't be measured here)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+    except Exception:
+        return None
+
+def _size(path) -> int:
+    try:
+        return Path(path).stat().st_size
+    except OSError:
+        return 0
+
+def _percentile(values, q):
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q / 100 * (len(s) - 1))))]
+
+class Step:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.http = []          # (seconds, status, bytes)
+        self.extra = {}
+
+    def read(self, path):
+        self.bytes_read += _size(path)
+        return path
+
+    def wrote(self, path):
+        self.bytes_written += _size(path)
+        return path
+
+    def to_dict(self) -> dict:
+        out = {"name": self.name, "wall_s": round(self.wall, 4), "cpu_s": round(self.cpu, 4),
+               "peak_rss_mb": self.peak_rss_mb, "rows_in": self.rows_in, "rows_out": self.rows_out,
+               "bytes_read": self.bytes_read, "bytes_written": self.bytes_written}
+        if self.http:
+            lat = [h[0] for h in self.http]
+            out["http"] = {
+                "requests": len(lat),
+                "p50_ms": round(_percentile(lat, 50) * 1000, 1),
+                "p90_ms": round(_percentile(lat, 90) * 1000, 1),
+                "p99_ms": round(_percentile(lat, 99) * 1000, 1),
+                "max_ms": round(max(lat) * 1000, 1),
+                "bytes": sum(h[2] for h in self.http),
+                "non_200": sum(1 for h in self.http if h[1] != 200),
+            }
+        out.update(self.extra)
+        return out
+
+class _NullStep(Step):
+    def __init__(self):
+        super().__init__(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class Run:
+    def __init__(self, name):
+        self.name = name
+        self.steps = []         # finished steps, in completion order
+        self.stack = []         # open steps (names nest with "/")
+        self.started = datetime.now(timezone.utc)
+
+    def record_http(self, seconds, status, nbytes):
+        with _lock:
+            target = self.stack[-1] if self.stack else None
+            if target is not None:
+                target.http.append((seconds, status, nbytes))
+
+    def manifest(self) -> dict:
+        return {
+            "run": self.name,
+            "started": self.started.isoformat(timespec="seconds"),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "cpus": os.cpu_count(),
+            "steps": [s.to_dict() for s in self.steps],
+        }
+
+class _StepContext:
+    def __init__(self, run, step):
+        self.run, self.step = run, step
+
+    def __enter__(self):
+        s = self.step
+        with _lock:
+            parent = self.run.stack[-1].name + "/" if self.run.stack else ""
+            s.name = parent + s.name
+            self.run.stack.append(s)
+        s._t0, s._c0 = time.perf_counter(), time.process_time()
+        return s
+
+    def __exit__(self, *exc):
+        s = self.step
+        s.wall = time.perf_counter() - s._t0
+        s.cpu = time.process_time() - s._c0
+        s.peak_rss_mb = peak_rss_mb()
+        with _lock:
+            self.run.stack.remove(s)
+            self.run.steps.append(s)
+        return False
+
+def step(name, rows_in=None, reads=()):
+    """Time a (sub-)step of the active run; a no-op outside run_manifest()."""
+    run = _active
+    if run is None:
+        return _NullStep()
+    s = Step(name, rows_in)
+    for p in reads:
+        s.read(p)
+    return _StepContext(run, s)
+
+def record_http(seconds, status, nbytes=0):
+    """Attribute one HTTP request to the innermost open step (any thread)."""
+    if _active is not None:
+        _active.record_http(seconds, status, nbytes)
+
+class run_manifest:
+    """Context manager around a script's main(): one top-level step + JSON manifest on exit."""
+    def __init__(self, name, out_dir=RUNS_DIR):
+        self.name = name
+        self.out_dir = Path(out_dir)
+
+    def __enter__(self):
+        global _active
+        self.run = Run(self.name)
+        _active = self.run
+        self.top = _StepContext(self.run, Step(self.name))
+        return self.top.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        self.top.__exit__(exc_type, exc, tb)
+        _active = None
+        manifest = self.run.manifest()
+        manifest["status"] = "ok" if exc_type is None else f"error: {exc_type.__name__}"
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = self.run.started.strftime("%Y%m%dT%H%M%SZ")
+        path = self.out_dir / f"{self.name}-{stamp}.json"
+        text = json.dumps(manifest, indent=2)
+        path.write_text(text)
+        (self.out_dir / f"{self.name}-latest.json").write_text(text)
+        top = self.top.step
+        print(f"Run manifest: {path} (wall {top.wall:.2f}s, cpu {top.cpu:.2f}s, peak RSS {top.peak_rss_mb} MB)")
+        return False
+
+# ---------------- profiling hook ----------------
+
+def _profile_targets() -> set:
+    return {t.strip() for t in os.getenv("EV_PROFILE", "").split(",") if t.strip()}
+
+def profiled(fn):
+    """Profile `fn` when EV_PROFILE lists its name (or "all"); otherwise returns fn untouched."""
+    targets = _profile_targets()
+    if not targets or not ({"all", fn.__name__, fn.__qualname__} & targets):
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        if os.getenv("EV_PROFILER") == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                Profiler = None
+            if Profiler is not None:
+                prof = Profiler()
+                prof.start()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    prof.stop()
+                    out = PROFILES_DIR / f"{fn.__name__}-{stamp}.html"
+                    out.write_text(prof.output_html(), encoding="utf-8")
+                    print(f"Profile: {out}")
+        import cProfile
+        prof = cProfile.Profile()
+        try:
+            return prof.runcall(fn, *args, **kwargs)
+        finally:
+            out = PROFILES_DIR / f"{fn.__name__}-{stamp}.prof"
+            prof.dump_stats(out)
+            print(f"Profile: {out} (view: python -m pstats {out})")
+    return wrapper
+
+# ---------------- CLI ----------------
+
+def _fmt_bytes(n):
+    return f"{n / 2**20:.1f}MB" if n else "-"
+
+def show(manifest: dict):
+    print(f"{manifest['run']} started {manifest['started']} ({manifest.get('status', '?')})")
+    print(f"{'step':<44}{'wall s':>9}{'cpu s':>9}{'rss MB':>9}{'rows in':>10}{'rows out':>10}{'read':>9}{'written':>9}")
+    for s in manifest["steps"]:
+        print(f"{s['name']:<44}{s['wall_s']:>9.3f}{s['cpu_s']:>9.3f}{s['peak_rss_mb'] or 0:>9.1f}"
+              f"{s['rows_in'] if s['rows_in'] is not None else '-':>10}{s['rows_out'] if s['rows_out'] is not None else '-':>10}"
+              f"{_fmt_bytes(s['bytes_read']):>9}{_fmt_bytes(s['bytes_written']):>9}")
+        if "http" in s:
+            h = s["http"]
+            print(f"{'':<4}http: {h['requests']} requests, p50 {h['p50_ms']}ms p90 {h['p90_ms']}ms "
+                  f"p99 {h['p99_ms']}ms max {h['max_ms']}ms, {_fmt_bytes(h['bytes'])}, non-200 {h['non_200']}")
+
+def compare(old: dict, new: dict, min_seconds: float = 0.01) -> list:
+    """Per-step deltas (new - old), biggest wall-time regression first."""
+    before = {s["name"]: s for s in old["steps"]}
+    rows = []
+    for s in new["steps"]:
+        b = before.get(s["name"])
+        if b is None:
+            continue
+        rows.append({
+            "name": s["name"],
+            "wall_old": b["wall_s"], "wall_new": s["wall_s"], "wall_delta": round(s["wall_s"] - b["wall_s"], 4),
+            "wall_ratio": round(s["wall_s"] / b["wall_s"], 2) if b["wall_s"] >= min_seconds else None,
+            "cpu_delta": round(s["cpu_s"] - b["cpu_s"], 4),
+            "rss_delta": None if s["peak_rss_mb"] is None or b["peak_rss_mb"] is None
+                         else round(s["peak_rss_mb"] - b["peak_rss_mb"], 1),
+            "rows_out_old": b["rows_out"], "rows_out_new": s["rows_out"],
+        })
+    return sorted(rows, key=lambda r: r["wall_delta"], reverse=True)
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect and compare run manifests")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sh = sub.add_parser("show")
+    sh.add_argument("manifest", type=Path)
+    cmp_ = sub.add_parser("compare", help="where did the new run get slower?")
+    cmp_.add_argument("old", type=Path)
+    cmp_.add_argument("new", type=Path)
+    args = ap.parse_args()
+
+    if args.cmd == "show":
+        show(json.loads(args.manifest.read_text()))
+        return
+    old, new = json.loads(args.old.read_text()), json.loads(args.new.read_text())
+    print(f"{old['run']}: {old['started']} -> {new['started']}")
+    print(f"{'step':<44}{'old s':>9}{'new s':>9}{'delta s':>9}{'ratio':>7}{'cpu d':>8}{'rss d':>8}  rows out")
+    for r in compare(old, new):
+        ratio = f"x{r['wall_ratio']:.2f}" if r["wall_ratio"] is not None else "-"
+        rss = f"{r['rss_delta']:+.1f}" if r["rss_delta"] is not None else "-"
+        rows = "" if r["rows_out_old"] == r["rows_out_new"] else f"{r['rows_out_old']} -> {r['rows_out_new']}"
+        print(f"{r['name']:<44}{r['wall_old']:>9.3f}{r['wall_new']:>9.3f}{r['wall_delta']:>+9.3f}{ratio:>7}"
+              f"{r['cpu_delta']:>+8.3f}{rss:>8}  {rows}")
+    missing = {s["name"] for s in old["steps"]} ^ {s["name"] for s in new["steps"]}
+    if missing:
+        print(f"steps only in one run: {sorted(missing)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# src/pipeline.py
+"""
+Single-process pipeline runner.
+
+Stages form a DAG with declared input/output datasets:
+
+    extract -> make_kpis -> export_csv / make_insights / county_supply / snapshot /
+                            kpi_cube / station_busy / spatial_index -> opportunity_insights
+                                                                    -> bundles
+
+DataFrames are handed between stages in memory (and written to disk for Tableau
+and for the next run). Independent stages run in parallel on a thread pool.
+A stage is skipped when the content hashes of its input files and of its code
+match the previous run (recorded in data/processed/.pipeline_state.json), so a
+change to the siting weights reruns only county_supply.
+
+    python src/pipeline.py                 # transforms only, raw CSV already present
+    python src/pipeline.py --extract       # incremental AFDC refresh first
+    python src/pipeline.py --force         # ignore the cache
+    python src/pipeline.py --sql           # county KPIs from sql/*.sql (SQLite) instead of pandas
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+sys.path[:0] = [str(SRC / "extract"), str(SRC / "transform")]
+
+import pandas as pd
+
+import make_kpis
+import kpi_cube
+import make_insights
+import insight_rules
+import make_county_supply
+import make_station_busy
+import opportunity_insights
+import sql_engine
+import snapshots
+import bundles
+from processed_store import read_table, write_table, parquet_path
+from reference import ZIP_XWALK, load_zip_xwalk
+from spatial_index import StationIndex, INDEX_OUT
+
+PROCESSED = ROOT / "data" / "processed"
+INSIGHTS = PROCESSED / "insights"
+STATE_PATH = PROCESSED / ".pipeline_state.json"
+
+def _save_csv(df, path):
+    df.to_csv(path, index=False)
+
+class Dataset:
+    """A named table on disk. `load`/`save` default to plain CSV."""
+    def __init__(self, path, load=None, save=None):
+        self.path = Path(path)
+        self.load = load or (lambda: pd.read_csv(self.path, low_memory=False))
+        self.save = save or (lambda df: _save_csv(df, self.path))
+
+class Stage:
+    def __init__(self, name, func, inputs, outputs, code, always_run=False):
+        self.name = name
+        self.func = func              # func(**{input: DataFrame}) -> {output: DataFrame or None}
+        self.inputs = inputs
+        self.outputs = outputs
+        self.code = [SRC / c for c in code]
+        self.always_run = always_run  # e.g. extract: inputs live on the network
+
+def _insights(county_summary):
+    return {f"insights/{k[:-4]}": v for k, v in make_insights.build_insights(county_summary).items()}
+
+def _opportunities(stations, region_summary, spatial_index):
+    tables = opportunity_insights.build_opportunities(stations, region_summary, spatial_index)
+    return {f"insights/{k[:-4]}": v for k, v in tables.items()}
+
+def _county_supply(stations, zip_xwalk, ev_counts):
+    final, top10 = make_county_supply.build_county_supply(
+        stations, zip_xwalk, make_county_supply.normalize_ev_counts(ev_counts))
+    return {"county_supply": final, "siting_top10": top10}
+
+def _kpi_cube(stations, ev_counts, zip_xwalk):
+    return {"kpi_cube": kpi_cube.build_cube(stations, make_county_supply.normalize_ev_counts(ev_counts), zip_xwalk)}
+
+def _station_busy(stations, zip_xwalk):
+    scored = make_station_busy.score_stations(stations, zip_xwalk)
+    return {"station_busy_candidates": scored, "station_busy_top25": scored.head(25)}
+
+def _snapshot(stations, zip_xwalk):
+    snapshots.record(stations)    # no-op when nothing changed since the last version
+    snapshots.rollup(xw=zip_xwalk)
+    return {"county_kpis_timeseries": None}   # appended to on disk by rollup
+
+def _bundles(stations, zip_xwalk, **tables):
+    bundles.build_bundles(stations, zip_xwalk, tables)
+    return {"bundles": None}   # content-hashed files + manifest written by build_bundles
+
+def _extract():
+    import afdc_refresh
+    api_key = os.getenv("NREL_API_KEY")
+    if not api_key:
+        raise SystemExit('ERROR: NREL_API_KEY not set. In PowerShell: $env:NREL_API_KEY = "YOUR_KEY"')
+    afdc_refresh.ensure_dirs()
+    afdc_refresh.refresh(api_key)
+    return {"raw_stations": None}   # written to disk by afdc_refresh
+
+DATASETS = {
+    "raw_stations": Dataset(ROOT / make_kpis.RAW_CSV, load=lambda: make_kpis.load_raw(ROOT / make_kpis.RAW_CSV)),
+    "zip_xwalk": Dataset(ZIP_XWALK, load=load_zip_xwalk),
+    "ev_counts": Dataset(make_county_supply.EV_COUNTS),
+    "stations": Dataset(parquet_path("stations_ca"), load=lambda: read_table("stations_ca"),
+                        save=lambda df: write_table(df, "stations_ca")),
+    "stations_csv": Dataset(PROCESSED / "stations_ca.csv"),
+    "spatial_index": Dataset(INDEX_OUT, load=StationIndex.load, save=lambda idx: idx.save(INDEX_OUT)),
+    "ports": Dataset(PROCESSED / "ports_ca.csv"),
+    "county_summary": Dataset(PROCESSED / "ev_summary_by_county.csv"),
+    "region_summary": Dataset(PROCESSED / "ev_summary_by_region.csv"),
+    "county_kpis_timeseries": Dataset(snapshots.TIMESERIES_OUT),
+    "kpi_cube": Dataset(kpi_cube.CUBE_OUT),
+    "county_supply": Dataset(make_county_supply.OUT_CSV),
+    "siting_top10": Dataset(make_county_supply.OUT_TOP10),
+    "station_busy_candidates": Dataset(make_station_busy.OUT_ALL),
+    "station_busy_top25": Dataset(make_station_busy.OUT_TOP),
+    "bundles": Dataset(bundles.BUNDLE_DIR / bundles.MANIFEST_NAME),
+}
+for _rule in insight_rules.RULES:
+    DATASETS[f"insights/{_rule['output'][:-4]}"] = Dataset(INSIGHTS / _rule["output"])
+
+def _rule_outputs(group):
+    return [f"insights/{r['output'][:-4]}" for r in insight_rules.rules_for(group)]
+
+STAGES = [
+    Stage("extract", _extract, [], ["raw_stations"],
+          ["extract/afdc_refresh.py", "extract/afdc_fetch.py", "extract/afdc_last_updated.py"],
+          always_run=True),
+    Stage("make_kpis", lambda raw_stations: make_kpis.build_kpis(raw_stations),
+          ["raw_stations"], ["stations", "ports", "county_summary", "region_summary"],
+          ["transform/make_kpis.py", "transform/cleaning.py", "transform/availability.py",
+           "transform/processed_store.py"]),
+    Stage("export_csv", lambda stations: {"stations_csv": stations},
+          ["stations"], ["stations_csv"], ["transform/processed_store.py"]),
+    Stage("snapshot", _snapshot, ["stations", "zip_xwalk"], ["county_kpis_timeseries"],
+          ["transform/snapshots.py", "transform/reference.py"]),
+    Stage("kpi_cube", _kpi_cube, ["stations", "ev_counts", "zip_xwalk"], ["kpi_cube"],
+          ["transform/kpi_cube.py", "transform/station_table.py", "transform/make_county_supply.py",
+           "transform/reference.py"]),
+    Stage("spatial_index", lambda stations: {"spatial_index": StationIndex.from_stations(stations)},
+          ["stations"], ["spatial_index"], ["transform/spatial_index.py"]),
+    Stage("make_insights", _insights, ["county_summary"], _rule_outputs("county"),
+          ["transform/make_insights.py", "transform/insight_rules.py"]),
+    Stage("county_supply", _county_supply, ["stations", "zip_xwalk", "ev_counts"],
+          ["county_supply", "siting_top10"],
+          ["transform/make_county_supply.py", "transform/availability.py", "transform/reference.py"]),
+    Stage("station_busy", _station_busy, ["stations", "zip_xwalk"],
+          ["station_busy_candidates", "station_busy_top25"],
+          ["transform/make_station_busy.py", "transform/reference.py"]),
+    Stage("opportunity_insights", _opportunities, ["stations", "region_summary", "spatial_index"],
+          _rule_outputs("opportunity"),
+          ["transform/opportunity_insights.py", "transform/insight_rules.py", "transform/spatial_index.py"]),
+    Stage("bundles", _bundles,
+          ["stations", "zip_xwalk"] + list(bundles.TABLES) + _rule_outputs("county") + _rule_outputs("opportunity"),
+          ["bundles"], ["transform/bundles.py", "transform/make_station_busy.py", "transform/reference.py"]),
+]
+
+def _dataset_for(target: str) -> str:
+    """Dataset name for a path annotated in a .sql file (registered if new)."""
+    path = (ROOT / target).resolve()
+    for name, ds in DATASETS.items():
+        if ds.path.resolve() == path:
+            return name
+    DATASETS[target] = Dataset(path)
+    return target
+
+def sql_stage(path: Path) -> Stage:
+    """One stage per .sql file: stations -> SQLite (in memory) -> annotated outputs."""
+    def run(stations):
+        conn = sql_engine.connect()
+        sql_engine.load_stations(conn, stations)
+        return {_dataset_for(t): df for t, df in sql_engine.run_sql_file(conn, path).items()}
+    outputs = [_dataset_for(t) for t in sql_engine.sql_outputs(path)]
+    return Stage(f"sql_{path.stem}", run, ["stations"], outputs,
+                 ["transform/sql_engine.py", f"../sql/{path.name}"])
+
+def _drop_outputs(stage: Stage, claimed: set) -> Stage:
+    """Copy of `stage` that no longer produces (or writes) `claimed` datasets."""
+    if not claimed & set(stage.outputs):
+        return stage
+    func = stage.func
+    out = Stage(stage.name, lambda **kw: {k: v for k, v in func(**kw).items() if k not in claimed},
+                stage.inputs, [o for o in stage.outputs if o not in claimed], [], stage.always_run)
+    out.code = stage.code
+    return out
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def load_state() -> dict:
+    if STATE_PATH.exists():
+        return json.loads(STATE_PATH.read_text())
+    return {}
+
+def save_state(state: dict):
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(json.dumps(state, indent=2, sort_keys=True))
+
+class Runner:
+    def __init__(self, stages, datasets, force=False, workers=4):
+        self.stages = {s.name: s for s in stages}
+        self.datasets = datasets
+        self.force = force
+        self.workers = workers
+        self.producer = {o: s.name for s in stages for o in s.outputs}
+        self.frames = {}          # dataset name -> DataFrame handed between stages
+        self.hashes = {}          # dataset name -> content hash of its file
+        self.lock = threading.Lock()
+        self.load_locks = {name: threading.Lock() for name in datasets}
+        self.state = load_state()
+
+    def deps(self, stage):
+        return {self.producer[i] for i in stage.inputs if i in self.producer and self.producer[i] in self.stages}
+
+    def input_hash(self, name):
+        with self.lock:
+            if name in self.hashes:
+                return self.hashes[name]
+        path = self.datasets[name].path
+        if not path.exists():
+            raise FileNotFoundError(f"Pipeline input missing: {path}")
+        h = file_hash(path)
+        with self.lock:
+            self.hashes[name] = h
+        return h
+
+    def frame(self, name):
+        with self.load_locks[name]:
+            if name not in self.frames:
+                self.frames[name] = self.datasets[name].load()
+            return self.frames[name]
+
+    def stage_key(self, stage):
+        h = hashlib.sha256()
+        for path in stage.code:
+            h.update(path.read_bytes())
+        for name in stage.inputs:
+            h.update(name.encode())
+            h.update(self.input_hash(name).encode())
+        return h.hexdigest()
+
+    def is_fresh(self, stage, key):
+        prev = self.state.get(stage.name)
+        if self.force or stage.always_run or not prev or prev.get("key") != key:
+            return False
+        for name, digest in prev.get("outputs", {}).items():
+            path = self.datasets[name].path
+            if not path.exists() or file_hash(path) != digest:
+                return False
+        return True
+
+    def run_stage(self, stage):
+        t0 = time.perf_counter()
+        key = None if stage.always_run else self.stage_key(stage)
+        if key is not None and self.is_fresh(stage, key):
+            with self.lock:
+                self.hashes.update(self.state[stage.name]["outputs"])
+            return stage.name, "skipped", time.perf_counter() - t0
+
+        out = stage.func(**{name: self.frame(name) for name in stage.inputs})
+        produced = {}
+        for name, df in out.items():
+            ds = self.datasets[name]
+            ds.path.parent.mkdir(parents=True, exist_ok=True)
+            if df is not None:
+                ds.save(df)
+                with self.load_locks[name]:
+                    self.frames[name] = df
+            else:
+                with self.load_locks[name]:
+                    self.frames.pop(name, None)
+            produced[name] = file_hash(ds.path)
+        with self.lock:
+            self.hashes.update(produced)
+            if key is not None:
+                self.state[stage.name] = {"key": key, "outputs": produced}
+        return stage.name, "ran", time.perf_counter() - t0
+
+    def run(self):
+        done, running = set(), {}
+        pending = dict(self.stages)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if self.deps(stage) <= done:
+                        running[pool.submit(self.run_stage, stage)] = name
+                        del pending[name]
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    _, status, secs = fut.result()
+                    done.add(name)
+                    print(f"[{status:>7}] {name} ({secs:.2f}s)")
+        save_state(self.state)
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the EV charging pipeline as a cached DAG")
+    ap.add_argument("--extract", action="store_true", help="run the incremental AFDC refresh first")
+    ap.add_argument("--force", action="store_true", help="rerun every stage regardless of hashes")
+    ap.add_argument("--workers", type=int, default=4, help="stages run in parallel")
+    ap.add_argument("--sql", action="store_true",
+                    help="run sql/*.sql as stages; their annotated outputs replace the pandas ones")
+    ap.add_argument("--only", nargs="+", metavar="STAGE",
+                    help="run only these stages (their inputs must already exist on disk)")
+    args = ap.parse_args()
+
+    os.chdir(ROOT)   # stage modules use repo-relative data/ paths
+    stages = [s for s in STAGES if args.extract or s.name != "extract"]
+    if args.sql:
+        sql_stages = [sql_stage(p) for p in sorted(sql_engine.SQL_DIR.glob("*.sql"))]
+        claimed = {o for s in sql_stages for o in s.outputs}
+        stages = [_drop_outputs(s, claimed) for s in stages] + sql_stages
+    if args.only:
+        unknown = set(args.only) - {s.name for s in stages}
+        if unknown:
+            raise SystemExit(f"ERROR: unknown stages: {sorted(unknown)}")
+        stages = [s for s in stages if s.name in args.only]
+
+    t0 = time.perf_counter()
+    Runner(stages, DATASETS, force=args.force, workers=args.workers).run()
+    print(f"Pipeline finished in {time.perf_counter() - t0:.2f}s")
+
+if __name__ == "__main__":
+    main()
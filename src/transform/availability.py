@@ -0,0 +1,351 @@
+# src/transform/availability.py
+"""
+Structured availability from AFDC `access_days_time`.
+
+The free-text field ("5:30am-9pm; pay lot", "24 hours daily", "Fleet use only",
+"Mon: 6:00am-11:59pm; Tue: ...") is parsed into weekly open intervals (minutes
+from Monday 00:00) plus access flags. Each distinct string is parsed once
+(memoized); stations point at their string's pattern.
+
+AvailabilityIndex keeps one 168-bit hour-of-week row per pattern (an hour counts
+as open when the station is open at hh:30), so "ports available in county X at
+time T" is one column lookup + gather for every station at once.
+
+Assumptions:
+  - no stated hours -> open 24/7 (flag hours_known=False)
+  - "closed" / "temporarily closed" -> 0 hours, for the whole string or its days
+    ("sun: closed", "8am-6pm; closed weekends"); "closed on holidays" is ignored
+  - "8-5" (no am/pm, end before start) -> 8am-5pm; "7am-7pm M-F, 8am-5pm Sat-Sun"
+    -> each time range on its own days
+  - "business hours" -> BUSINESS_HOURS (Mon-Fri 8am-6pm), flag hours_assumed
+  - fleet / employee / tenant / customer / guest / ... "use only" -> restricted (not public)
+
+County is the ZIP-derived one (reference.attach_county_from_zip, as in
+make_county_supply): the AFDC `county` field is blank for CA stations.
+
+Effective 24/7 capacity = ports x (open hours / 168), public stations only; used
+by make_county_summary (effective_ports) and, optionally, the siting score.
+
+    python src/transform/availability.py --at "Tue 02:00"
+    python src/transform/availability.py --at "Sat 14:30" --county Riverside
+    python src/transform/availability.py --parse "8am-4:30pm M-F; pay lot"
+"""
+import re
+import argparse
+from functools import lru_cache
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from processed_store import read_table
+from reference import ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+
+STATIONS_IN = "stations_ca"
+
+MINUTES_PER_DAY = 1440
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+HOURS_PER_WEEK = 168
+
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+DAY_TOKENS = {
+    "mon": 0, "monday": 0, "mo": 0, "m": 0,
+    "tue": 1, "tues": 1, "tuesday": 1, "tu": 1,
+    "wed": 2, "wednesday": 2, "we": 2, "w": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3, "th": 3, "r": 3,
+    "fri": 4, "friday": 4, "fr": 4, "f": 4,
+    "sat": 5, "saturday": 5, "sa": 5,
+    "sun": 6, "sunday": 6, "su": 6,
+}
+BUSINESS_HOURS = [(d, 8 * 60, 18 * 60) for d in range(5)]     # (day, start, end) in minutes
+
+# flag -> patterns (lowercase text); restricted = not open to the general public
+FLAG_PATTERNS = {
+    "fleet_only": r"\bfleet\b",
+    "employee_only": r"\b(employee|workers?|staff)\b",
+    "restricted": r"\buse only\b|\bfor [\w/ ]+ only\b",
+    "pay_lot": r"\bpay lot\b|\bpaid parking\b|\bparking fee\b",
+    "permit_required": r"\b(permit|pass) required\b",
+    "valet": r"\bvalet\b",
+    "bring_own_cordset": r"\bcordset\b",
+    "time_limit": r"\b\d+\s*(hour|hr)s?\s*(limit|maximum|max)\b",
+}
+FLAGS = list(FLAG_PATTERNS) + ["hours_known", "hours_assumed"]
+_FLAG_RE = {k: re.compile(v) for k, v in FLAG_PATTERNS.items()}
+
+_TIME = r"(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)?|(noon|midnight)"
+_RANGE_RE = re.compile(rf"(?<![\d:])(?:{_TIME})\s*(?:-|–|to)\s*(?:{_TIME})(?![\d:])")   # not inside phone numbers
+_DAY_PREFIX_RE = re.compile(r"^\s*([a-z]+)\s*:\s*(.*)$")
+_DAY_RANGE_RE = re.compile(r"\b([a-z]+)\s*-\s*([a-z]+)\b")
+_ALL_DAY_RE = re.compile(r"\b24\s*(hours|hrs|/\s*7)\b|\bopen 24\b|\ball day\b")
+_CLOSED_RE = re.compile(r"\bclosed\b")
+_HOLIDAY_RE = re.compile(r"\bholidays?\b")
+
+def _minutes(hour, minute, ampm, word, is_end: bool):
+    if word:
+        return 12 * 60 if word == "noon" else (MINUTES_PER_DAY if is_end else 0)
+    h, m = int(hour), int(minute or 0)
+    if ampm:
+        pm = ampm.startswith("p")
+        h = h % 12 + (12 if pm else 0)
+    t = h * 60 + m
+    return MINUTES_PER_DAY if is_end and t == 0 else t
+
+def _range_minutes(m) -> tuple:
+    """A _RANGE_RE match -> (start, end) minutes; end may exceed a day (overnight)."""
+    g = m.groups()
+    start_ampm, end_ampm = g[2], g[6]
+    if start_ampm is None and end_ampm is not None and g[0] is not None:
+        # "8-5pm" style: borrow the end's am/pm unless that puts the start after the end
+        start_ampm = end_ampm if _minutes(g[0], g[1], end_ampm, None, False) < \
+            _minutes(g[4], g[5], end_ampm, g[7], True) else "am"
+    start = _minutes(g[0], g[1], start_ampm, g[3], False)
+    end = _minutes(g[4], g[5], end_ampm, g[7], True)
+    if start_ampm is None and end_ampm is None and g[0] is not None and g[4] is not None and end < start:
+        # "8-5": no am/pm on either end and the end is earlier -> the end is pm ("22-2" stays overnight)
+        pm_end = _minutes(g[4], g[5], "pm", None, True)
+        end = pm_end if start < pm_end else end
+    if end <= start:
+        end += MINUTES_PER_DAY      # e.g. 6am-2am
+    return start, end
+
+def _time_ranges(text: str) -> list:
+    """Every 'start-end' in text -> [(start, end, match), ...]."""
+    return [(*_range_minutes(m), m) for m in _RANGE_RE.finditer(text)]
+
+def _days(text: str):
+    """Days mentioned in text ('M-F', 'Mon-Sat', 'weekends', 'Sat, Sun'); None if none/daily."""
+    if re.search(r"\bdaily\b|\bevery ?day\b|\b7 days\b", text):
+        return None
+    if re.search(r"\bweekdays?\b", text):
+        return list(range(5))
+    if re.search(r"\bweekends?\b", text):
+        return [5, 6]
+    days = set()
+    for a, b in _DAY_RANGE_RE.findall(text):
+        if a in DAY_TOKENS and b in DAY_TOKENS:
+            i, j = DAY_TOKENS[a], DAY_TOKENS[b]
+            days.update(range(i, j + 1) if i <= j else list(range(i, 7)) + list(range(0, j + 1)))
+    if not days:
+        for tok in re.findall(r"\b[a-z]+\b", text):
+            if tok in DAY_TOKENS and len(tok) >= 3:
+                days.add(DAY_TOKENS[tok])
+    return sorted(days) or None
+
+def _range_days(seg: str, ranges: list) -> list:
+    """
+    Days of each time range in a segment. One range: days anywhere in the segment.
+    Several ("7am-7pm M-F, 8am-5pm Sat-Sun", "M-F 7am-7pm, Sat 9am-1pm"): each range
+    takes the day list after it, or before it when the segment starts with days; a
+    range with none ("8am-12pm, 1pm-5pm M-F") shares its neighbour's.
+    """
+    if len(ranges) == 1:
+        m = ranges[0][2]
+        return [_days(seg[:m.start()] + " " + seg[m.end():])]
+    cuts = [0] + [x for _, _, m in ranges for x in (m.start(), m.end())] + [len(seg)]
+    pieces = [_days(seg[a:b]) for a, b in zip(cuts[::2], cuts[1::2])]     # text around the ranges
+    if pieces[0] is not None:           # days lead: range i <- piece i, else the previous range's
+        days = pieces[:-1]
+        for i in range(1, len(days)):
+            days[i] = days[i] or days[i - 1]
+    else:                               # days trail: range i <- piece i + 1, else the next range's
+        days = pieces[1:]
+        for i in range(len(days) - 2, -1, -1):
+            days[i] = days[i] or days[i + 1]
+    return days
+
+@lru_cache(maxsize=None)
+def parse(text) -> tuple:
+    """
+    access_days_time -> (intervals, flags). intervals: sorted ((start, end), ...) in
+    minutes from Monday 00:00 (end may run past the week end); flags: dict of FLAGS.
+    """
+    low = "" if text is None or text is pd.NA else str(text).lower()
+    flags = {k: bool(rx.search(low)) for k, rx in _FLAG_RE.items()}
+    flags["restricted"] |= flags["fleet_only"] or flags["employee_only"]
+
+    spans, closed, known, assumed = [], set(), False, False
+    for seg in low.split(";"):
+        seg = seg.strip()
+        if not seg:
+            continue
+        prefix = _DAY_PREFIX_RE.match(seg)
+        if prefix and prefix.group(1) in DAY_TOKENS:        # "mon: 6:00am-11:59pm" / "sun: closed"
+            day, body = DAY_TOKENS[prefix.group(1)], prefix.group(2)
+            known = True
+            if _ALL_DAY_RE.search(body):
+                spans.append((day, 0, MINUTES_PER_DAY))
+            else:                                           # "mon: 8am-12pm, 1pm-5pm"
+                spans += [(day, s, e) for s, e, _ in _time_ranges(body)]
+            continue
+        if _ALL_DAY_RE.search(seg):
+            known = True
+            spans += [(d, 0, MINUTES_PER_DAY) for d in (_days(seg) or range(7))]
+            continue
+        ranges = _time_ranges(seg)
+        if ranges:
+            known = True
+            for (s, e, _), days in zip(ranges, _range_days(seg, ranges)):
+                spans += [(d, s, e) for d in (days or range(7))]
+            continue
+        if _CLOSED_RE.search(seg) and not _HOLIDAY_RE.search(seg):   # "closed", "temporarily closed", "closed sun"
+            days = _days(seg)
+            if days is None and prefix:     # "xx: closed" with an unknown day token: not the whole week
+                continue
+            closed.update(days or range(7))
+            continue
+        if "business hours" in seg and not known:
+            known = assumed = True
+            spans += BUSINESS_HOURS
+
+    if not known:                                           # no hours stated -> assume always open
+        spans = [(d, 0, MINUTES_PER_DAY) for d in range(7)]
+    spans = [sp for sp in spans if sp[0] not in closed]
+    known |= len(closed) == 7
+    flags["hours_known"] = known and not assumed
+    flags["hours_assumed"] = assumed
+    intervals = tuple(sorted({(d * MINUTES_PER_DAY + s, d * MINUTES_PER_DAY + e) for d, s, e in spans}))
+    return intervals, flags
+
+def hour_bits(intervals) -> np.ndarray:
+    """168 booleans: open at hh:30 of each hour of the week (overnight spans wrap to Monday)."""
+    mid = np.arange(HOURS_PER_WEEK) * 60 + 30
+    out = np.zeros(HOURS_PER_WEEK, dtype=bool)
+    for s, e in intervals:
+        out |= ((mid >= s) & (mid < e)) | ((mid + MINUTES_PER_WEEK >= s) & (mid + MINUTES_PER_WEEK < e))
+    return out
+
+@lru_cache(maxsize=None)
+def public_hours_of(text) -> int:
+    """Hours per week a station with this access_days_time is open to the public."""
+    intervals, flags = parse(text)
+    return 0 if flags["restricted"] else int(hour_bits(intervals).sum())
+
+def weekly_share_of(text) -> float:
+    """Fraction of the week a station with this access_days_time is open to the public."""
+    return public_hours_of(text) / HOURS_PER_WEEK
+
+def hour_of_week(when) -> int:
+    """datetime or 'Tue 02:00' -> hour index (Monday 00:00-00:59 = 0)."""
+    if isinstance(when, str):
+        m = re.fullmatch(r"\s*([A-Za-z]+)\s+(\d{1,2})(?::(\d{2}))?\s*", when)
+        if m and m.group(1).lower() in DAY_TOKENS:
+            hour = int(m.group(2))
+            if hour > 23:
+                raise ValueError(f"bad hour in {when!r}")
+            return DAY_TOKENS[m.group(1).lower()] * 24 + hour
+        when = datetime.fromisoformat(when)
+    return when.weekday() * 24 + when.hour
+
+class AvailabilityIndex:
+    """Per-pattern 168-bit hour masks (packed) + flags; per-station pattern codes."""
+    def __init__(self, codes, patterns):
+        self.codes = np.asarray(codes, dtype=np.int32)
+        parsed = [parse(p) for p in patterns]
+        self.patterns = list(patterns)
+        self.bits = np.packbits(np.array([hour_bits(iv) for iv, _ in parsed], dtype=bool).reshape(-1, HOURS_PER_WEEK), axis=1)
+        self.flags = pd.DataFrame([f for _, f in parsed], columns=FLAGS)
+        self.open_hours = np.unpackbits(self.bits, axis=1)[:, :HOURS_PER_WEEK].sum(axis=1)
+
+    @classmethod
+    def from_stations(cls, df: pd.DataFrame) -> "AvailabilityIndex":
+        codes, uniques = pd.factorize(df["access_days_time"].astype("string").fillna(""))
+        return cls(codes, list(uniques))
+
+    def open_at(self, when) -> np.ndarray:
+        """Per station: open at `when` (datetime, ISO string or 'Tue 02:00')."""
+        h = hour_of_week(when)
+        per_pattern = (self.bits[:, h // 8] >> (7 - h % 8)) & 1
+        return per_pattern.astype(bool)[self.codes]
+
+    def public(self) -> np.ndarray:
+        return ~self.flags["restricted"].to_numpy()[self.codes]
+
+    def weekly_share(self) -> np.ndarray:
+        """Per station: fraction of the week open, 0 for restricted (non-public) stations."""
+        share = self.open_hours / HOURS_PER_WEEK * ~self.flags["restricted"].to_numpy()
+        return share[self.codes]
+
+    def public_hours(self) -> np.ndarray:
+        """Per station: open hours per week (int64), 0 for restricted (non-public) stations."""
+        hours = self.open_hours.astype(np.int64) * ~self.flags["restricted"].to_numpy()
+        return hours[self.codes]
+
+    def station_flags(self) -> pd.DataFrame:
+        return self.flags.iloc[self.codes].reset_index(drop=True)
+
+def public_port_hours(df: pd.DataFrame, index: AvailabilityIndex = None) -> np.ndarray:
+    """Ports x public open hours per week (int64); effective_ports x 168, exact to sum and merge."""
+    index = index or AvailabilityIndex.from_stations(df)
+    ports = df["ev_level2_evse_num"].to_numpy(dtype=np.int64) + df["ev_dc_fast_num"].to_numpy(dtype=np.int64)
+    return ports * index.public_hours()
+
+def effective_ports(df: pd.DataFrame, index: AvailabilityIndex = None) -> pd.Series:
+    """Ports x (public open hours / 168): capacity equivalent to always-open public ports."""
+    index = index or AvailabilityIndex.from_stations(df)
+    ports = df["ev_level2_evse_num"].to_numpy() + df["ev_dc_fast_num"].to_numpy()
+    return pd.Series(ports * index.weekly_share(), index=df.index)
+
+def ports_available(df: pd.DataFrame, when, by: str = "county", public_only: bool = True,
+                    index: AvailabilityIndex = None) -> pd.DataFrame:
+    """Level 2 / DCFC ports open at `when`, grouped by `by`, for every station in one pass."""
+    index = index or AvailabilityIndex.from_stations(df)
+    ok = index.open_at(when)
+    if public_only:
+        ok &= index.public()
+    out = pd.DataFrame({
+        by: df[by].to_numpy(),
+        "stations_open": ok.astype(np.int64),
+        "level2_ports_open": np.where(ok, df["ev_level2_evse_num"].to_numpy(), 0),
+        "dcfc_ports_open": np.where(ok, df["ev_dc_fast_num"].to_numpy(), 0),
+        "ports_total": df["ev_level2_evse_num"].to_numpy() + df["ev_dc_fast_num"].to_numpy(),
+    })
+    grp = out.groupby(by, dropna=False, observed=True).sum().reset_index()
+    grp["ports_open"] = grp["level2_ports_open"] + grp["dcfc_ports_open"]
+    grp["open_share"] = (grp["ports_open"] / grp["ports_total"]).fillna(0).round(4)
+    return grp.sort_values("ports_open", ascending=False)
+
+def attach_zip_county(df: pd.DataFrame, xw: pd.DataFrame = None) -> pd.DataFrame:
+    """Replace the (blank) AFDC county with the ZIP-derived one; one county per ZIP."""
+    xw = load_zip_xwalk(ZIP_XWALK) if xw is None else xw
+    out = attach_county_from_zip(df.drop(columns=["county"], errors="ignore"), xw.drop_duplicates("zip"))
+    return out.drop(columns="county_fips").set_axis(df.index)
+
+def main():
+    ap = argparse.ArgumentParser(description="Parse access_days_time; ports available at a given time")
+    ap.add_argument("--at", help="'Tue 02:00' or ISO datetime")
+    ap.add_argument("--by", default="county", help="grouping column (default county, ZIP-derived)")
+    ap.add_argument("--county", help="only this county")
+    ap.add_argument("--include-restricted", action="store_true", help="count fleet/employee/... stations too")
+    ap.add_argument("--parse", help="show how one access_days_time string is parsed")
+    args = ap.parse_args()
+
+    if args.parse:
+        intervals, flags = parse(args.parse)
+        for s, e in intervals:
+            d = s // MINUTES_PER_DAY
+            print(f"{DAY_NAMES[d]} {(s % MINUTES_PER_DAY) // 60:02d}:{s % 60:02d} - "
+                  f"+{(e - s) // 60}h{(e - s) % 60:02d}m")
+        print({k: v for k, v in flags.items() if v})
+        return
+
+    cols = ["zip", "region", "access_days_time", "ev_level2_evse_num", "ev_dc_fast_num"]
+    df = attach_zip_county(read_table(STATIONS_IN, columns=cols))
+    if args.county:
+        df = df[df["county"].astype("string").str.lower() == args.county.lower()]
+    index = AvailabilityIndex.from_stations(df)
+    print(f"{len(df)} stations, {len(index.patterns)} distinct access_days_time strings")
+    if not args.at:
+        summary = index.flags.assign(stations=np.bincount(index.codes, minlength=len(index.patterns)),
+                                     open_hours=index.open_hours)
+        print(summary.groupby(["restricted", "hours_known", "hours_assumed"])["stations"].sum().to_string())
+        print(f"effective 24/7 ports: {effective_ports(df, index).sum():,.0f} of "
+              f"{int((df['ev_level2_evse_num'] + df['ev_dc_fast_num']).sum()):,}")
+        return
+    try:
+        out = ports_available(df, args.at, args.by, not args.include_restricted, index)
+    except ValueError as e:
+        raise SystemExit(f"ERROR: {e}")
+    print(out.head(25).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
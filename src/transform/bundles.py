@@ -0,0 +1,198 @@
+# src/transform/bundles.py
+"""
+Static data bundles for the web app and dashboards.
+
+Instead of downloading loose CSVs (station_busy_candidates.csv, insights/*.csv) and
+parsing them whole, the client reads manifest.json and fetches only what it shows:
+
+  stations/county/<county>.<hash>.json.gz      one file per county
+  stations/tile/<z>/<x>/<y>.<hash>.json.gz     one file per web-map tile (zoom TILE_ZOOM)
+  tables/<name>.<hash>.json.gz                 small tables (county / region KPIs, insights)
+
+Station rows carry id, name, network, location, port counts, connectors and
+likely_busy_score, so the busy list needs no separate download. Tiles use the
+standard slippy-map scheme (x, y of the tile containing lat/lon at zoom z), so a
+viewport maps to tile names on the client; the manifest lists the non-empty ones.
+
+Each file is columnar JSON ({"columns": [...], "rows": n, "data": [[col 0 values], ...]}),
+gzip-compressed (plus .br when the `brotli` package is installed). File names carry
+a hash of the content, so they can be cached forever; manifest.json (short cache)
+maps partitions to the current files. A partition whose content did not change keeps
+its file and is not rewritten; superseded bundle files (<stem>.<hash>.json.gz|br under
+stations/ and tables/) are deleted. Nothing else in the output directory is touched.
+
+    python src/transform/bundles.py
+    python src/transform/bundles.py --zoom 9 --out web/public/data
+"""
+import re
+import gzip
+import json
+import hashlib
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+try:
+    import brotli
+except ImportError:   # optional: .br files only when installed
+    brotli = None
+
+from processed_store import read_table
+from reference import ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+from make_station_busy import busy_score
+
+ROOT = Path(__file__).resolve().parents[2]
+PROCESSED = ROOT / "data" / "processed"
+BUNDLE_DIR = ROOT / "data" / "bundles"
+MANIFEST_NAME = "manifest.json"
+
+STATIONS_IN = "stations_ca"
+TILE_ZOOM = 8            # ~150 km tiles; CA fits in ~60
+COORD_DECIMALS = 5       # ~1 m
+HASH_CHARS = 16
+UNKNOWN = "(unknown)"    # stations whose ZIP has no county in the crosswalk
+SUBDIRS = ("stations", "tables")     # the only trees prune() touches
+BUNDLE_FILE = re.compile(rf"\.[0-9a-f]{{{HASH_CHARS}}}\.json\.(gz|br)$")
+
+STATION_SOURCE_COLS = ["id", "station_name", "ev_network", "city", "zip", "latitude", "longitude",
+                       "ev_level2_evse_num", "ev_dc_fast_num", "ev_connector_types"]
+STATION_COLS = ["id", "station_name", "ev_network", "city", "zip", "county", "latitude", "longitude",
+                "level2_ports", "dcfc_ports", "ev_connector_types", "likely_busy_score"]
+
+# name -> CSV under data/processed bundled whole (skipped when missing), plus insights/*.csv
+TABLES = {
+    "county_summary": "ev_summary_by_county.csv",
+    "region_summary": "ev_summary_by_region.csv",
+    "county_supply": "ev_county_supply_vs_demand.csv",
+    "siting_top10": "siting_score_top10_counties.csv",
+    "station_busy_top25": "station_busy_top25.csv",
+}
+
+def station_rows(stations: pd.DataFrame, xw: pd.DataFrame) -> pd.DataFrame:
+    """Cleaned stations -> STATION_COLS, county from the ZIP crosswalk (one county per ZIP)."""
+    df = attach_county_from_zip(stations[STATION_SOURCE_COLS], xw.drop_duplicates("zip"))
+    df["county"] = df["county"].fillna(UNKNOWN)
+    df = df.rename(columns={"ev_level2_evse_num": "level2_ports", "ev_dc_fast_num": "dcfc_ports"})
+    df["likely_busy_score"] = busy_score(df["dcfc_ports"], df["level2_ports"])
+    for c in ["latitude", "longitude"]:
+        df[c] = df[c].round(COORD_DECIMALS)
+    return df[STATION_COLS].sort_values("id", kind="stable").reset_index(drop=True)
+
+def tile_xy(lat, lon, zoom: int = TILE_ZOOM):
+    """Slippy-map tile (x, y) containing each lat/lon at `zoom`."""
+    n = 2 ** zoom
+    lat = np.radians(np.clip(np.asarray(lat, dtype=float), -85.0511, 85.0511))
+    x = np.floor((np.asarray(lon, dtype=float) + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(int), np.clip(y, 0, n - 1).astype(int)
+
+def slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", str(name).lower()).strip("-") or "unknown"
+
+def encode(df: pd.DataFrame) -> bytes:
+    """Columnar JSON: missing values -> null, numpy scalars -> JSON numbers."""
+    data = []
+    for c in df.columns:
+        col = df[c].astype(object)
+        data.append(col.where(col.notna(), None).tolist())
+    payload = {"columns": [str(c) for c in df.columns], "rows": len(df), "data": data}
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+class BundleWriter:
+    """Writes content-addressed files under `out_dir`; skips files that already exist."""
+    def __init__(self, out_dir: Path):
+        self.out_dir = Path(out_dir)
+        self.files = set()       # every file the manifest references
+        self.written = 0
+        self.unchanged = 0
+
+    def _put(self, rel: str, payload: bytes):
+        self.files.add(rel)
+        path = self.out_dir / rel
+        if path.exists():
+            self.unchanged += 1
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(payload)
+        tmp.replace(path)
+        self.written += 1
+
+    def add(self, stem: str, df: pd.DataFrame) -> dict:
+        raw = encode(df)
+        digest = hashlib.sha256(raw).hexdigest()[:HASH_CHARS]
+        name = f"{stem}.{digest}.json"
+        gz = gzip.compress(raw, compresslevel=9, mtime=0)
+        self._put(name + ".gz", gz)
+        entry = {"path": name + ".gz", "hash": digest, "rows": len(df), "bytes": len(gz), "raw_bytes": len(raw)}
+        if brotli is not None:
+            br = brotli.compress(raw, quality=11)
+            self._put(name + ".br", br)
+            entry["br"] = name + ".br"
+        return entry
+
+    def prune(self) -> int:
+        """Delete bundle files (<stem>.<hash>.json.gz|br under SUBDIRS) no longer in the manifest."""
+        removed = 0
+        for sub in SUBDIRS:
+            for path in (self.out_dir / sub).rglob("*.json.*"):
+                rel = path.relative_to(self.out_dir).as_posix()
+                if BUNDLE_FILE.search(path.name) and rel not in self.files:
+                    path.unlink()
+                    removed += 1
+        return removed
+
+def build_bundles(stations: pd.DataFrame, xw: pd.DataFrame, tables: dict,
+                  zoom: int = TILE_ZOOM, out_dir: Path = BUNDLE_DIR) -> dict:
+    """Write station partitions + tables and the manifest; returns write statistics."""
+    out_dir = Path(out_dir)
+    writer = BundleWriter(out_dir)
+    rows = station_rows(stations, xw)
+    stations_entry = {"columns": STATION_COLS, "rows": len(rows), "zoom": zoom, "county": {}, "tile": {}}
+
+    for county, part in rows.groupby("county", sort=True):
+        stations_entry["county"][county] = writer.add(f"stations/county/{slug(county)}", part)
+
+    located = rows.dropna(subset=["latitude", "longitude"])
+    x, y = tile_xy(located["latitude"], located["longitude"], zoom)
+    for (tx, ty), part in located.groupby([x, y], sort=True):
+        stations_entry["tile"][f"{zoom}/{tx}/{ty}"] = writer.add(f"stations/tile/{zoom}/{tx}/{ty}", part)
+
+    manifest = {"format": "columnar-json", "compression": ["gzip"] + (["br"] if brotli is not None else []),
+                "stations": stations_entry, "tables": {}}
+    for name, df in sorted(tables.items()):
+        manifest["tables"][name] = writer.add(f"tables/{name}", df)
+
+    manifest_path = out_dir / MANIFEST_NAME
+    text = json.dumps(manifest, indent=1, sort_keys=True)
+    manifest_changed = not manifest_path.exists() or manifest_path.read_text(encoding="utf-8") != text
+    if manifest_changed:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path.write_text(text, encoding="utf-8")
+    removed = writer.prune()
+    return {"manifest": manifest_path, "files": len(writer.files), "written": writer.written,
+            "unchanged": writer.unchanged, "removed": removed, "manifest_changed": manifest_changed}
+
+def load_tables(processed: Path = PROCESSED) -> dict:
+    """TABLES + insights/*.csv that exist on disk."""
+    paths = {name: processed / f for name, f in TABLES.items()}
+    paths.update({f"insights/{p.stem}": p for p in sorted((processed / "insights").glob("*.csv"))})
+    return {name: pd.read_csv(p, low_memory=False) for name, p in paths.items() if p.exists()}
+
+def main():
+    ap = argparse.ArgumentParser(description="Compile processed tables into static, content-hashed bundles")
+    ap.add_argument("--zoom", type=int, default=TILE_ZOOM, help="map tile zoom level for station partitions")
+    ap.add_argument("--out", type=Path, default=BUNDLE_DIR, help="output directory")
+    args = ap.parse_args()
+    if not 0 <= args.zoom <= 16:
+        raise SystemExit("ERROR: --zoom must be between 0 and 16")
+
+    stations = read_table(STATIONS_IN, columns=STATION_SOURCE_COLS)
+    stats = build_bundles(stations, load_zip_xwalk(ZIP_XWALK), load_tables(), args.zoom, args.out)
+    print(f"Bundles: {stats['files']} files ({stats['written']} written, {stats['unchanged']} unchanged, "
+          f"{stats['removed']} removed)" + ("" if brotli is not None else "; brotli not installed, gzip only"))
+    print(f"Saved: {stats['manifest']}" if stats["manifest_changed"] else f"Unchanged: {stats['manifest']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# src/transform/cleaning.py
+# Declarative, vectorized station cleaning (shared by make_kpis and the notebook):
+#
+#   from cleaning import STATION_RULES, apply_rules
+#   df_clean = apply_rules(df_raw, STATION_RULES)
+#
+# String rules run as pandas .str operations over the *distinct* values of a
+# column and are mapped back by factorized code, so each county/city spelling is
+# normalized once no matter how many stations share it.
+import numpy as np
+import pandas as pd
+
+# Each string step is (op, *args); steps run in order on the unique values.
+STRING_OPS = {
+    "strip":       lambda u: u.str.strip(),
+    "drop_suffix": lambda u, suffix: u.where(~u.str.lower().str.endswith(suffix), u.str[:-len(suffix)]),
+    "title":       lambda u: u.str.title(),
+    "blank_to_na": lambda u: u.mask(u.str.strip() == ""),
+}
+
+STATION_RULES = {
+    # coerce to numbers (bad values -> NaN)
+    "numeric": ["latitude", "longitude", "ev_dc_fast_num", "ev_level2_evse_num"],
+    # drop rows missing any of these (can't map)
+    "required": ["latitude", "longitude"],
+    # fill NA port counts with 0 and store as int
+    "fill_int": {"ev_dc_fast_num": 0, "ev_level2_evse_num": 0},
+    # connector types stay a comma-separated string; missing -> ""
+    "fill_str": {"ev_connector_types": ""},
+    # county: strip " County", title case, blank -> NA; city: title case, blank -> NA
+    "strings": {
+        "county": [("strip",), ("drop_suffix", " county"), ("title",),
+                   ("strip",), ("blank_to_na",), ("title",)],
+        "city":   [("strip",), ("blank_to_na",), ("title",)],
+    },
+    # region = county, falling back to city
+    "coalesce": {"region": ["county", "city"]},
+}
+
+def parse_numeric(s: pd.Series) -> pd.Series:
+    """pd.to_numeric(errors="coerce") evaluated once per distinct string."""
+    codes, uniq = pd.factorize(s)
+    vals = pd.to_numeric(pd.Series(uniq, dtype=object), errors="coerce").to_numpy()
+    if (codes == -1).any():
+        vals = np.append(vals.astype(float), np.nan)
+    return pd.Series(vals[codes], index=s.index)
+
+def normalize_strings(s: pd.Series, steps) -> pd.Series:
+    """Run `steps` once per distinct non-null value of `s`, then map back by code."""
+    codes, uniq = pd.factorize(s)
+    out = pd.Series(uniq, dtype=object).astype(str)
+    for op, *args in steps:
+        out = STRING_OPS[op](out, *args)
+    # append an NA slot so missing values (code -1) take it
+    lookup = np.append(out.to_numpy(dtype=object, na_value=pd.NA), pd.NA)
+    return pd.Series(lookup[codes], index=s.index, dtype=object)
+
+def apply_rules(df: pd.DataFrame, rules: dict = STATION_RULES) -> pd.DataFrame:
+    df = df.copy()
+    for c in rules.get("numeric", []):
+        df[c] = parse_numeric(df[c])
+
+    # filter first so the string work only sees rows we keep
+    df = df.dropna(subset=rules.get("required", []))
+
+    for c, value in rules.get("fill_int", {}).items():
+        df[c] = df[c].fillna(value).astype(int)
+    for c, value in rules.get("fill_str", {}).items():
+        df[c] = df[c].fillna(value).astype(str)
+
+    for c, steps in rules.get("strings", {}).items():
+        df[c] = normalize_strings(df[c], steps)
+
+    for target, sources in rules.get("coalesce", {}).items():
+        out = df[sources[0]]
+        for src in sources[1:]:
+            out = out.where(out.notna(), df[src])
+        df[target] = out
+    return df
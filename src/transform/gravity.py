@@ -0,0 +1,105 @@
+# src/transform/gravity.py
+"""
+Gravity (Huff) allocation of county EV demand to stations.
+
+Each county's ev_count is split evenly over demand points: one per ZIP in the county
+that has stations, placed at the mean station coordinate of that ZIP. (The tree has
+no county or ZIP centroid reference; EVs of counties without stations get no demand
+point and are reported by unplaced_demand.)
+Every demand point i spreads its EVs over stations j in proportion to
+
+    A_j * exp(-d_ij / decay_km)          (0 beyond max_km)
+
+where A_j is the station's capacity (make_station_busy.busy_score: DCFC ports weigh
+6x a Level 2 port). So a site with many competitors nearby receives a smaller share
+than an isolated one of the same size. Station load = sum over i of D_i * P_ij.
+
+Station-demand interactions are computed in blocks: demand points and stations are
+sorted by latitude, each block of demand points only looks at the latitude band that
+can be within max_km, and that band is processed block_stations at a time. Memory
+is O(block_demand x block_stations) whatever the number of stations.
+"""
+import numpy as np
+import pandas as pd
+
+from spatial_index import EARTH_RADIUS_KM, haversine_km
+
+DECAY_KM = 10.0
+MAX_KM = 60.0
+BLOCK_DEMAND = 256
+BLOCK_STATIONS = 8192
+
+def demand_points(stations: pd.DataFrame, ev_counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    stations: county, zip, latitude, longitude; ev_counts: county, ev_count.
+    -> (county, zip, latitude, longitude, demand) with demand summing to each county's ev_count.
+    """
+    located = stations.dropna(subset=["county", "zip", "latitude", "longitude"])
+    pts = located.groupby(["county", "zip"], as_index=False, observed=True).agg(
+        latitude=("latitude", "mean"), longitude=("longitude", "mean"))
+    ev = ev_counts.assign(county_norm=ev_counts["county"].str.strip().str.lower())
+    per_county = dict(zip(ev["county_norm"], pd.to_numeric(ev["ev_count"], errors="coerce").fillna(0)))
+    norm = pts["county"].astype("string").str.strip().str.lower()
+    n_points = norm.map(norm.value_counts())
+    pts["demand"] = norm.map(per_county).fillna(0).to_numpy(dtype=float) / n_points.to_numpy(dtype=float)
+    return pts
+
+def unplaced_demand(points: pd.DataFrame, ev_counts: pd.DataFrame) -> float:
+    """EVs of counties with no demand point (no station with a ZIP in the county)."""
+    placed = set(points["county"].astype("string").str.strip().str.lower())
+    ev = ev_counts[~ev_counts["county"].str.strip().str.lower().isin(placed)]
+    return float(pd.to_numeric(ev["ev_count"], errors="coerce").fillna(0).sum())
+
+def _kernel(d_km, decay_km, max_km):
+    return np.where(d_km <= max_km, np.exp(-d_km / decay_km), 0.0)
+
+def _bands(dem_lat, st_lat_sorted, block_demand, max_km):
+    """Yield (demand slice, station lo, station hi) over latitude-sorted inputs."""
+    pad = np.degrees(max_km / EARTH_RADIUS_KM)
+    for d0 in range(0, len(dem_lat), block_demand):
+        sl = slice(d0, min(d0 + block_demand, len(dem_lat)))
+        lo = np.searchsorted(st_lat_sorted, dem_lat[sl][0] - pad, side="left")
+        hi = np.searchsorted(st_lat_sorted, dem_lat[sl][-1] + pad, side="right")
+        yield sl, lo, hi
+
+def allocate(dem_lat, dem_lon, demand, st_lat, st_lon, attract,
+             decay_km: float = DECAY_KM, max_km: float = MAX_KM,
+             block_demand: int = BLOCK_DEMAND, block_stations: int = BLOCK_STATIONS):
+    """
+    -> (load per station, unallocated demand). Stations with no coordinates or zero
+    capacity attract nothing; demand with no station within max_km is unallocated.
+    """
+    dem_lat, dem_lon, demand = (np.asarray(a, dtype=float) for a in (dem_lat, dem_lon, demand))
+    st_lat, st_lon, attract = (np.asarray(a, dtype=float) for a in (st_lat, st_lon, attract))
+    valid = np.flatnonzero(~np.isnan(st_lat) & ~np.isnan(st_lon) & (attract > 0))
+    s_ord = valid[np.argsort(st_lat[valid], kind="stable")]
+    s_lat, s_lon, s_att = st_lat[s_ord], st_lon[s_ord], attract[s_ord]
+    d_ord = np.argsort(dem_lat, kind="stable")
+    d_lat, d_lon, d_dem = dem_lat[d_ord], dem_lon[d_ord], demand[d_ord]
+
+    load = np.zeros(len(s_ord))
+    unallocated = 0.0
+    for sl, lo, hi in _bands(d_lat, s_lat, block_demand, max_km):
+        lat_b, lon_b = d_lat[sl, None], d_lon[sl, None]
+
+        def weights(s0):
+            s1 = min(s0 + block_stations, hi)
+            d = haversine_km(lat_b, lon_b, s_lat[None, s0:s1], s_lon[None, s0:s1])
+            return s1, s_att[None, s0:s1] * _kernel(d, decay_km, max_km)
+
+        # pass 1: Huff denominators for this demand block
+        denom = np.zeros(sl.stop - sl.start)
+        for s0 in range(lo, hi, block_stations):
+            _, w = weights(s0)
+            denom += w.sum(axis=1)
+        reach = denom > 0
+        unallocated += d_dem[sl][~reach].sum()
+        share = np.divide(d_dem[sl], denom, out=np.zeros_like(denom), where=reach)
+        # pass 2: spread each demand point's EVs over the band
+        for s0 in range(lo, hi, block_stations):
+            s1, w = weights(s0)
+            load[s0:s1] += share @ w
+
+    out = np.zeros(len(st_lat))
+    out[s_ord] = load
+    return out, unallocated
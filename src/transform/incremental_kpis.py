@@ -0,0 +1,383 @@
+# src/transform/incremental_kpis.py
+"""
+Incremental county / region summaries and siting scores from station deltas.
+
+A full rebuild re-aggregates every station (make_county_summary, make_region_summary,
+derive_county_supply with its ZIP crosswalk merge, compute_metrics) even when a pull
+changed a handful of stations. Here the sums behind those tables are persisted and
+each snapshot delta (snapshots.py: added / removed rows, per-column changes) is
+folded in: touched stations leave with their old contribution and re-enter with the
+new one, and only the affected rows of the derived tables are recomputed:
+
+  - county / region summaries: ports_total, dcfc_share, effective_ports of the
+    counties / regions a changed station belongs (or belonged) to
+  - county supply vs demand: ports, dcfc_share and ports_per_1000_evs of the affected
+    counties; siting_score of those counties only, unless the min or max of the
+    coverage term moved, in which case every county is renormalized
+
+    python src/transform/snapshots.py record             # after make_kpis
+    python src/transform/incremental_kpis.py update      # fold new versions in, write the CSVs
+    python src/transform/incremental_kpis.py update --check
+    python src/transform/incremental_kpis.py init        # rebuild the state from the snapshot head
+
+--check (and `check`) compares every table with a full recompute on the snapshot
+head and fails on any difference. Coverage uses raw ports (make_county_supply
+default); run `init` after changing the EV counts or the ZIP crosswalk.
+
+State (data/rollups/): stations.parquet (per-station projection), county/region/supply
+sums, county metrics and state.json (snapshot version, min/max of the normalized terms).
+"""
+import json
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+import snapshots
+from availability import HOURS_PER_WEEK, AvailabilityIndex, public_hours_of
+from reference import ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+from make_kpis import COUNTY_SUMMARY_OUT, REGION_SUMMARY_OUT, make_county_summary, make_region_summary
+from make_county_supply import (EV_COUNTS, OUT_CSV, OUT_TOP10, build_county_supply, compute_metrics,
+                                join_ev_counts, normalize_ev_counts)
+
+ROOT = Path(__file__).resolve().parents[2]
+ROLLUP_DIR = ROOT / "data" / "rollups"
+STATE = ROLLUP_DIR / "state.json"
+PROJECTION = ROLLUP_DIR / "stations.parquet"
+METRICS = ROLLUP_DIR / "county_metrics.parquet"
+
+KEY = snapshots.KEY
+PROJ_COLS = ["county", "region", "zip", "level2_ports", "dcfc_ports", "public_hours"]
+SUM_COLS = ["level2_ports", "dcfc_ports", "port_hours", "stations"]
+SUMMARY_COLS = ["level2_ports", "dcfc_ports", "ports_total", "dcfc_share", "effective_ports"]
+
+def _key(s: pd.Series) -> pd.Series:
+    """Group key as plain objects with NaN for missing (same groups as the cleaned frame)."""
+    s = s.astype(object)
+    return s.where(s.notna(), np.nan)
+
+def _dict_key(k):
+    # missing group -> None (NaN is not a usable dict key)
+    return k if isinstance(k, str) else None
+
+# station columns the rollups depend on -> (projection column, value conversion),
+# for stations applied one at a time
+_PROJECT_VALUE = {
+    "county": (0, _dict_key),
+    "region": (1, _dict_key),
+    "zip": (2, lambda v: v if isinstance(v, str) else None),
+    "ev_level2_evse_num": (3, int),
+    "ev_dc_fast_num": (4, int),
+    "access_days_time": (5, lambda v: public_hours_of(v if isinstance(v, str) else "")),
+}
+
+def _public_hours(access: pd.Series) -> np.ndarray:
+    codes, uniques = pd.factorize(access.astype("string").fillna(""))
+    return AvailabilityIndex(codes, list(uniques)).public_hours()
+
+def project(rows: pd.DataFrame) -> pd.DataFrame:
+    """Keyed station rows -> the per-station inputs of every rollup."""
+    return pd.DataFrame({
+        "county": _key(rows["county"]),
+        "region": _key(rows["region"]),
+        "zip": rows["zip"].astype("string"),
+        "level2_ports": rows["ev_level2_evse_num"].astype("int64"),
+        "dcfc_ports": rows["ev_dc_fast_num"].astype("int64"),
+        "public_hours": _public_hours(rows["access_days_time"]),
+    }, index=rows.index)
+
+def zip_counties(xw: pd.DataFrame) -> dict:
+    """zip -> crosswalk county names (repeated as often as the crosswalk merge repeats them)."""
+    m = attach_county_from_zip(xw[["zip"]].drop_duplicates(), xw).dropna(subset=["county"])
+    return m.groupby("zip")["county"].agg(list).to_dict()
+
+def summary_row(sums) -> tuple:
+    """(level2, dcfc, port_hours, stations) -> SUMMARY_COLS, as make_kpis.finish_summary computes them."""
+    l2, dc, port_hours, _ = sums
+    total = l2 + dc
+    share = np.round(dc / total, 4) if total else 0.0
+    return l2, dc, total, share, np.round(port_hours / HOURS_PER_WEEK, 1)
+
+def _minmax(metrics: pd.DataFrame) -> dict:
+    cov = pd.to_numeric(metrics["ports_per_1000_evs"], errors="coerce").fillna(0)
+    ev = pd.to_numeric(metrics["ev_count"], errors="coerce").fillna(0)
+    return {"coverage": [float(cov.min()), float(cov.max())], "ev_count": [float(ev.min()), float(ev.max())]}
+
+def _norm(a: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    # compute_metrics' min-max, evaluated with the stored bounds
+    return (a - lo) / (hi - lo) if hi - lo > 0 else np.zeros(len(a))
+
+class Rollups:
+    """
+    Per-county / per-region sums (level2, dcfc, port-hours, stations) and per-crosswalk-
+    county port sums as dicts, their derived summary rows, the county metrics table
+    and the per-station projection the sums were built from. Stations touched since
+    the last save live in `overlay` (key -> projected row, None = removed), so a delta
+    costs O(touched stations); save() merges the overlay into the projection table.
+    """
+    def __init__(self, proj: pd.DataFrame, sums: dict, metrics: pd.DataFrame, state: dict, xw: pd.DataFrame):
+        self.proj, self.sums, self.metrics, self.state = proj, sums, metrics, state
+        self.overlay = {}
+        self._base = [proj[c].to_numpy() for c in PROJ_COLS]
+        self.xw, self.zips = xw, zip_counties(xw)
+        self.derived = {geo: {k: summary_row(v) for k, v in sums[geo].items()} for geo in ("county", "region")}
+        norm = metrics["county"].str.strip().str.lower()
+        self.rows_of = norm.groupby(norm).indices     # county name (normalized) -> metrics row positions
+
+    @classmethod
+    def build(cls, stations: pd.DataFrame, ev: pd.DataFrame, xw: pd.DataFrame, version: int = 0) -> "Rollups":
+        """Full build from keyed stations (snapshots.keyed) and normalized EV counts."""
+        proj = project(stations)
+        r = proj.assign(port_hours=(proj["level2_ports"] + proj["dcfc_ports"]) * proj["public_hours"], stations=1)
+        sums = {geo: {_dict_key(k): [int(x) for x in v]
+                      for k, v in zip(g.index, g.to_numpy())}
+                for geo in ("county", "region")
+                for g in [r.groupby(geo, dropna=False)[SUM_COLS].sum()]}
+        supply = attach_county_from_zip(r[["zip", "level2_ports", "dcfc_ports"]].reset_index(drop=True), xw)
+        supply = supply.dropna(subset=["county"]).groupby("county", as_index=False)[["level2_ports", "dcfc_ports"]].sum()
+        sums["supply"] = {k: [int(a), int(b)] for k, a, b in supply.itertuples(index=False)}
+        supply["ports_total"] = supply["level2_ports"] + supply["dcfc_ports"]
+        metrics = compute_metrics(join_ev_counts(supply, ev)).reset_index(drop=True)
+        state = {"version": version, "minmax": _minmax(metrics)}
+        return cls(proj, sums, metrics, state, xw)
+
+    def _lookup(self, keys: list) -> dict:
+        """Current projected row (list) of each key."""
+        out = {k: self.overlay[k] for k in keys if k in self.overlay}
+        base = [k for k in keys if k not in self.overlay]
+        if base:
+            pos = self.proj.index.get_indexer(pd.MultiIndex.from_tuples(base, names=KEY))
+            if (pos < 0).any():
+                raise ValueError("delta refers to stations missing from the rollup state; run: incremental_kpis.py init")
+            for k, p in zip(base, pos.tolist()):
+                county, region, zip_, l2, dc, hours = (a[p] for a in self._base)
+                out[k] = [_dict_key(county), _dict_key(region), zip_ if isinstance(zip_, str) else None,
+                          int(l2), int(dc), int(hours)]
+        if any(v is None for v in out.values()):
+            raise ValueError("delta refers to a station removed earlier; run: incremental_kpis.py init")
+        return out
+
+    def _add(self, rows, sign: int, affected: dict):
+        for county, region, zip_, l2, dc, hours in rows:
+            contrib = (sign * l2, sign * dc, sign * (l2 + dc) * hours, sign)
+            for geo, k in (("county", county), ("region", region)):
+                acc = self.sums[geo].setdefault(k, [0, 0, 0, 0])
+                for i, x in enumerate(contrib):
+                    acc[i] += x
+                affected[geo].add(k)
+            for name in self.zips.get(zip_, ()):
+                acc = self.sums["supply"].setdefault(name, [0, 0])
+                acc[0] += contrib[0]
+                acc[1] += contrib[1]
+                affected["supply"].add(name)
+
+    def apply(self, delta: dict) -> dict:
+        """Fold one snapshots delta in; returns the number of stations / groups it touched."""
+        changes = {c: ch["new"] for c, ch in delta["changes"].items() if c in _PROJECT_VALUE}
+        removed = delta["removed"].index.tolist()
+        changed = list(dict.fromkeys(k for ch in changes.values() for k in ch.index.tolist()))
+        old = self._lookup(removed + changed)
+
+        # touched stations leave with their old values and re-enter with the new ones
+        new = {k: list(old[k]) for k in changed}
+        for col, values in changes.items():
+            j, convert = _PROJECT_VALUE[col]
+            for k, v in zip(values.index.tolist(), values.tolist()):
+                new[k][j] = convert(v)
+        added = delta["added"]
+        cols = [added[c].tolist() for c in _PROJECT_VALUE]
+        for k, *row in zip(added.index.tolist(), *cols):
+            new[k] = [convert(v) for (_, convert), v in zip(_PROJECT_VALUE.values(), row)]
+
+        affected = {"county": set(), "region": set(), "supply": set()}
+        self._add(old.values(), -1, affected)
+        self._add(new.values(), +1, affected)
+        for k in removed:
+            self.overlay[k] = None
+        self.overlay.update(new)
+
+        for geo in ("county", "region"):
+            for k in affected[geo]:
+                if self.sums[geo][k][3]:
+                    self.derived[geo][k] = summary_row(self.sums[geo][k])
+                else:   # no stations left: the group disappears, as in a full rebuild
+                    del self.sums[geo][k]
+                    self.derived[geo].pop(k, None)
+        renormalized = self._update_metrics(affected["supply"])
+        return {"stations": len(old) + len(added), "counties": len(affected["county"]),
+                "regions": len(affected["region"]), "renormalized": renormalized}
+
+    def _update_metrics(self, affected: set) -> bool:
+        """Re-derive the affected counties; renormalize siting_score only if a bound moved."""
+        m = self.metrics
+        cols = {c: m[c].to_numpy(dtype=float, copy=True) for c in
+                ["level2_ports", "dcfc_ports", "ports_total", "dcfc_share", "ports_per_1000_evs", "siting_score"]}
+        rows = []
+        for name in affected:
+            l2, dc = self.sums["supply"][name]
+            for i in self.rows_of.get(str(name).strip().lower(), ()):
+                cols["level2_ports"][i], cols["dcfc_ports"][i], cols["ports_total"][i] = l2, dc, l2 + dc
+                rows.append(i)
+        rows = np.array(rows, dtype=int)
+        ev = m["ev_count"].to_numpy(dtype=float)
+        total, dc = cols["ports_total"][rows], cols["dcfc_ports"][rows]
+        cols["dcfc_share"][rows] = np.divide(dc, total, out=np.zeros(len(rows)), where=total > 0)
+        cols["ports_per_1000_evs"][rows] = np.where(ev[rows] > 0, total / np.where(ev[rows] > 0, ev[rows], 1) * 1000, 0)
+
+        cov = cols["ports_per_1000_evs"]
+        bounds = {"coverage": [float(cov.min()), float(cov.max())], "ev_count": self.state["minmax"]["ev_count"]}
+        renormalized = bounds != self.state["minmax"]
+        if renormalized:
+            self.state["minmax"] = bounds
+            rows = np.arange(len(m))
+        (clo, chi), (elo, ehi) = bounds["coverage"], bounds["ev_count"]
+        gap = 1 - _norm(cov[rows], clo, chi)
+        cols["siting_score"][rows] = 0.6 * gap + 0.4 * _norm(ev[rows], elo, ehi)
+        for c, a in cols.items():
+            m[c] = a.astype(m[c].dtype)
+        return renormalized
+
+    # ---- tables in the layout of the full rebuild ----
+
+    def _summary(self, geo: str) -> pd.DataFrame:
+        d = self.derived[geo]
+        keys = sorted(k for k in d if k is not None) + ([None] if None in d else [])
+        out = pd.DataFrame([d[k] for k in keys], columns=SUMMARY_COLS).astype(
+            {"level2_ports": "int64", "dcfc_ports": "int64", "ports_total": "int64"})
+        out.insert(0, geo, _key(pd.Series(keys, dtype=object)))
+        return out.sort_values("ports_total", ascending=False, kind="stable")
+
+    def county_summary(self) -> pd.DataFrame:
+        return self._summary("county")
+
+    def region_summary(self) -> pd.DataFrame:
+        return self._summary("region")
+
+    def siting_top10(self) -> pd.DataFrame:
+        return self.metrics.sort_values("siting_score", ascending=False).head(10)
+
+    # ---- persistence ----
+
+    def _materialize(self):
+        """Merge the overlay into the projection table."""
+        if not self.overlay:
+            return
+        keys = pd.MultiIndex.from_tuples(list(self.overlay), names=KEY)
+        live = {k: row for k, row in self.overlay.items() if row is not None}
+        parts = [self.proj[~self.proj.index.isin(keys)]]
+        if live:
+            rows = pd.DataFrame(list(live.values()), columns=PROJ_COLS,
+                                index=pd.MultiIndex.from_tuples(list(live), names=KEY))
+            parts.append(rows.astype(self.proj.dtypes.to_dict()).assign(
+                county=_key(rows["county"]), region=_key(rows["region"])))
+        self.proj = pd.concat(parts)
+        self.overlay = {}
+        self._base = [self.proj[c].to_numpy() for c in PROJ_COLS]
+
+    def save(self):
+        self._materialize()
+        ROLLUP_DIR.mkdir(parents=True, exist_ok=True)
+        self.proj.reset_index().to_parquet(PROJECTION, index=False)
+        self.metrics.to_parquet(METRICS, index=False)
+        sums = {geo: [[k] + v for k, v in d.items()] for geo, d in self.sums.items()}
+        STATE.write_text(json.dumps(dict(self.state, sums=sums)))
+
+    @classmethod
+    def load(cls, xw: pd.DataFrame) -> "Rollups":
+        state = json.loads(STATE.read_text())
+        sums = {geo: {row[0]: row[1:] for row in rows} for geo, rows in state.pop("sums").items()}
+        proj = pd.read_parquet(PROJECTION).set_index(KEY)
+        proj["county"], proj["region"] = _key(proj["county"]), _key(proj["region"])
+        return cls(proj, sums, pd.read_parquet(METRICS), state, xw)
+
+def head_stations() -> pd.DataFrame:
+    if not snapshots.HEAD.exists():
+        raise FileNotFoundError(f"{snapshots.HEAD} not found; run: python src/transform/snapshots.py record")
+    return pd.read_parquet(snapshots.HEAD).set_index(KEY)
+
+def load_inputs():
+    return normalize_ev_counts(pd.read_csv(EV_COUNTS)), load_zip_xwalk(ZIP_XWALK)
+
+def init() -> Rollups:
+    ev, xw = load_inputs()
+    versions = snapshots.load_manifest()["versions"]
+    roll = Rollups.build(head_stations(), ev, xw, versions[-1]["version"] if versions else 0)
+    roll.save()
+    return roll
+
+def update() -> tuple:
+    """Apply every snapshot version after the state's; -> (rollups, [(version, info, seconds)])."""
+    if not STATE.exists():
+        return init(), []
+    roll = Rollups.load(load_inputs()[1])
+    applied = []
+    for entry in snapshots.load_manifest()["versions"]:
+        if entry["version"] <= roll.state["version"]:
+            continue
+        delta = snapshots.load_delta(entry["version"])
+        t0 = time.perf_counter()
+        info = roll.apply(delta)
+        applied.append((entry["version"], info, time.perf_counter() - t0))
+        roll.state["version"] = entry["version"]
+    if applied:
+        roll.save()
+    return roll, applied
+
+def full_tables(stations: pd.DataFrame, ev: pd.DataFrame, xw: pd.DataFrame) -> dict:
+    """The same tables from scratch, as make_kpis / make_county_supply compute them."""
+    df = stations.reset_index()
+    for c in ["county", "region", "city"]:
+        df[c] = _key(df[c])
+    final, top10 = build_county_supply(df, xw, ev)
+    return {"county_summary": make_county_summary(df), "region_summary": make_region_summary(df),
+            "county_supply": final, "siting_top10": top10}
+
+def check(roll: Rollups, stations: pd.DataFrame, ev: pd.DataFrame) -> list:
+    """Names of the tables that differ from a full recompute (compared as written CSV)."""
+    full = full_tables(stations, ev, roll.xw)
+    mine = {"county_summary": roll.county_summary(), "region_summary": roll.region_summary(),
+            "county_supply": roll.metrics, "siting_top10": roll.siting_top10()}
+    return [name for name in full if mine[name].to_csv(index=False) != full[name].to_csv(index=False)]
+
+def write_outputs(roll: Rollups):
+    roll.county_summary().to_csv(COUNTY_SUMMARY_OUT, index=False)
+    roll.region_summary().to_csv(REGION_SUMMARY_OUT, index=False)
+    roll.metrics.to_csv(OUT_CSV, index=False)
+    OUT_TOP10.write_text(roll.siting_top10().to_csv(index=False))
+    for p in [COUNTY_SUMMARY_OUT, REGION_SUMMARY_OUT, OUT_CSV, OUT_TOP10]:
+        print(f"Saved: {p}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Incremental county/region KPIs and siting scores from snapshot deltas")
+    ap.add_argument("cmd", choices=["init", "update", "check"])
+    ap.add_argument("--check", action="store_true", help="update: verify against a full recompute")
+    args = ap.parse_args()
+
+    try:
+        if args.cmd == "init":
+            roll = init()
+            print(f"Built rollups at snapshot v{roll.state['version']} ({len(roll.proj)} stations) -> {ROLLUP_DIR}")
+        elif args.cmd == "update":
+            roll, applied = update()
+            for version, info, seconds in applied:
+                print(f"v{version}: {info['stations']} stations, {info['counties']} counties, "
+                      f"{info['regions']} regions"
+                      + (", siting renormalized" if info["renormalized"] else "") + f" ({seconds * 1000:.1f} ms)")
+            if not applied:
+                print(f"Rollups up to date (snapshot v{roll.state['version']})")
+        else:
+            roll = Rollups.load(load_inputs()[1])
+    except FileNotFoundError as e:
+        raise SystemExit(f"ERROR: {e}")
+
+    if args.cmd == "check" or args.check:
+        bad = check(roll, head_stations(), load_inputs()[0])
+        if bad:
+            raise SystemExit(f"ERROR: rollups differ from a full recompute: {bad}")
+        print("Check OK: summaries and siting scores match a full recompute")
+    if args.cmd == "update":
+        write_outputs(roll)
+
+if __name__ == "__main__":
+    main()
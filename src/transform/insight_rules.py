@@ -0,0 +1,208 @@
+# src/transform/insight_rules.py
+"""
+Declarative insight tables.
+
+Each rule names a source table, optional named filters, the metric column(s)
+and direction to rank by, how many rows to keep (None = all), optionally a
+tie-break column for rows equal on the metric, and the output file.
+evaluate() runs a whole rule set over already-loaded frames in one pass:
+filter chains are applied once and shared by every rule starting with them,
+derived columns (total_ports, distance to the nearest DCFC) are computed only
+on the rows that survive the filters, and single-direction top/bottom-N rules use partial
+selection (nlargest / nsmallest) instead of sorting the full table.
+
+Adding a watchlist = adding a rule here:
+
+    {"output": "top25_level2_only_sites.csv", "group": "opportunity",
+     "source": "stations", "filters": ["no_dcfc"],
+     "by": ["ev_level2_evse_num"], "ascending": [False], "n": 25, "tiebreak": "id", "columns": STATION_COLS},
+
+    python src/transform/insight_rules.py        # evaluate every rule, loading inputs once
+"""
+import pathlib
+import operator
+import pandas as pd
+
+from processed_store import read_table
+from spatial_index import StationIndex
+
+PROCESSED = pathlib.Path("data/processed")
+INSIGHTS_DIR = PROCESSED / "insights"
+COUNTY_SUMMARY = PROCESSED / "ev_summary_by_county.csv"
+REGION_SUMMARY = PROCESSED / "ev_summary_by_region.csv"
+
+FAR_FROM_DCFC_KM = 16.0   # ~10 miles to the nearest fast charger
+
+STATION_COLS = [
+    "id", "station_name", "city", "county", "state",
+    "latitude", "longitude",
+    "ev_level2_evse_num", "ev_dc_fast_num", "ev_network"
+]
+
+# filter name -> (column, op, value); a rule listing several filters ANDs them
+FILTERS = {
+    "nonzero_ports":  ("ports_total", ">", 0),
+    "zero_dcfc":      ("dcfc_ports", "==", 0),
+    "ports_50plus":   ("ports_total", ">=", 50),
+    "some_dcfc":      ("dcfc_share", ">", 0),
+    "dcfc_share_20":  ("dcfc_share", "<=", 0.20),
+    "no_dcfc":        ("ev_dc_fast_num", "==", 0),
+    "has_dcfc":       ("ev_dc_fast_num", ">", 0),
+    "level2_8plus":   ("ev_level2_evse_num", ">=", 8),
+    "far_from_dcfc":  ("km_to_nearest_dcfc", ">=", FAR_FROM_DCFC_KM),
+}
+
+OPS = {"==": operator.eq, "!=": operator.ne, ">": operator.gt,
+       ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+def _nearest_dcfc(df, ctx):
+    km, ids = ctx.index().nearest_dcfc(df["latitude"].to_numpy(), df["longitude"].to_numpy(), k=1)
+    return {"km_to_nearest_dcfc": km[:, 0].round(2), "nearest_dcfc_id": ids[:, 0]}
+
+# source -> [(derived columns, input columns, fn(df, ctx) -> {column: values})]; a derived
+# column is only computed when a rule needs it, on the already-filtered rows
+# (ctx.index() is the spatial index over the *unfiltered* stations)
+DERIVED = {
+    "stations": [
+        (["total_ports"], ["ev_level2_evse_num", "ev_dc_fast_num"],
+         lambda df, ctx: {"total_ports": df["ev_level2_evse_num"] + df["ev_dc_fast_num"]}),
+        (["km_to_nearest_dcfc", "nearest_dcfc_id"], ["latitude", "longitude", "ev_dc_fast_num"], _nearest_dcfc),
+    ],
+}
+
+RULES = [
+    # ---- county summary (make_insights) ----
+    {"output": "top10_ports_total.csv", "group": "county", "source": "county_summary",
+     "by": ["ports_total"], "ascending": [False], "n": 10},
+    {"output": "bottom10_ports_total.csv", "group": "county", "source": "county_summary",
+     "by": ["ports_total"], "ascending": [True], "n": 10},
+    # filter counties with at least some ports to avoid divide-by-zero noise
+    {"output": "top10_dcfc_share.csv", "group": "county", "source": "county_summary",
+     "filters": ["nonzero_ports"], "by": ["dcfc_share"], "ascending": [False], "n": 10},
+    {"output": "bottom10_dcfc_share.csv", "group": "county", "source": "county_summary",
+     "filters": ["nonzero_ports"], "by": ["dcfc_share"], "ascending": [True], "n": 10},
+
+    # ---- opportunities (opportunity_insights) ----
+    # regions with 0 DCFC but lots of Level-2 (upgrade to DCFC first)
+    {"output": "opportunity_regions_zero_dcfc_sorted_by_level2.csv", "group": "opportunity",
+     "source": "region_summary", "filters": ["zero_dcfc"],
+     "by": ["level2_ports"], "ascending": [False], "n": None},
+    # stations with many Level-2 ports and 0 DCFC (site-level upgrade candidates)
+    {"output": "opportunity_stations_level2_no_dcfc_8plus.csv", "group": "opportunity",
+     "source": "stations", "filters": ["no_dcfc", "level2_8plus"],
+     "by": ["ev_level2_evse_num"], "ascending": [False], "n": None, "columns": STATION_COLS},
+    # ...of those, the hubs far from any fast charging
+    {"output": "opportunity_stations_level2_far_from_dcfc.csv", "group": "opportunity",
+     "source": "stations", "filters": ["no_dcfc", "level2_8plus", "far_from_dcfc"],
+     "by": ["km_to_nearest_dcfc", "ev_level2_evse_num"], "ascending": [False, False], "n": None,
+     "columns": STATION_COLS + ["km_to_nearest_dcfc", "nearest_dcfc_id"]},
+    # regions with high ports_total (>=50) but low (0 < dcfc_share <= 0.20)
+    {"output": "opportunity_regions_low_dcfc_share_high_ports.csv", "group": "opportunity",
+     "source": "region_summary", "filters": ["ports_50plus", "some_dcfc", "dcfc_share_20"],
+     "by": ["dcfc_share", "ports_total"], "ascending": [True, False], "n": None},
+    # likely busy hubs (capacity proxy)
+    {"output": "likely_busy_top_stations_by_dcfc_ports.csv", "group": "opportunity",
+     "source": "stations", "filters": ["has_dcfc"],
+     "by": ["ev_dc_fast_num"], "ascending": [False], "n": 200, "tiebreak": "id", "columns": STATION_COLS},
+    {"output": "likely_busy_top_stations_by_total_ports.csv", "group": "opportunity",
+     "source": "stations", "by": ["total_ports"], "ascending": [False], "n": 200, "tiebreak": "id",
+     "columns": STATION_COLS + ["total_ports"]},
+]
+
+def rules_for(group: str) -> list:
+    return [r for r in RULES if r["group"] == group]
+
+def select(df: pd.DataFrame, by: list, ascending: list, n, tiebreak: str = None) -> pd.DataFrame:
+    """
+    Order by `by`; with `n`, pick the first n rows by partial selection instead of a full sort.
+    With `tiebreak`, rows equal on `by` keep ascending `tiebreak` order (e.g. station id),
+    including at the n-th row cut-off; without it, ties are in no guaranteed order.
+    """
+    if tiebreak is not None:
+        df = df.sort_values(tiebreak, kind="stable")
+    if n is None or n >= len(df):
+        return df.sort_values(by, ascending=ascending, kind="stable" if tiebreak else "quicksort")
+    if all(ascending):
+        return df.nsmallest(n, by, keep="first")
+    if not any(ascending):
+        return df.nlargest(n, by, keep="first")
+    # mixed directions: a stable multi-key sort (works for any sortable dtype)
+    return df.sort_values(by, ascending=ascending, kind="stable").head(n)
+
+class _Context:
+    def __init__(self, frames, spatial_index=None):
+        self.frames = frames
+        self.spatial_index = spatial_index
+
+    def index(self) -> StationIndex:
+        if self.spatial_index is None:
+            self.spatial_index = StationIndex.from_stations(self.frames["stations"])
+        return self.spatial_index
+
+def _with_columns(df, source, cols, ctx):
+    for derived, inputs, fn in DERIVED.get(source, []):
+        if any(c in cols and c not in df.columns for c in derived) and set(inputs) <= set(df.columns):
+            df = df.assign(**fn(df, ctx))
+    return df
+
+def _missing(frame, source, cols) -> list:
+    """Columns in `cols` that `frame` neither has nor can derive."""
+    have = set(frame.columns)
+    for derived, inputs, _ in DERIVED.get(source, []):
+        if set(inputs) <= have:
+            have |= set(derived)
+    return [c for c in cols if c not in have]
+
+def evaluate(rules: list, frames: dict, spatial_index: StationIndex = None) -> dict:
+    """Evaluate `rules` over `frames` ({source name: DataFrame}) -> {output file: table}."""
+    ctx = _Context(frames, spatial_index)
+    views = {}
+    def view(source, filters):
+        # filtered rows for a filter chain; every prefix (e.g. no_dcfc -> no_dcfc & level2_8plus)
+        # is computed once and shared by all rules that start with it
+        key = (source, tuple(filters))
+        if key not in views:
+            if not filters:
+                views[key] = frames[source]
+            else:
+                df = view(source, filters[:-1])
+                col, op, value = FILTERS[filters[-1]]
+                df = _with_columns(df, source, [col], ctx)
+                views[key] = df.loc[OPS[op](df[col], value)]
+        return views[key]
+
+    out = {}
+    for r in rules:
+        # a source without the filter / ranking columns skips the table, as the scripts did
+        if r["source"] not in frames:
+            print(f"Skipped {r['output']}: no {r['source']} table")
+            continue
+        needed = [FILTERS[f][0] for f in r.get("filters", [])] + list(r["by"])
+        missing = _missing(frames[r["source"]], r["source"], needed)
+        if missing:
+            print(f"Skipped {r['output']}: {r['source']} has no {', '.join(dict.fromkeys(missing))}")
+            continue
+        df = view(r["source"], r.get("filters", []))
+        df = _with_columns(df, r["source"], list(r["by"]) + list(r.get("columns") or []), ctx)
+        table = select(df, r["by"], r["ascending"], r["n"], r.get("tiebreak"))
+        if r.get("columns"):
+            table = table.reindex(columns=r["columns"])   # missing output columns -> empty
+        out[r["output"]] = table
+    return out
+
+def main():
+    INSIGHTS_DIR.mkdir(parents=True, exist_ok=True)
+    frames = {
+        "county_summary": pd.read_csv(COUNTY_SUMMARY),
+        "region_summary": pd.read_csv(REGION_SUMMARY, low_memory=False),
+        "stations": read_table("stations_ca", columns=STATION_COLS),
+    }
+    tables = evaluate(RULES, frames)
+    for name, table in tables.items():
+        table.to_csv(INSIGHTS_DIR / name, index=False)
+    print(f"Saved {len(tables)} insight tables in: {INSIGHTS_DIR.resolve()}")
+    for name, table in tables.items():
+        print(f"- {name} (rows={len(table)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# src/transform/kpi_cube.py
+"""
+Precomputed KPI cube for the dashboards.
+
+One table holding every grouping set of
+    geography (state / county / region) x ev_network x facility_type x connector
+with each cell split by charger level ((all) / Level2 / DCFC). A dimension that is
+rolled up holds "(all)", so a dashboard reads one slice instead of aggregating the
+station extract:
+
+    geo_level=county, ev_network=(all), facility_type=(all), connector=(all), level=(all)
+        -> port totals of ev_county_supply_vs_demand.csv
+
+County is the ZIP-derived one (reference.attach_county_from_zip, one county per
+ZIP) when a crosswalk is given, as the CLI and pipeline do: the AFDC `county` field
+is blank for CA stations. Without a crosswalk the stations' own county is used.
+
+Partial aggregates are shared: the finest grain is aggregated once from the
+stations table, and every coarser grouping set is rolled up from its smallest
+already-computed parent. Level is not a group key but a projection of the
+per-level measures, so it needs no extra pass. Connector is multi-valued (one
+station can offer J1772 and CCS), so connector slices come from a separate
+connector base and are never summed across connectors; "(all)" connector rows come
+from the station base. The connector base is built from the finest aggregate keyed
+by connector bitmask (station_table.encode_connectors; a few thousand rows), one
+bit test per connector type.
+
+    python src/transform/kpi_cube.py
+    python src/transform/kpi_cube.py --slice county ev_network        # print one slice
+    python src/transform/kpi_cube.py --slice region connector --level DCFC --out dcfc_by_connector.csv
+
+Output: data/processed/ev_kpi_cube.csv
+"""
+import argparse
+from itertools import combinations
+from pathlib import Path
+import pandas as pd
+
+from processed_store import read_table
+from reference import ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+from station_table import CONNECTOR_BITS, encode_connectors
+from make_county_supply import EV_COUNTS, normalize_ev_counts
+
+ROOT = Path(__file__).resolve().parents[2]
+PROCESSED = ROOT / "data" / "processed"
+STATIONS_IN = "stations_ca"
+CUBE_OUT = PROCESSED / "ev_kpi_cube.csv"
+
+ALL = "(all)"
+GEO_LEVELS = ["county", "region"]             # alternative geographies; "state" = neither
+ATTRS = ["ev_network", "facility_type"]
+DIMS = ["geo_level", "geo"] + ATTRS + ["connector", "level"]
+LEVELS = [ALL, "Level2", "DCFC"]
+MEASURES = ["stations", "level2_stations", "dcfc_stations", "level2_ports", "dcfc_ports"]
+CUBE_COLS = ["grouping"] + DIMS + ["stations", "level2_ports", "dcfc_ports", "ports_total",
+                                   "dcfc_share", "ev_count", "ports_per_1000_evs"]
+
+STATION_COLS = ["zip", "county", "region", "ev_network", "facility_type", "ev_connector_types",
+                "ev_level2_evse_num", "ev_dc_fast_num"]
+
+def grouping_sets() -> list:
+    """Every geography x subset of ATTRS, with and without connector."""
+    sets = []
+    for geo in [None] + GEO_LEVELS:
+        for k in range(len(ATTRS) + 1):
+            for attrs in combinations(ATTRS, k):
+                for conn in (False, True):
+                    sets.append(((geo,) if geo else ()) + attrs + (("connector",) if conn else ()))
+    return sets
+
+def station_measures(stations: pd.DataFrame, xw: pd.DataFrame = None) -> pd.DataFrame:
+    l2, dc = stations["ev_level2_evse_num"], stations["ev_dc_fast_num"]
+    df = stations[GEO_LEVELS + ATTRS].copy()
+    if xw is not None:
+        county = attach_county_from_zip(stations[["zip"]], xw.drop_duplicates("zip"))["county"]
+        df["county"] = county.to_numpy()
+    for c in GEO_LEVELS + ATTRS:
+        df[c] = df[c].astype("string")
+    df["connector_mask"] = encode_connectors(stations["ev_connector_types"])
+    df["stations"] = 1
+    df["level2_stations"] = (l2 > 0).astype("int64")
+    df["dcfc_stations"] = (dc > 0).astype("int64")
+    df["level2_ports"] = l2.astype("int64")
+    df["dcfc_ports"] = dc.astype("int64")
+    return df
+
+def explode_connectors(agg: pd.DataFrame) -> pd.DataFrame:
+    """One row per (cell, connector type) from a frame keyed by connector_mask."""
+    m = agg["connector_mask"].to_numpy()
+    parts = [agg[(m & bit) != 0].assign(connector=name) for name, bit in CONNECTOR_BITS.items()]
+    return pd.concat(parts, ignore_index=True).drop(columns="connector_mask")
+
+def _aggregate(frame: pd.DataFrame, keys: tuple) -> pd.DataFrame:
+    if not keys:
+        return frame[MEASURES].sum().to_frame().T
+    return frame.groupby(list(keys), dropna=False, sort=False)[MEASURES].sum().reset_index()
+
+def rollup(base: pd.DataFrame, sets: list) -> dict:
+    """
+    {grouping set: aggregate}. Finest sets first; each set is rolled up from the
+    smallest computed superset on the same (connector / no connector) side.
+    """
+    finest = tuple(GEO_LEVELS + ATTRS)
+    by_mask = _aggregate(base, finest + ("connector_mask",))
+    done = {finest: _aggregate(by_mask, finest),
+            finest + ("connector",): _aggregate(explode_connectors(by_mask), finest + ("connector",))}
+    for keys in sorted(sets, key=len, reverse=True):
+        if keys in done:
+            continue
+        conn = "connector" in keys
+        parents = [p for p in done if set(keys) <= set(p) and ("connector" in p) == conn]
+        parent = min(parents, key=lambda p: len(done[p]))
+        done[keys] = _aggregate(done[parent], keys)
+    return {keys: done[keys] for keys in sets}
+
+def _cells(keys: tuple, agg: pd.DataFrame) -> pd.DataFrame:
+    geo = next((k for k in keys if k in GEO_LEVELS), None)
+    out = pd.DataFrame({
+        "grouping": "+".join(("geo",) * bool(geo) + tuple(k for k in keys if k not in GEO_LEVELS)) or "total",
+        "geo_level": geo or "state",
+        "geo": agg[geo] if geo else ALL,
+    }, index=agg.index)
+    for c in ATTRS + ["connector"]:
+        out[c] = agg[c] if c in keys else ALL
+    return pd.concat([out, agg[MEASURES]], axis=1)
+
+def by_level(cells: pd.DataFrame) -> pd.DataFrame:
+    """Project each cell onto level (all) / Level2 / DCFC; drop empty level rows."""
+    parts = []
+    for level in LEVELS:
+        part = cells.copy()
+        part["level"] = level
+        if level == "Level2":
+            part["stations"], part["dcfc_ports"] = part["level2_stations"], 0
+        elif level == "DCFC":
+            part["stations"], part["level2_ports"] = part["dcfc_stations"], 0
+        parts.append(part if level == ALL else part[part["stations"] > 0])
+    return pd.concat(parts, ignore_index=True).drop(columns=["level2_stations", "dcfc_stations"])
+
+def build_cube(stations: pd.DataFrame, ev_counts: pd.DataFrame = None, xw: pd.DataFrame = None) -> pd.DataFrame:
+    """Cleaned stations (+ normalized county EV counts, ZIP crosswalk) -> cube table (CUBE_COLS)."""
+    sets = grouping_sets()
+    aggs = rollup(station_measures(stations, xw), sets)
+    cube = by_level(pd.concat([_cells(k, aggs[k]) for k in sets], ignore_index=True))
+
+    cube["ports_total"] = cube["level2_ports"] + cube["dcfc_ports"]
+    cube["dcfc_share"] = (cube["dcfc_ports"] / cube["ports_total"]).fillna(0).round(4)
+
+    # EV registrations exist per county (and in total for the state), not per region
+    cube["ev_count"] = pd.NA
+    if ev_counts is not None:
+        ev = pd.to_numeric(ev_counts["ev_count"], errors="coerce").fillna(0)
+        per_county = dict(zip(ev_counts["county"].str.strip().str.lower(), ev))
+        is_county = cube["geo_level"] == "county"
+        cube.loc[is_county, "ev_count"] = cube.loc[is_county, "geo"].str.strip().str.lower().map(per_county)
+        cube.loc[cube["geo_level"] == "state", "ev_count"] = ev.sum()
+    cube["ev_count"] = pd.to_numeric(cube["ev_count"]).astype("Int64")
+    per_1000 = cube["ports_total"] / cube["ev_count"].astype("float64") * 1000
+    cube["ports_per_1000_evs"] = per_1000.where(cube["ev_count"] > 0).round(4)
+
+    order = ["geo_level", "grouping", "level", "ports_total"]
+    return cube[CUBE_COLS].sort_values(order, ascending=[True, True, True, False], kind="stable")
+
+def slice_cube(cube: pd.DataFrame, geo_level: str = "state", dims: tuple = (), level: str = ALL) -> pd.DataFrame:
+    """Cells grouped by exactly `dims` (subset of ATTRS + connector) at one geography and level."""
+    mask = (cube["geo_level"] == geo_level) & (cube["level"] == level)
+    for c in ATTRS + ["connector"]:
+        mask &= (cube[c] != ALL) if c in dims else (cube[c] == ALL)
+    return cube[mask]
+
+def load_ev_counts():
+    return normalize_ev_counts(pd.read_csv(EV_COUNTS)) if EV_COUNTS.exists() else None
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the dashboard KPI cube from the processed stations")
+    ap.add_argument("--slice", nargs="+", metavar="DIM",
+                    help="print one slice of the existing cube: [county|region] plus any of "
+                         f"{', '.join(ATTRS + ['connector'])}")
+    ap.add_argument("--level", default=ALL, choices=LEVELS, help="level for --slice")
+    ap.add_argument("--out", type=Path, help="with --slice, write the slice to this CSV")
+    args = ap.parse_args()
+
+    if args.slice:
+        if not CUBE_OUT.exists():
+            raise SystemExit(f"ERROR: {CUBE_OUT} not found; run: python src/transform/kpi_cube.py")
+        geo = next((d for d in args.slice if d in GEO_LEVELS), "state")
+        dims = tuple(d for d in args.slice if d not in GEO_LEVELS)
+        unknown = [d for d in dims if d not in ATTRS + ["connector"]]
+        if unknown:
+            raise SystemExit(f"ERROR: unknown dimensions: {unknown}")
+        cube = pd.read_csv(CUBE_OUT, dtype={c: "string" for c in DIMS}, low_memory=False)
+        sl = slice_cube(cube, geo, dims, args.level)
+        if args.out:
+            sl.to_csv(args.out, index=False)
+            print(f"Saved: {args.out} (rows={len(sl)})")
+        else:
+            print(sl.head(25).to_string(index=False))
+        return
+
+    stations = read_table(STATIONS_IN, columns=STATION_COLS)
+    cube = build_cube(stations, load_ev_counts(), load_zip_xwalk(ZIP_XWALK))
+    PROCESSED.mkdir(parents=True, exist_ok=True)
+    cube.to_csv(CUBE_OUT, index=False)
+    print(f"Saved: {CUBE_OUT} (rows={len(cube)}, grouping sets={len(grouping_sets())})")
+
+if __name__ == "__main__":
+    main()
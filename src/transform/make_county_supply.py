@@ -1,73 +1,68 @@
 # src/transform/make_county_supply.py
+import sys
+import argparse
 from pathlib import Path
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # src/ (shared instrument module)
+from instrument import profiled, run_manifest, step
+from processed_store import parquet_path, read_table
+from availability import effective_ports
+from reference import FIPS_TO_NAME, ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+
 ROOT = Path(__file__).resolve().parents[2]
 PROCESSED = ROOT / "data" / "processed"
 EXTERNAL = ROOT / "data" / "external"
 
-STATIONS_IN = PROCESSED / "stations_ca.csv"               # from earlier pipeline
-ZIP_XWALK   = EXTERNAL / "zip_to_county_ca.csv"           # Step 2 (zip,county_fips)
+STATIONS_IN = "stations_ca"                               # processed_store table from make_kpis
 EV_COUNTS   = EXTERNAL / "ev_counts_by_county_ca.csv"     # Step 1 (county,ev_count)
 
 OUT_CSV     = PROCESSED / "ev_county_supply_vs_demand.csv"
+OUT_TOP10   = PROCESSED / "siting_score_top10_counties.csv"
+
+def load_data(effective: bool = False):
+    cols = ["zip", "ev_level2_evse_num", "ev_dc_fast_num"] + (["access_days_time"] if effective else [])
+    with step("load", reads=[parquet_path(STATIONS_IN), ZIP_XWALK, EV_COUNTS]) as st:
+        df_st = read_table(STATIONS_IN, columns=cols)
+        df_zip = load_zip_xwalk(ZIP_XWALK)
+        df_ev  = normalize_ev_counts(pd.read_csv(EV_COUNTS))
+        st.rows_out = len(df_st)
+    return df_st, df_zip, df_ev
 
-# CA county FIPS -> county name (CEC naming)
-FIPS_TO_NAME = {
-    "06001":"Alameda","06003":"Alpine","06005":"Amador","06007":"Butte","06009":"Calaveras",
-    "06011":"Colusa","06013":"Contra Costa","06015":"Del Norte","06017":"El Dorado","06019":"Fresno",
-    "06021":"Glenn","06023":"Humboldt","06025":"Imperial","06027":"Inyo","06029":"Kern",
-    "06031":"Kings","06033":"Lake","06035":"Lassen","06037":"Los Angeles","06039":"Madera",
-    "06041":"Marin","06043":"Mariposa","06045":"Mendocino","06047":"Merced","06049":"Modoc",
-    "06051":"Mono","06053":"Monterey","06055":"Napa","06057":"Nevada","06059":"Orange",
-    "06061":"Placer","06063":"Plumas","06065":"Riverside","06067":"Sacramento","06069":"San Benito",
-    "06071":"San Bernardino","06073":"San Diego","06075":"San Francisco","06077":"San Joaquin",
-    "06079":"San Luis Obispo","06081":"San Mateo","06083":"Santa Barbara","06085":"Santa Clara",
-    "06087":"Santa Cruz","06089":"Shasta","06091":"Sierra","06093":"Siskiyou","06095":"Solano",
-    "06097":"Sonoma","06099":"Stanislaus","06101":"Sutter","06103":"Tehama","06105":"Trinity",
-    "06107":"Tulare","06109":"Tuolumne","06111":"Ventura","06113":"Yolo","06115":"Yuba"
-}
-
-def load_data():
-    df_st = pd.read_csv(STATIONS_IN, dtype={"zip":"string"})
-    df_zip = pd.read_csv(ZIP_XWALK, dtype={"zip":"string","county_fips":"string"})
-    df_ev  = pd.read_csv(EV_COUNTS)
-
+def normalize_ev_counts(df_ev, names: dict = None):
     # normalize EV counts column names
-    df_ev.columns = [c.strip().lower() for c in df_ev.columns]
+    df_ev = df_ev.rename(columns=lambda c: c.strip().lower())
     if "county" not in df_ev.columns or "ev_count" not in df_ev.columns:
         raise ValueError("ev_counts_by_county_ca.csv must have columns: county, ev_count")
 
-    # keep only the 58 canonical CA counties
-    canonical = {n.lower() for n in FIPS_TO_NAME.values()}
-    df_ev = df_ev[df_ev["county"].str.strip().str.lower().isin(canonical)].copy()
+    # keep only the canonical counties (the 58 CA counties by default)
+    canonical = {n.lower() for n in (names or FIPS_TO_NAME).values()}
+    return df_ev[df_ev["county"].str.strip().str.lower().isin(canonical)].copy()
 
-    return df_st, df_zip, df_ev
-
-def derive_county_supply(df_st, df_zip):
+def derive_county_supply(df_st, df_zip, names: dict = None, effective: bool = False):
     """
     Expect stations columns:
       - 'zip'
       - 'ev_level2_evse_num'  (Level 2 ports)
       - 'ev_dc_fast_num'      (DCFC ports)
+      - 'access_days_time'    (only with effective=True)
     Adjust here if your column names differ.
     """
-    needed = ["zip", "ev_level2_evse_num", "ev_dc_fast_num"]
+    needed = ["zip", "ev_level2_evse_num", "ev_dc_fast_num"] + (["access_days_time"] if effective else [])
     missing = [c for c in needed if c not in df_st.columns]
     if missing:
-        raise ValueError(f"Missing columns in stations_ca.csv: {missing}")
+        raise ValueError(f"Missing columns in stations_ca: {missing}")
 
-    df = df_st.merge(df_zip[["zip","county_fips"]], on="zip", how="left")
-    df["county"] = df["county_fips"].map(FIPS_TO_NAME)
+    df = df_st[needed]
+    if effective:
+        df = df.assign(effective_ports=effective_ports(df)).drop(columns="access_days_time")
+    df = attach_county_from_zip(df, df_zip, names)
     df = df.dropna(subset=["county"]).copy()
 
-    for c in ["ev_level2_evse_num","ev_dc_fast_num"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
-
-    grp = df.groupby("county", as_index=False).agg(
-        level2_ports=("ev_level2_evse_num","sum"),
-        dcfc_ports=("ev_dc_fast_num","sum")
-    )
+    aggs = dict(level2_ports=("ev_level2_evse_num","sum"), dcfc_ports=("ev_dc_fast_num","sum"))
+    if effective:
+        aggs["effective_ports"] = ("effective_ports","sum")
+    grp = df.groupby("county", as_index=False).agg(**aggs)
     grp["ports_total"] = grp["level2_ports"] + grp["dcfc_ports"]
     return grp
 
@@ -80,8 +75,10 @@ def join_ev_counts(county_supply, df_ev):
     ev["county_norm"] = ev["county"].str.strip().str.lower()
 
     # start from EV counts (all counties), left-join supply
+    supply_cols = ["level2_ports","dcfc_ports","ports_total"] + \
+        (["effective_ports"] if "effective_ports" in supply.columns else [])
     merged = ev.merge(
-        supply[["county_norm","level2_ports","dcfc_ports","ports_total"]],
+        supply[["county_norm"] + supply_cols],
         on="county_norm",
         how="left"
     )
@@ -90,13 +87,13 @@ def join_ev_counts(county_supply, df_ev):
     merged["county"] = merged["county"]  # already present from ev table
 
     # fill missing supply with zeros
-    for c in ["level2_ports","dcfc_ports","ports_total"]:
+    for c in supply_cols:
         merged[c] = pd.to_numeric(merged[c], errors="coerce").fillna(0)
 
     merged["ev_count"] = pd.to_numeric(merged["ev_count"], errors="coerce").fillna(0).astype(int)
 
     # keep nice columns
-    keep = ["county","level2_ports","dcfc_ports","ports_total","ev_count"]
+    keep = ["county"] + supply_cols + ["ev_count"]
     return merged[keep]
 
 def compute_metrics(df):
@@ -104,6 +101,12 @@ def compute_metrics(df):
     # existing KPIs
     out["dcfc_share"] = (out["dcfc_ports"] / out["ports_total"]).where(out["ports_total"] > 0, 0)
     out["ports_per_1000_evs"] = (out["ports_total"] / out["ev_count"] * 1000).where(out["ev_count"] > 0, 0)
+    # effective capacity (public, open-hours weighted) replaces raw ports in the coverage term when present
+    coverage = "ports_per_1000_evs"
+    if "effective_ports" in out.columns:
+        out["effective_ports"] = out["effective_ports"].round(1)
+        out["effective_ports_per_1000_evs"] = (out["effective_ports"] / out["ev_count"] * 1000).where(out["ev_count"] > 0, 0)
+        coverage = "effective_ports_per_1000_evs"
 
     # --- Siting score ---
     # min-max normalize helper
@@ -112,7 +115,7 @@ def compute_metrics(df):
         rng = s.max() - s.min()
         return (s - s.min()) / rng if rng > 0 else pd.Series(0, index=s.index)
 
-    norm_cov_gap = 1 - minmax(out["ports_per_1000_evs"])   # lower coverage -> higher gap
+    norm_cov_gap = 1 - minmax(out[coverage])               # lower coverage -> higher gap
     norm_ev_dmd  = minmax(out["ev_count"])                  # more EVs -> higher demand
 
     out["siting_score"] = 0.6 * norm_cov_gap + 0.4 * norm_ev_dmd
@@ -124,19 +127,43 @@ def compute_metrics(df):
         "ev_count","ports_per_1000_evs","dcfc_share",
         "siting_score"
     ]
+    if coverage != "ports_per_1000_evs":
+        cols[4:4] = ["effective_ports", coverage]
     return out[cols]
 
+@profiled
+def build_county_supply(df_st, df_zip, df_ev, names: dict = None, effective: bool = False):
+    """
+    Stations + crosswalk + normalized EV counts -> (county table, siting top 10).
+    effective=True scores coverage on effective 24/7 capacity instead of raw ports.
+    """
+    with step("derive_county_supply", rows_in=len(df_st)) as st:
+        county_supply = derive_county_supply(df_st, df_zip, names, effective)
+        st.rows_out = len(county_supply)
+    with step("join_and_score", rows_in=len(county_supply)) as st:
+        merged = join_ev_counts(county_supply, df_ev)
+        final = compute_metrics(merged)
+        st.rows_out = len(final)
+    top10 = final.sort_values("siting_score", ascending=False).head(10)
+    return final, top10
+
 def main():
+    ap = argparse.ArgumentParser(description="County supply vs EV demand + siting score")
+    ap.add_argument("--capacity", choices=["ports", "effective"], default="ports",
+                    help="coverage from raw ports or effective 24/7 public capacity (access_days_time)")
+    args = ap.parse_args()
+    effective = args.capacity == "effective"
+
     PROCESSED.mkdir(parents=True, exist_ok=True)
-    df_st, df_zip, df_ev = load_data()
-    county_supply = derive_county_supply(df_st, df_zip)
-    merged = join_ev_counts(county_supply, df_ev)
-    final = compute_metrics(merged)
-    final.to_csv(OUT_CSV, index=False)
-    top10 = final.sort_values("siting_score", ascending=False).head(10)
-    (PROCESSED / "siting_score_top10_counties.csv").write_text(top10.to_csv(index=False))
-    print(f"Saved county file: {OUT_CSV} (rows={len(final)})")
-    print("Saved Top 10 siting list: data/processed/siting_score_top10_counties.csv")
+    with run_manifest("make_county_supply"):
+        df_st, df_zip, df_ev = load_data(effective)
+        final, top10 = build_county_supply(df_st, df_zip, df_ev, effective=effective)
+        with step("write_outputs") as st:
+            final.to_csv(OUT_CSV, index=False)
+            OUT_TOP10.write_text(top10.to_csv(index=False))
+            st.wrote(OUT_CSV), st.wrote(OUT_TOP10)
+        print(f"Saved county file: {OUT_CSV} (rows={len(final)})")
+        print(f"Saved Top 10 siting list: {OUT_TOP10}")
 
 if __name__ == "__main__":
     main()
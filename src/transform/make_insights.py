@@ -1,33 +1,38 @@
+import sys
 import pathlib
 import pandas as pd
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))   # src/ (shared instrument module)
+from instrument import run_manifest, step
+from insight_rules import evaluate, rules_for
+
 PROCESSED_DIR = pathlib.Path("data/processed")
 INSIGHTS_DIR = PROCESSED_DIR / "insights"
 COUNTY_SUMMARY = PROCESSED_DIR / "ev_summary_by_county.csv"
 
+def build_insights(df: pd.DataFrame) -> dict:
+    """County summary -> {output file name: table} (rules in insight_rules.RULES, group "county")."""
+    return evaluate(rules_for("county"), {"county_summary": df})
+
 def main():
     INSIGHTS_DIR.mkdir(parents=True, exist_ok=True)
-    df = pd.read_csv(COUNTY_SUMMARY)
-
-    # Top/Bottom by total ports
-    top_ports = df.sort_values("ports_total", ascending=False).head(10)
-    bot_ports = df.sort_values("ports_total", ascending=True).head(10)
-
-    # Top/Bottom by DCFC share (filter counties with at least some ports to avoid divide-by-zero noise)
-    df_nonzero = df[df["ports_total"] > 0].copy()
-    top_dcfc_share = df_nonzero.sort_values("dcfc_share", ascending=False).head(10)
-    bot_dcfc_share = df_nonzero.sort_values("dcfc_share", ascending=True).head(10)
-
-    top_ports.to_csv(INSIGHTS_DIR / "top10_ports_total.csv", index=False)
-    bot_ports.to_csv(INSIGHTS_DIR / "bottom10_ports_total.csv", index=False)
-    top_dcfc_share.to_csv(INSIGHTS_DIR / "top10_dcfc_share.csv", index=False)
-    bot_dcfc_share.to_csv(INSIGHTS_DIR / "bottom10_dcfc_share.csv", index=False)
-
-    print("Saved insight tables:")
-    print(f"- {INSIGHTS_DIR/'top10_ports_total.csv'}")
-    print(f"- {INSIGHTS_DIR/'bottom10_ports_total.csv'}")
-    print(f"- {INSIGHTS_DIR/'top10_dcfc_share.csv'}")
-    print(f"- {INSIGHTS_DIR/'bottom10_dcfc_share.csv'}")
+    with run_manifest("make_insights"):
+        with step("load", reads=[COUNTY_SUMMARY]) as st:
+            df = pd.read_csv(COUNTY_SUMMARY)
+            st.rows_out = len(df)
+
+        with step("evaluate_rules", rows_in=len(df)) as st:
+            tables = build_insights(df)
+            st.rows_out = sum(len(t) for t in tables.values())
+
+        with step("write_outputs") as st:
+            for name, table in tables.items():
+                table.to_csv(INSIGHTS_DIR / name, index=False)
+                st.wrote(INSIGHTS_DIR / name)
+
+        print("Saved insight tables:")
+        for name in tables:
+            print(f"- {INSIGHTS_DIR/name}")
 
 if __name__ == "__main__":
     main()
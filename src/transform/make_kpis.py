@@ -1,12 +1,26 @@
+import sys
+import shutil
 import pathlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))   # src/ (shared instrument module)
+from instrument import profiled, run_manifest, step
+from cleaning import STATION_RULES, apply_rules
+from availability import HOURS_PER_WEEK, public_port_hours
+from processed_store import TableWriter, write_table, parquet_path
+
 RAW_CSV = "data/raw/afdc_stations_ca.csv"
 
 PROCESSED_DIR = pathlib.Path("data/processed")
-STATIONS_OUT = PROCESSED_DIR / "stations_ca.csv"
+STATIONS_OUT = parquet_path("stations_ca")
 PORTS_OUT = PROCESSED_DIR / "ports_ca.csv"
+PORTS_EXPANDED_OUT = PROCESSED_DIR / "ports_ca_expanded.csv"
 COUNTY_SUMMARY_OUT = PROCESSED_DIR / "ev_summary_by_county.csv"
+REGION_SUMMARY_OUT = PROCESSED_DIR / "ev_summary_by_region.csv"
 
 KEEP_COLS = [
     "id", "station_name", "status_code", "ev_network", "ev_network_web",
@@ -15,121 +29,265 @@ KEEP_COLS = [
     "access_days_time", "facility_type", "station_phone"
 ]
 
-def load_raw():
-    df = pd.read_csv(RAW_CSV, dtype=str, low_memory=False)
+# --chunk-rows default: raw rows cleaned and aggregated at a time
+CHUNK_ROWS = 250_000
+
+def _keep_cols(df: pd.DataFrame) -> pd.DataFrame:
     # ensure columns exist even if AFDC omitted some
     for c in KEEP_COLS:
         if c not in df.columns:
             df[c] = pd.NA
     return df[KEEP_COLS].copy()
 
+def load_raw(path=RAW_CSV):
+    return _keep_cols(pd.read_csv(path, dtype=str, low_memory=False))
+
+def iter_raw(path=RAW_CSV, chunk_rows: int = CHUNK_ROWS):
+    """load_raw() in frames of at most `chunk_rows` rows."""
+    with pd.read_csv(path, dtype=str, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield _keep_cols(chunk)
+
 def clean_stations(df: pd.DataFrame) -> pd.DataFrame:
-    # types
-    num_cols = ["latitude", "longitude", "ev_dc_fast_num", "ev_level2_evse_num"]
-    for c in num_cols:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-
-    # normalize county names (title case, strip " County" if present)
-    def norm_county(x):
-        if pd.isna(x):
-            return x
-        x = str(x).strip()
-        if x.lower().endswith(" county"):
-            x = x[:-7]
-        return x.title()
-    df["county"] = df["county"].apply(norm_county)
-
-    # drop rows missing lat/lon (can’t map)
-    df = df.dropna(subset=["latitude", "longitude"])
-
-    # fill NA port counts with 0
-    df["ev_dc_fast_num"] = df["ev_dc_fast_num"].fillna(0).astype(int)
-    df["ev_level2_evse_num"] = df["ev_level2_evse_num"].fillna(0).astype(int)
-
-    # standardize connector types as comma-separated lower strings
-    df["ev_connector_types"] = df["ev_connector_types"].fillna("").astype(str)
-
-    def title_or_na(x):
-        if pd.isna(x) or str(x).strip() == "":
-            return pd.NA
-        return str(x).strip().title()
-
-    df["county"] = df["county"].apply(title_or_na)
-    df["city"] = df["city"].apply(title_or_na)
-
-    df["region"] = df["county"]
-    df.loc[df["region"].isna(), "region"] = df["city"]  # fallback to city
+    # types, lat/lon filter, port-count fills, county/city normalization and the
+    # region (county -> city) fallback are declared in cleaning.STATION_RULES
     # status sanity: keep status_code if present; AFDC fetch already filters to status=E
-    return df
+    return apply_rules(df, STATION_RULES)
+
+PORT_COLUMNS = ["station_id","level","ev_network","county","city","state","latitude","longitude"]
+PORTS_CHUNK_ROWS = 500_000
 
 def make_ports_table(df_stations: pd.DataFrame) -> pd.DataFrame:
     """
-    Build one row per port for Level2 and DCFC to enable per-port mapping and counts.
-    We replicate station rows according to the number of ports.
+    Compact port model: one row per station and level (Level2 / DCFC) with a
+    `ports` count, instead of one row per physical port. Use iter_port_rows /
+    write_expanded_ports when a consumer really needs per-port rows.
     """
-    # Level 2
-    lvl2 = df_stations.loc[df_stations["ev_level2_evse_num"] > 0, [
-        "id","county","city","state","latitude","longitude","ev_network"
-    ]].copy()
-    lvl2 = lvl2.reindex(lvl2.index.repeat(df_stations.loc[lvl2.index, "ev_level2_evse_num"]))
-    lvl2["level"] = "Level2"
-
-    # DC Fast
-    dcfc = df_stations.loc[df_stations["ev_dc_fast_num"] > 0, [
-        "id","county","city","state","latitude","longitude","ev_network"
-    ]].copy()
-    dcfc = dcfc.reindex(dcfc.index.repeat(df_stations.loc[dcfc.index, "ev_dc_fast_num"]))
-    dcfc["level"] = "DCFC"
-
-    ports = pd.concat([lvl2, dcfc], ignore_index=True)
+    cols = ["id","county","city","state","latitude","longitude","ev_network"]
+    parts = []
+    for level, count_col in [("Level2", "ev_level2_evse_num"), ("DCFC", "ev_dc_fast_num")]:
+        part = df_stations.loc[df_stations[count_col] > 0, cols].copy()
+        part["level"] = level
+        part["ports"] = df_stations.loc[part.index, count_col]
+        parts.append(part)
+
+    ports = pd.concat(parts, ignore_index=True)
     ports.rename(columns={"id": "station_id"}, inplace=True)
-    return ports[["station_id","level","ev_network","county","city","state","latitude","longitude"]]
+    return ports[PORT_COLUMNS[:2] + ["ports"] + PORT_COLUMNS[2:]]
 
-def make_county_summary(df_stations: pd.DataFrame) -> pd.DataFrame:
-    grp = df_stations.groupby("county", dropna=False).agg(
+def iter_port_rows(ports: pd.DataFrame, chunk_rows: int = PORTS_CHUNK_ROWS):
+    """
+    Lazily expand the compact table to one row per port, yielding frames of at
+    most `chunk_rows` rows (a single station larger than that gets its own chunk).
+    """
+    counts = ports["ports"].to_numpy()
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(ports):
+        base = ends[start - 1] if start else 0
+        stop = max(int(np.searchsorted(ends, base + chunk_rows, side="right")), start + 1)
+        part = ports.iloc[start:stop]
+        rows = np.repeat(np.arange(len(part)), counts[start:stop])
+        yield part.iloc[rows][PORT_COLUMNS].reset_index(drop=True)
+        start = stop
+
+def write_expanded_ports(ports, out_csv, chunk_rows: int = PORTS_CHUNK_ROWS) -> int:
+    """
+    Stream the per-port CSV (for Tableau) chunk by chunk. `ports` is the compact
+    table or an iterable of consecutive pieces of it. Returns rows written.
+    """
+    written = 0
+    for frame in [ports] if isinstance(ports, pd.DataFrame) else ports:
+        for chunk in iter_port_rows(frame, chunk_rows):
+            chunk.to_csv(out_csv, index=False, mode="a" if written else "w", header=not written)
+            written += len(chunk)
+    if written == 0:
+        pd.DataFrame(columns=PORT_COLUMNS).to_csv(out_csv, index=False)
+    return written
+
+# Summaries are built from partial aggregates of integer sums, so partials of
+# separate chunks merge exactly (merge_partials) into the same table.
+
+def summary_partial(df_stations: pd.DataFrame, key: str) -> pd.DataFrame:
+    # port_hours: ports x public open hours per week (availability.py)
+    return df_stations.assign(port_hours=public_port_hours(df_stations)).groupby(key, dropna=False).agg(
         level2_ports=("ev_level2_evse_num","sum"),
-        dcfc_ports=("ev_dc_fast_num","sum")
-    ).reset_index()
+        dcfc_ports=("ev_dc_fast_num","sum"),
+        port_hours=("port_hours","sum")
+    )
+
+def merge_partials(partials: list) -> pd.DataFrame:
+    merged = pd.concat(partials)
+    return merged.groupby(level=0, dropna=False).sum()
+
+def finish_summary(partial: pd.DataFrame) -> pd.DataFrame:
+    grp = partial.reset_index()
     grp["ports_total"] = grp["level2_ports"] + grp["dcfc_ports"]
     grp["dcfc_share"] = (grp["dcfc_ports"] / grp["ports_total"]).fillna(0).round(4)
-    return grp.sort_values("ports_total", ascending=False)
+    # effective_ports: capacity of always-open public ports
+    grp["effective_ports"] = (grp.pop("port_hours") / HOURS_PER_WEEK).round(1)
+    return grp.sort_values("ports_total", ascending=False, kind="stable")   # ties: key order, missing last
+
+def make_county_summary(df_stations: pd.DataFrame) -> pd.DataFrame:
+    return finish_summary(summary_partial(df_stations, "county"))
 
 def make_region_summary(df_stations: pd.DataFrame) -> pd.DataFrame:
-    grp = df_stations.groupby("region", dropna=False).agg(
-        level2_ports=("ev_level2_evse_num","sum"),
-        dcfc_ports=("ev_dc_fast_num","sum")
-    ).reset_index()
-    grp["ports_total"] = grp["level2_ports"] + grp["dcfc_ports"]
-    grp["dcfc_share"] = (grp["dcfc_ports"] / grp["ports_total"]).fillna(0).round(4)
-    return grp.sort_values("ports_total", ascending=False)
+    return finish_summary(summary_partial(df_stations, "region"))
+
+@profiled
+def build_kpis(df_raw: pd.DataFrame) -> dict:
+    """Raw AFDC frame -> cleaned stations, ports table and county/region summaries."""
+    with step("clean_stations", rows_in=len(df_raw)) as st:
+        df_stations = clean_stations(df_raw)
+        st.rows_out = len(df_stations)
+    with step("ports_table", rows_in=len(df_stations)) as st:
+        ports = make_ports_table(df_stations)
+        st.rows_out = len(ports)
+    with step("summaries", rows_in=len(df_stations)) as st:
+        county, region = make_county_summary(df_stations), make_region_summary(df_stations)
+        st.rows_out = len(county) + len(region)
+    return {
+        "stations": df_stations,
+        "ports": ports,
+        "county_summary": county,
+        "region_summary": region,
+    }
+
+# ---------------- chunked (out-of-core) mode ----------------
+
+def process_chunk(df_raw: pd.DataFrame) -> dict:
+    """One raw chunk -> cleaned stations, ports table and county/region partials."""
+    stations = clean_stations(df_raw)
+    return {
+        "stations": stations,
+        "ports": make_ports_table(stations),
+        "county": summary_partial(stations, "county"),
+        "region": summary_partial(stations, "region"),
+    }
+
+def _in_order(chunks, workers: int):
+    """process_chunk over `chunks` in input order; at most 2 x workers chunks in flight."""
+    if workers <= 1:
+        yield from map(process_chunk, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(process_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+@profiled
+def build_kpis_chunked(raw_path=RAW_CSV, chunk_rows: int = CHUNK_ROWS, workers: int = 1,
+                       expanded_ports: bool = False) -> dict:
+    """
+    Same outputs as build_kpis + write, with memory bounded by chunk_rows: cleaned
+    stations are appended to the Parquet table and ports to the CSV as chunks finish;
+    only the (small) summary partials are kept. Returns the summaries and row counts.
+    """
+    dcfc_tmp = PORTS_OUT.with_name(PORTS_OUT.name + ".dcfc.tmp")
+    port_cols = PORT_COLUMNS[:2] + ["ports"] + PORT_COLUMNS[2:]
+    pd.DataFrame(columns=port_cols).to_csv(PORTS_OUT, index=False)
+    pd.DataFrame(columns=port_cols).to_csv(dcfc_tmp, index=False, header=False)
+    county, region = [], []
+    raw_rows = ports_rows = ports_sum = 0
+
+    with TableWriter("stations_ca") as stations_out:
+        for i, part in enumerate(_in_order(iter_raw(raw_path, chunk_rows), workers)):
+            with step(f"chunk_{i:04d}", rows_in=len(part["stations"])) as st:
+                stations_out.write(part["stations"])
+                # the in-memory table lists every Level2 row, then every DCFC row
+                ports = part["ports"]
+                ports[ports["level"] == "Level2"].to_csv(PORTS_OUT, index=False, mode="a", header=False)
+                ports[ports["level"] == "DCFC"].to_csv(dcfc_tmp, index=False, mode="a", header=False)
+                county.append(part["county"])
+                region.append(part["region"])
+                ports_rows += len(ports)
+                ports_sum += int(ports["ports"].sum())
+                st.rows_out = len(ports)
+    with open(dcfc_tmp, "rb") as src, open(PORTS_OUT, "ab") as dst:
+        shutil.copyfileobj(src, dst)
+    dcfc_tmp.unlink()
+
+    expanded_rows = None
+    if expanded_ports:
+        with pd.read_csv(PORTS_OUT, chunksize=chunk_rows) as pieces:
+            expanded_rows = write_expanded_ports(pieces, PORTS_EXPANDED_OUT)
+    return {
+        "county_summary": finish_summary(merge_partials(county)),
+        "region_summary": finish_summary(merge_partials(region)),
+        "stations_rows": stations_out.rows,
+        "ports_rows": ports_rows,
+        "ports_sum": ports_sum,
+        "expanded_rows": expanded_rows,
+    }
 
 def main():
-    REGION_SUMMARY_OUT = PROCESSED_DIR / "ev_summary_by_region.csv"
+    ap = argparse.ArgumentParser(description="Clean AFDC stations and build KPI tables")
+    ap.add_argument("--expanded-ports", action="store_true",
+                    help=f"also stream one-row-per-port {PORTS_EXPANDED_OUT.name} for Tableau")
+    ap.add_argument("--chunk-rows", type=int, default=0, metavar="N",
+                    help=f"stream the raw CSV N rows at a time (e.g. {CHUNK_ROWS}) instead of loading it whole")
+    ap.add_argument("--workers", type=int, default=1, help="with --chunk-rows: processes cleaning chunks")
+    args = ap.parse_args()
+    if args.chunk_rows < 0 or args.workers < 1:
+        raise SystemExit("ERROR: --chunk-rows must be >= 0 and --workers >= 1")
 
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
-    df_raw = load_raw()
-    df_stations = clean_stations(df_raw)
+    if args.chunk_rows:
+        with run_manifest("make_kpis"):
+            with step("build_kpis_chunked", reads=[RAW_CSV]) as st:
+                out = build_kpis_chunked(RAW_CSV, args.chunk_rows, args.workers, args.expanded_ports)
+                st.rows_out = out["stations_rows"]
+            with step("write_outputs") as st:
+                out["county_summary"].to_csv(COUNTY_SUMMARY_OUT, index=False)
+                out["region_summary"].to_csv(REGION_SUMMARY_OUT, index=False)
+                for p in [STATIONS_OUT, PORTS_OUT, COUNTY_SUMMARY_OUT, REGION_SUMMARY_OUT]:
+                    st.wrote(p)
+
+            print(f"Saved processed outputs (chunks of {args.chunk_rows} rows, workers={args.workers}):")
+            print(f"- Stations: {STATIONS_OUT} (rows={out['stations_rows']})")
+            print(f"- Ports   : {PORTS_OUT} (rows={out['ports_rows']}, ports={out['ports_sum']})")
+            if out["expanded_rows"] is not None:
+                print(f"- Ports (per-port rows): {PORTS_EXPANDED_OUT} (rows={out['expanded_rows']})")
+            print(f"- County summary: {COUNTY_SUMMARY_OUT}")
+            print(f"- Region summary: {REGION_SUMMARY_OUT}")
+        return
+
+    with run_manifest("make_kpis"):
+        with step("load_raw", reads=[RAW_CSV]) as st:
+            df_raw = load_raw()
+            st.rows_out = len(df_raw)
 
-    # Save cleaned stations
-    df_stations.to_csv(STATIONS_OUT, index=False)
+        with step("build_kpis", rows_in=len(df_raw)):
+            out = build_kpis(df_raw)
 
-    # Ports table (may be large; OK)
-    ports = make_ports_table(df_stations)
-    ports.to_csv(PORTS_OUT, index=False)
+        with step("write_outputs") as st:
+            # Save cleaned stations (typed Parquet; CSV via processed_store.py export)
+            st.wrote(write_table(out["stations"], "stations_ca"))
 
-    # County KPI summary
-    county_summary = make_county_summary(df_stations)
-    county_summary.to_csv(COUNTY_SUMMARY_OUT, index=False)
+            # Ports table: one row per station x level with a port count
+            ports = out["ports"]
+            ports.to_csv(PORTS_OUT, index=False)
+            expanded_rows = write_expanded_ports(ports, PORTS_EXPANDED_OUT) if args.expanded_ports else None
 
-    region_summary = make_region_summary(df_stations)
-    region_summary.to_csv(REGION_SUMMARY_OUT, index=False)
+            # County KPI summary
+            out["county_summary"].to_csv(COUNTY_SUMMARY_OUT, index=False)
+            out["region_summary"].to_csv(REGION_SUMMARY_OUT, index=False)
+            for p in [PORTS_OUT, COUNTY_SUMMARY_OUT, REGION_SUMMARY_OUT] + ([PORTS_EXPANDED_OUT] if args.expanded_ports else []):
+                st.wrote(p)
+            st.rows_out = len(out["stations"]) + len(ports)
 
-    print("Saved processed outputs:")
-    print(f"- Stations: {STATIONS_OUT}")
-    print(f"- Ports   : {PORTS_OUT} (rows={len(ports)})")
-    print(f"- County summary: {COUNTY_SUMMARY_OUT}")
-    print(f"- Region summary: {REGION_SUMMARY_OUT}")
+        print("Saved processed outputs:")
+        print(f"- Stations: {STATIONS_OUT}")
+        print(f"- Ports   : {PORTS_OUT} (rows={len(ports)}, ports={int(ports['ports'].sum())})")
+        if expanded_rows is not None:
+            print(f"- Ports (per-port rows): {PORTS_EXPANDED_OUT} (rows={expanded_rows})")
+        print(f"- County summary: {COUNTY_SUMMARY_OUT}")
+        print(f"- Region summary: {REGION_SUMMARY_OUT}")
 
 if __name__ == "__main__":
     main()
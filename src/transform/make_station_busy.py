@@ -1,83 +1,121 @@
 # src/transform/make_station_busy.py
+import sys
+import argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # src/ (shared instrument module)
+from instrument import profiled, run_manifest, step
+from processed_store import parquet_path, read_table
+from reference import ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+from make_county_supply import EV_COUNTS, normalize_ev_counts
+from gravity import DECAY_KM, MAX_KM, allocate, demand_points, unplaced_demand
+
 ROOT = Path(__file__).resolve().parents[2]
 PROCESSED = ROOT / "data" / "processed"
-EXTERNAL = ROOT / "data" / "external"
-
-STATIONS_IN = PROCESSED / "stations_ca.csv"            # cleaned stations you already generated
-ZIP_XWALK   = EXTERNAL / "zip_to_county_ca.csv"        # (zip, county_fips) you built earlier
-
-# CA county FIPS -> county name
-FIPS_TO_NAME = {
-    "06001":"Alameda","06003":"Alpine","06005":"Amador","06007":"Butte","06009":"Calaveras",
-    "06011":"Colusa","06013":"Contra Costa","06015":"Del Norte","06017":"El Dorado","06019":"Fresno",
-    "06021":"Glenn","06023":"Humboldt","06025":"Imperial","06027":"Inyo","06029":"Kern",
-    "06031":"Kings","06033":"Lake","06035":"Lassen","06037":"Los Angeles","06039":"Madera",
-    "06041":"Marin","06043":"Mariposa","06045":"Mendocino","06047":"Merced","06049":"Modoc",
-    "06051":"Mono","06053":"Monterey","06055":"Napa","06057":"Nevada","06059":"Orange",
-    "06061":"Placer","06063":"Plumas","06065":"Riverside","06067":"Sacramento","06069":"San Benito",
-    "06071":"San Bernardino","06073":"San Diego","06075":"San Francisco","06077":"San Joaquin",
-    "06079":"San Luis Obispo","06081":"San Mateo","06083":"Santa Barbara","06085":"Santa Clara",
-    "06087":"Santa Cruz","06089":"Shasta","06091":"Sierra","06093":"Siskiyou","06095":"Solano",
-    "06097":"Sonoma","06099":"Stanislaus","06101":"Sutter","06103":"Tehama","06105":"Trinity",
-    "06107":"Tulare","06109":"Tuolumne","06111":"Ventura","06113":"Yolo","06115":"Yuba"
-}
+
+STATIONS_IN = "stations_ca"                            # processed_store table from make_kpis
 
 OUT_ALL = PROCESSED / "station_busy_candidates.csv"
 OUT_TOP = PROCESSED / "station_busy_top25.csv"
+OUT_GRAVITY_ALL = PROCESSED / "station_busy_gravity_candidates.csv"
+OUT_GRAVITY_TOP = PROCESSED / "station_busy_gravity_top25.csv"
 
-def main():
-    df = pd.read_csv(STATIONS_IN, dtype={"zip":"string"}, low_memory=False)
-
-    # Expected column names – adjust here if yours differ
-    # station name/city/zip
-    name_col = "station_name" if "station_name" in df.columns else "station_name"
-    city_col = "city" if "city" in df.columns else "city"
-    zip_col  = "zip" if "zip" in df.columns else "zip"
+# station name/city/zip + port counts (typed by the store schema)
+NAME_COL, CITY_COL, ZIP_COL = "station_name", "city", "zip"
+L2_COL = "ev_level2_evse_num"
+DC_COL = "ev_dc_fast_num"
+KEEP = [NAME_COL, CITY_COL, ZIP_COL, L2_COL, DC_COL]
+GRAVITY_KEEP = KEEP + ["latitude", "longitude"]
+RENAME = {NAME_COL: "station_name", CITY_COL: "city", ZIP_COL: "zip", L2_COL: "level2_ports", DC_COL: "dcfc_ports"}
 
-    # port counts
-    l2_col = "ev_level2_evse_num"
-    dc_col = "ev_dc_fast_num"
-    missing = [c for c in [name_col, city_col, zip_col, l2_col, dc_col] if c not in df.columns]
-    if missing:
-        raise ValueError(f"stations_ca.csv is missing needed columns: {missing}")
+def busy_score(dcfc_ports, level2_ports):
+    """Capacity proxy: DCFC ports weigh 6x a Level 2 port."""
+    return 1.5 * dcfc_ports + 0.25 * level2_ports
 
-    # keep only needed fields
-    keep = [name_col, city_col, zip_col, l2_col, dc_col]
-    df = df[keep].copy()
-
-    # numeric ports
-    df[l2_col] = pd.to_numeric(df[l2_col], errors="coerce").fillna(0)
-    df[dc_col] = pd.to_numeric(df[dc_col], errors="coerce").fillna(0)
+@profiled
+def score_stations(df: pd.DataFrame, xw: pd.DataFrame) -> pd.DataFrame:
+    """One row per station with county + likely_busy_score, sorted best-first."""
+    df = df[KEEP]
 
     # add county via ZIP crosswalk
-    xw = pd.read_csv(ZIP_XWALK, dtype={"zip":"string","county_fips":"string"})
-    df = df.merge(xw[["zip","county_fips"]], on="zip", how="left")
-    df["county"] = df["county_fips"].map(FIPS_TO_NAME)
+    df = attach_county_from_zip(df, xw)
 
     # compute totals + busy score
-    df["total_ports"] = df[l2_col] + df[dc_col]
-    df["likely_busy_score"] = 1.5 * df[dc_col] + 0.25 * df[l2_col]
+    df["total_ports"] = df[L2_COL] + df[DC_COL]
+    df["likely_busy_score"] = busy_score(df[DC_COL], df[L2_COL])
 
     # order & rename for clarity
-    out = df.rename(columns={
-        name_col: "station_name",
-        city_col: "city",
-        zip_col: "zip",
-        l2_col: "level2_ports",
-        dc_col: "dcfc_ports",
-    })[["station_name","city","zip","county","level2_ports","dcfc_ports","total_ports","likely_busy_score"]]
-
-    # sort & save
-    out_sorted = out.sort_values(["likely_busy_score","dcfc_ports","total_ports"], ascending=False)
-    PROCESSED.mkdir(parents=True, exist_ok=True)
-    out_sorted.to_csv(OUT_ALL, index=False)
-    out_sorted.head(25).to_csv(OUT_TOP, index=False)
-
-    print(f"Saved: {OUT_ALL} (rows={len(out_sorted)})")
-    print(f"Saved: {OUT_TOP}")
+    out = df.rename(columns=RENAME)[
+        ["station_name","city","zip","county","level2_ports","dcfc_ports","total_ports","likely_busy_score"]]
+
+    return out.sort_values(["likely_busy_score","dcfc_ports","total_ports"], ascending=False)
+
+@profiled
+def score_stations_gravity(df: pd.DataFrame, xw: pd.DataFrame, ev_counts: pd.DataFrame,
+                           decay_km: float = DECAY_KM, max_km: float = MAX_KM):
+    """
+    Gravity mode: county EVs allocated to stations by distance decay and competing
+    capacity (gravity.py). -> (stations sorted by expected_evs_per_port,
+    unallocated EVs {"no_stations": counties without a station, "out_of_range": no station within max_km})
+    """
+    df = attach_county_from_zip(df[GRAVITY_KEEP], xw)
+    df["total_ports"] = df[L2_COL] + df[DC_COL]
+    df["likely_busy_score"] = busy_score(df[DC_COL], df[L2_COL])
+
+    pts = demand_points(df, ev_counts)
+    load, out_of_range = allocate(pts["latitude"], pts["longitude"], pts["demand"],
+                                  df["latitude"], df["longitude"], df["likely_busy_score"],
+                                  decay_km=decay_km, max_km=max_km)
+    unallocated = {"no_stations": unplaced_demand(pts, ev_counts), "out_of_range": out_of_range}
+    df["expected_evs"] = load.round(1)
+    per_port = np.divide(load, df["total_ports"].to_numpy(dtype=float),
+                         out=np.zeros(len(df)), where=df["total_ports"].to_numpy() > 0)
+    df["expected_evs_per_port"] = per_port.round(2)
+
+    out = df.rename(columns=RENAME)[
+        ["station_name","city","zip","county","level2_ports","dcfc_ports","total_ports",
+         "likely_busy_score","expected_evs","expected_evs_per_port"]]
+    return out.sort_values(["expected_evs_per_port","expected_evs"], ascending=False), unallocated
+
+def main():
+    ap = argparse.ArgumentParser(description="Score stations that are likely to be busy")
+    ap.add_argument("--mode", choices=["heuristic", "gravity"], default="heuristic",
+                    help="fixed port-count formula, or county EV demand allocated by distance decay")
+    ap.add_argument("--decay-km", type=float, default=DECAY_KM, help="gravity: distance decay scale")
+    ap.add_argument("--max-km", type=float, default=MAX_KM, help="gravity: ignore stations farther than this")
+    args = ap.parse_args()
+    gravity = args.mode == "gravity"
+    out_all, out_top = (OUT_GRAVITY_ALL, OUT_GRAVITY_TOP) if gravity else (OUT_ALL, OUT_TOP)
+
+    with run_manifest("make_station_busy"):
+        # project only the needed fields
+        with step("load", reads=[parquet_path(STATIONS_IN), ZIP_XWALK]) as st:
+            df = read_table(STATIONS_IN, columns=GRAVITY_KEEP if gravity else KEEP)
+            xw = load_zip_xwalk(ZIP_XWALK)
+            ev = normalize_ev_counts(pd.read_csv(st.read(EV_COUNTS))) if gravity else None
+            st.rows_out = len(df)
+
+        # sort & save
+        with step("score", rows_in=len(df)) as st:
+            if gravity:
+                out_sorted, unallocated = score_stations_gravity(df, xw, ev, args.decay_km, args.max_km)
+            else:
+                out_sorted = score_stations(df, xw)
+            st.rows_out = len(out_sorted)
+        with step("write_outputs") as st:
+            PROCESSED.mkdir(parents=True, exist_ok=True)
+            out_sorted.to_csv(out_all, index=False)
+            out_sorted.head(25).to_csv(out_top, index=False)
+            st.wrote(out_all), st.wrote(out_top)
+
+        if gravity:
+            print(f"Allocated {out_sorted['expected_evs'].sum():,.0f} EVs to stations; unallocated: "
+                  f"{unallocated['no_stations']:,.0f} in counties with no station, "
+                  f"{unallocated['out_of_range']:,.0f} with no station within {args.max_km:g} km")
+        print(f"Saved: {out_all} (rows={len(out_sorted)})")
+        print(f"Saved: {out_top}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+# src/transform/multistate.py
+"""
+Multi-state / national mode.
+
+Raw extracts are partitioned by state (data/raw/afdc_stations_<st>.csv, written by
+`afdc_fetch.py --states ...`). Each state is transformed independently in a
+process pool: KPIs + stations table into data/processed/states/<ST>/, and the
+county supply table when that state's ZIP crosswalk and EV counts are present.
+The per-state county summaries are then rolled up into national tables.
+
+States are submitted largest-first, so wall time is roughly
+(total rows / cores) rather than (number of states x per-state time).
+
+    python src/transform/multistate.py --states CA NV OR AZ
+    python src/transform/multistate.py --all --workers 8     # every raw partition present
+
+Outputs:
+  data/processed/states/<ST>/stations.parquet, ports.csv, ev_summary_by_county.csv,
+      ev_summary_by_region.csv [, ev_county_supply_vs_demand.csv, siting_score_top10_counties.csv]
+  data/processed/national/ev_summary_by_county_us.csv   one row per (state, county)
+  data/processed/national/ev_summary_by_state_us.csv    one row per state
+"""
+import os
+import re
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+from make_kpis import build_kpis, load_raw
+from make_county_supply import build_county_supply, normalize_ev_counts
+from processed_store import state_dir, write_table
+from reference import (EXTERNAL, STATE_FIPS, county_names, load_county_fips,
+                       load_state_zip_xwalk)
+
+ROOT = Path(__file__).resolve().parents[2]
+RAW_DIR = ROOT / "data" / "raw"
+NATIONAL = ROOT / "data" / "processed" / "national"
+
+RAW_PATTERN = "afdc_stations_{state}.csv"
+EV_COUNTS_PATTERN = "ev_counts_by_county_{state}.csv"
+
+COUNTY_US_OUT = NATIONAL / "ev_summary_by_county_us.csv"
+STATE_US_OUT = NATIONAL / "ev_summary_by_state_us.csv"
+SUPPLY_US_OUT = NATIONAL / "ev_county_supply_vs_demand_us.csv"
+
+def raw_partition(state: str) -> Path:
+    return RAW_DIR / RAW_PATTERN.format(state=state.lower())
+
+def available_states() -> list:
+    found = []
+    for p in RAW_DIR.glob(RAW_PATTERN.format(state="*")):
+        m = re.fullmatch(RAW_PATTERN.format(state="([a-z]{2})"), p.name)
+        if m and m.group(1).upper() in STATE_FIPS:
+            found.append(m.group(1).upper())
+    return sorted(found)
+
+def run_state(state: str) -> dict:
+    """Transform one state's raw partition; returns its summaries for the national rollup."""
+    t0 = time.perf_counter()
+    out_dir = state_dir(state)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    kpis = build_kpis(load_raw(raw_partition(state)))
+    write_table(kpis["stations"], "stations", out_dir)
+    kpis["ports"].to_csv(out_dir / "ports.csv", index=False)
+    kpis["county_summary"].to_csv(out_dir / "ev_summary_by_county.csv", index=False)
+    kpis["region_summary"].to_csv(out_dir / "ev_summary_by_region.csv", index=False)
+
+    # county supply only where the state's reference data is available
+    supply, note = None, None
+    ev_path = EXTERNAL / EV_COUNTS_PATTERN.format(state=state.lower())
+    if ev_path.exists():
+        try:
+            names = county_names(state)
+            xwalk = load_state_zip_xwalk(state)
+        except OSError as e:   # missing crosswalk / Census file not cached and offline
+            note = f"no county supply: {e}"
+        else:
+            ev = normalize_ev_counts(pd.read_csv(ev_path), names)
+            supply, top10 = build_county_supply(kpis["stations"], xwalk, ev, names)
+            supply.to_csv(out_dir / "ev_county_supply_vs_demand.csv", index=False)
+            top10.to_csv(out_dir / "siting_score_top10_counties.csv", index=False)
+    else:
+        note = f"no county supply: {ev_path.name} missing"
+
+    return {
+        "state": state,
+        "stations": len(kpis["stations"]),
+        "county_summary": kpis["county_summary"].assign(state=state),
+        "county_supply": None if supply is None else supply.assign(state=state),
+        "seconds": time.perf_counter() - t0,
+        "note": note,
+    }
+
+def run_states(states: list, workers: int = None) -> list:
+    # largest partitions first so one big state doesn't start last and set the wall time
+    states = sorted(states, key=lambda s: raw_partition(s).stat().st_size, reverse=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_state, s): s for s in states}
+        for fut in as_completed(futures):
+            r = fut.result()
+            results.append(r)
+            print(f"[{r['state']}] {r['stations']} stations in {r['seconds']:.2f}s"
+                  + (f" ({r['note']})" if r["note"] else ""))
+    return sorted(results, key=lambda r: r["state"])
+
+def national_rollup(results: list) -> dict:
+    """Per-state county summaries -> national (state, county) and per-state tables."""
+    county = pd.concat([r["county_summary"] for r in results], ignore_index=True)
+    county = county[["state"] + [c for c in county.columns if c != "state"]]
+    county = county.sort_values("ports_total", ascending=False)
+
+    by_state = county.groupby("state", as_index=False).agg(
+        level2_ports=("level2_ports", "sum"),
+        dcfc_ports=("dcfc_ports", "sum"),
+        effective_ports=("effective_ports", "sum"),
+    )
+    by_state["ports_total"] = by_state["level2_ports"] + by_state["dcfc_ports"]
+    by_state["dcfc_share"] = (by_state["dcfc_ports"] / by_state["ports_total"]).fillna(0).round(4)
+    by_state["effective_ports"] = by_state.pop("effective_ports").round(1)
+    by_state["stations"] = by_state["state"].map({r["state"]: r["stations"] for r in results})
+    out = {"county": county, "state": by_state.sort_values("ports_total", ascending=False)}
+
+    supply = [r["county_supply"] for r in results if r["county_supply"] is not None]
+    if supply:
+        supply = pd.concat(supply, ignore_index=True)
+        out["supply"] = supply[["state"] + [c for c in supply.columns if c != "state"]]
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-state transforms in a process pool + national rollup")
+    ap.add_argument("--states", nargs="+", metavar="ST", help="two-letter state codes")
+    ap.add_argument("--all", action="store_true", help="every state with a raw partition in data/raw")
+    ap.add_argument("--workers", type=int, default=os.cpu_count(), help="processes (default: all cores)")
+    args = ap.parse_args()
+
+    states = available_states() if args.all else [s.upper() for s in (args.states or [])]
+    if not states:
+        raise SystemExit("ERROR: pass --states ST [ST ...] or --all")
+    unknown = [s for s in states if s not in STATE_FIPS]
+    missing = [s for s in states if s in STATE_FIPS and not raw_partition(s).exists()]
+    if unknown:
+        raise SystemExit(f"ERROR: unknown state codes: {unknown}")
+    if missing:
+        raise SystemExit(f"ERROR: no raw partition for {missing}; run: python src/extract/afdc_fetch.py --states {' '.join(missing)}")
+
+    # fetch/cache the Census county list once, not once per worker
+    if any(s != "CA" for s in states):
+        try:
+            load_county_fips()
+        except OSError as e:
+            print(f"WARNING: county FIPS reference unavailable ({e}); non-CA county supply skipped")
+
+    t0 = time.perf_counter()
+    results = run_states(states, args.workers)
+    roll = national_rollup(results)
+    NATIONAL.mkdir(parents=True, exist_ok=True)
+    roll["county"].to_csv(COUNTY_US_OUT, index=False)
+    roll["state"].to_csv(STATE_US_OUT, index=False)
+    print(f"\nTransformed {len(results)} states in {time.perf_counter() - t0:.2f}s (workers={args.workers})")
+    print(f"Saved: {COUNTY_US_OUT}")
+    print(f"Saved: {STATE_US_OUT}")
+    if "supply" in roll:
+        roll["supply"].to_csv(SUPPLY_US_OUT, index=False)
+        print(f"Saved: {SUPPLY_US_OUT}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# src/transform/processed_store.py
+"""
+Typed columnar (Parquet) store for data/processed.
+
+make_kpis writes stations_ca.parquet once under STATIONS_SCHEMA; downstream stages
+read it back with column projection and memory-mapping, so the dtype coercion done
+in clean_stations is not repeated per stage. CSVs for Tableau are an explicit export:
+
+    python src/transform/processed_store.py            # export every table
+    python src/transform/processed_store.py stations_ca
+"""
+import sys
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).resolve().parents[2]
+PROCESSED = ROOT / "data" / "processed"
+
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+STATIONS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("station_name", pa.string()),
+    ("status_code", _CATEGORY),
+    ("ev_network", _CATEGORY),
+    ("ev_network_web", pa.string()),
+    ("city", pa.string()),
+    ("county", _CATEGORY),
+    ("state", _CATEGORY),
+    ("zip", pa.string()),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("ev_dc_fast_num", pa.int32()),
+    ("ev_level2_evse_num", pa.int32()),
+    ("ev_connector_types", pa.string()),
+    ("access_days_time", pa.string()),
+    ("facility_type", _CATEGORY),
+    ("station_phone", pa.string()),
+    ("region", pa.string()),
+])
+
+SCHEMAS = {
+    "stations_ca": STATIONS_SCHEMA,
+    "stations": STATIONS_SCHEMA,      # per-state partitions (data/processed/states/<ST>/)
+}
+
+def state_dir(state: str) -> Path:
+    return PROCESSED / "states" / state.upper()
+
+def parquet_path(name: str, root: Path = PROCESSED) -> Path:
+    return Path(root) / f"{name}.parquet"
+
+def csv_path(name: str, root: Path = PROCESSED) -> Path:
+    return Path(root) / f"{name}.csv"
+
+def _pandas_dtype(field: pa.Field):
+    t = field.type
+    if pa.types.is_dictionary(t):
+        return "category"
+    if pa.types.is_integer(t):
+        return t.to_pandas_dtype()
+    if pa.types.is_floating(t):
+        return t.to_pandas_dtype()
+    return "string"
+
+def conform(df: pd.DataFrame, schema: pa.Schema) -> pd.DataFrame:
+    """Cast a frame to the declared schema (columns in schema order, missing -> NA)."""
+    out = pd.DataFrame(index=df.index)
+    for field in schema:
+        col = df[field.name] if field.name in df.columns else pd.Series(pd.NA, index=df.index)
+        dtype = _pandas_dtype(field)
+        if pa.types.is_integer(field.type):
+            col = pd.to_numeric(col, errors="coerce").fillna(0).astype(dtype)
+        elif pa.types.is_floating(field.type):
+            col = pd.to_numeric(col, errors="coerce").astype(dtype)
+        else:
+            col = col.astype("string").astype(dtype)
+        out[field.name] = col
+    return out
+
+def write_table(df: pd.DataFrame, name: str, root: Path = PROCESSED) -> Path:
+    schema = SCHEMAS[name]
+    table = pa.Table.from_pandas(conform(df, schema), schema=schema, preserve_index=False)
+    Path(root).mkdir(parents=True, exist_ok=True)
+    path = parquet_path(name, root)
+    pq.write_table(table, path)
+    return path
+
+class TableWriter:
+    """
+    Append frames to one Parquet table (same schema and path as write_table), e.g.
+    cleaned stations chunk by chunk; each write() becomes one row group.
+    """
+    def __init__(self, name: str, root: Path = PROCESSED):
+        self.schema = SCHEMAS[name]
+        Path(root).mkdir(parents=True, exist_ok=True)
+        self.path = parquet_path(name, root)
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(conform(df, self.schema), schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            # opened on the first table so the file keeps its pandas metadata
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self) -> Path:
+        if self.writer is None:
+            self.write(pd.DataFrame(columns=self.schema.names))
+        self.writer.close()
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def read_table(name: str, columns: list = None, root: Path = PROCESSED) -> pd.DataFrame:
+    """
+    Read `name` with only `columns` (None = all). Prefers the memory-mapped Parquet
+    file; falls back to the CSV export (cast to the same schema) if it is missing.
+    """
+    schema = SCHEMAS[name]
+    path = parquet_path(name, root)
+    if path.exists():
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    fields = [schema.field(c) for c in (columns or schema.names)]
+    df = pd.read_csv(csv_path(name, root), usecols=[f.name for f in fields], dtype=str, low_memory=False)
+    return conform(df, pa.schema(fields))
+
+def export_csv(name: str) -> Path:
+    df = pq.read_table(parquet_path(name), memory_map=True).to_pandas()
+    out = csv_path(name)
+    df.to_csv(out, index=False)
+    return out
+
+def main():
+    names = sys.argv[1:] or [n for n in SCHEMAS if parquet_path(n).exists()]
+    for name in names:
+        print(f"Exported: {export_csv(name)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# src/transform/reference.py
+# Shared reference data for the county roll-ups (FIPS names + ZIP crosswalk).
+# California is built in; other states use the Census county file cached in data/external.
+import re
+from pathlib import Path
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+EXTERNAL = ROOT / "data" / "external"
+
+ZIP_XWALK = EXTERNAL / "zip_to_county_ca.csv"       # (zip, county_fips)
+ZIP_XWALK_US = EXTERNAL / "zip_to_county_us.csv"    # national fallback, same columns
+
+# Census 2020 county list (STATE|STATEFP|COUNTYFP|COUNTYNS|COUNTYNAME|CLASSFP|FUNCSTAT)
+COUNTY_FIPS_FILE = EXTERNAL / "national_county2020.txt"
+COUNTY_FIPS_URL = "https://www2.census.gov/geo/docs/reference/codes2020/national_county2020.txt"
+
+# state / DC / PR postal code -> state FIPS
+STATE_FIPS = {
+    "AL":"01","AK":"02","AZ":"04","AR":"05","CA":"06","CO":"08","CT":"09","DE":"10","DC":"11",
+    "FL":"12","GA":"13","HI":"15","ID":"16","IL":"17","IN":"18","IA":"19","KS":"20","KY":"21",
+    "LA":"22","ME":"23","MD":"24","MA":"25","MI":"26","MN":"27","MS":"28","MO":"29","MT":"30",
+    "NE":"31","NV":"32","NH":"33","NJ":"34","NM":"35","NY":"36","NC":"37","ND":"38","OH":"39",
+    "OK":"40","OR":"41","PA":"42","RI":"44","SC":"45","SD":"46","TN":"47","TX":"48","UT":"49",
+    "VT":"50","VA":"51","WA":"53","WV":"54","WI":"55","WY":"56","PR":"72"
+}
+
+# CA county FIPS -> county name (CEC naming)
+FIPS_TO_NAME = {
+    "06001":"Alameda","06003":"Alpine","06005":"Amador","06007":"Butte","06009":"Calaveras",
+    "06011":"Colusa","06013":"Contra Costa","06015":"Del Norte","06017":"El Dorado","06019":"Fresno",
+    "06021":"Glenn","06023":"Humboldt","06025":"Imperial","06027":"Inyo","06029":"Kern",
+    "06031":"Kings","06033":"Lake","06035":"Lassen","06037":"Los Angeles","06039":"Madera",
+    "06041":"Marin","06043":"Mariposa","06045":"Mendocino","06047":"Merced","06049":"Modoc",
+    "06051":"Mono","06053":"Monterey","06055":"Napa","06057":"Nevada","06059":"Orange",
+    "06061":"Placer","06063":"Plumas","06065":"Riverside","06067":"Sacramento","06069":"San Benito",
+    "06071":"San Bernardino","06073":"San Diego","06075":"San Francisco","06077":"San Joaquin",
+    "06079":"San Luis Obispo","06081":"San Mateo","06083":"Santa Barbara","06085":"Santa Clara",
+    "06087":"Santa Cruz","06089":"Shasta","06091":"Sierra","06093":"Siskiyou","06095":"Solano",
+    "06097":"Sonoma","06099":"Stanislaus","06101":"Sutter","06103":"Tehama","06105":"Trinity",
+    "06107":"Tulare","06109":"Tuolumne","06111":"Ventura","06113":"Yolo","06115":"Yuba"
+}
+
+# "Alameda County" -> "Alameda" (matches the CEC naming above); Virginia's
+# independent cities keep their " city" suffix so they don't collide with counties
+_COUNTY_SUFFIX = re.compile(r" (County|Parish|Borough|City and Borough|Census Area|Municipality|Municipio)$")
+
+def load_zip_xwalk(path=ZIP_XWALK) -> pd.DataFrame:
+    return pd.read_csv(path, dtype={"zip":"string","county_fips":"string"})
+
+def zip_xwalk_path(state: str = "CA") -> Path:
+    return EXTERNAL / f"zip_to_county_{state.lower()}.csv"
+
+def load_state_zip_xwalk(state: str = "CA") -> pd.DataFrame:
+    """Per-state crosswalk if present, else the national one cut to the state's FIPS prefix."""
+    path = zip_xwalk_path(state)
+    if path.exists():
+        return load_zip_xwalk(path)
+    if not ZIP_XWALK_US.exists():
+        raise FileNotFoundError(f"No ZIP crosswalk for {state}: expected {path} or {ZIP_XWALK_US}")
+    xw = load_zip_xwalk(ZIP_XWALK_US)
+    return xw[xw["county_fips"].str.startswith(STATE_FIPS[state.upper()])].reset_index(drop=True)
+
+def load_county_fips(path=COUNTY_FIPS_FILE, download: bool = True) -> pd.DataFrame:
+    """(state, county_fips, county) for every US county; fetched once and cached."""
+    path = Path(path)
+    if not path.exists():
+        if not download:
+            raise FileNotFoundError(path)
+        import requests
+        r = requests.get(COUNTY_FIPS_URL, timeout=60)
+        r.raise_for_status()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(r.content)
+    df = pd.read_csv(path, sep="|", dtype=str, encoding="latin-1")
+    return pd.DataFrame({
+        "state": df["STATE"],
+        "county_fips": df["STATEFP"] + df["COUNTYFP"],
+        "county": df["COUNTYNAME"].str.replace(_COUNTY_SUFFIX, "", regex=True),
+    })
+
+def county_names(state: str = "CA") -> dict:
+    """county FIPS -> county name for one state (CA from the built-in table)."""
+    if state.upper() == "CA":
+        return FIPS_TO_NAME
+    ref = load_county_fips()
+    ref = ref[ref["state"] == state.upper()]
+    return dict(zip(ref["county_fips"], ref["county"]))
+
+def attach_county_from_zip(df: pd.DataFrame, df_zip: pd.DataFrame, names: dict = None) -> pd.DataFrame:
+    """Left-join county_fips on zip and map it to the county name (NaN when unmatched)."""
+    out = df.merge(df_zip[["zip","county_fips"]], on="zip", how="left")
+    out["county"] = out["county_fips"].map(FIPS_TO_NAME if names is None else names)
+    return out
@@ -0,0 +1,199 @@
+# src/transform/siting_scenarios.py
+"""
+Siting-score scenario sweep: how stable is the county ranking under other
+weightings and normalizations?
+
+Every county is scored under thousands of weight vectors at once as a single
+matrix product (counties x factors) @ (factors x scenarios). The baseline
+scenario is exactly compute_metrics' 0.6 * coverage gap + 0.4 * EV demand.
+
+    python src/transform/siting_scenarios.py
+    python src/transform/siting_scenarios.py --factors cov_gap ev_demand dcfc_gap --samples 20000
+    python src/transform/siting_scenarios.py --with-distance   # adds mean km to nearest DCFC
+    python src/transform/siting_scenarios.py --factors cov_gap dcfc_distance   # implies --with-distance
+
+Outputs (data/processed/):
+  siting_rank_stability.csv  per county: baseline rank, top-10 / top-1 frequency, rank quantiles
+  siting_weight_regions.csv  per (normalization, #1 county): share of scenarios and the weight ranges
+  siting_pair_flips.csv      adjacent baseline pairs: how often they swap and under which weights
+"""
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from make_county_supply import OUT_CSV as COUNTY_SUPPLY_CSV
+from processed_store import read_table
+from reference import attach_county_from_zip, load_zip_xwalk
+from spatial_index import StationIndex
+
+ROOT = Path(__file__).resolve().parents[2]
+PROCESSED = ROOT / "data" / "processed"
+
+OUT_STABILITY = PROCESSED / "siting_rank_stability.csv"
+OUT_REGIONS   = PROCESSED / "siting_weight_regions.csv"
+OUT_FLIPS     = PROCESSED / "siting_pair_flips.csv"
+
+TOP_N = 10
+BASELINE_WEIGHTS = {"cov_gap": 0.6, "ev_demand": 0.4}
+
+# factor -> (source column, sign): every factor is oriented so higher = better site
+FACTORS = {
+    "cov_gap":       ("ports_per_1000_evs", -1),   # lower coverage -> bigger gap
+    "ev_demand":     ("ev_count", 1),
+    "dcfc_gap":      ("dcfc_share", -1),           # little fast charging today
+    "dcfc_distance": ("km_to_nearest_dcfc", 1),    # far from fast charging
+}
+
+def _minmax(x):
+    lo, hi = x.min(axis=0), x.max(axis=0)
+    rng = np.where(hi - lo > 0, hi - lo, 1)
+    return np.where(hi - lo > 0, (x - lo) / rng, 0)
+
+def _zscore(x):
+    sd = x.std(axis=0)
+    return np.where(sd > 0, (x - x.mean(axis=0)) / np.where(sd > 0, sd, 1), 0)
+
+def _rank(x):
+    # percentile rank in [0, 1] (ties broken by row order)
+    order = x.argsort(axis=0).argsort(axis=0)
+    return order / max(len(x) - 1, 1)
+
+NORMALIZATIONS = {"minmax": _minmax, "zscore": _zscore, "rank": _rank}
+
+def factor_matrix(counties: pd.DataFrame, factors: list) -> np.ndarray:
+    cols = []
+    for f in factors:
+        src, sign = FACTORS[f]
+        if src not in counties.columns:
+            raise ValueError(f"factor {f!r} needs column {src!r}")
+        cols.append(sign * pd.to_numeric(counties[src], errors="coerce").fillna(0).to_numpy(dtype=float))
+    return np.column_stack(cols)
+
+def sample_weights(factors: list, samples: int, seed: int = 0) -> np.ndarray:
+    """Uniform draws from the weight simplex, with the baseline weights as row 0."""
+    rng = np.random.default_rng(seed)
+    base = np.array([BASELINE_WEIGHTS.get(f, 0.0) for f in factors])
+    return np.vstack([base, rng.dirichlet(np.ones(len(factors)), size=samples)])
+
+def ranks_of(scores: np.ndarray) -> np.ndarray:
+    """0-based rank of every county (rows) in every scenario (columns); 0 = best."""
+    order = np.argsort(-scores, axis=0, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(scores.shape[0])[:, None], axis=0)
+    return ranks
+
+def sweep(counties: pd.DataFrame, factors: list, weights: np.ndarray, normalizations: list) -> dict:
+    """
+    Score every county under every (normalization, weight vector).
+    Returns scores/ranks of shape (counties, scenarios) plus scenario metadata.
+    """
+    raw = factor_matrix(counties, factors)
+    blocks = [NORMALIZATIONS[n](raw) @ weights.T for n in normalizations]
+    scores = np.hstack(blocks)
+    return {
+        "scores": scores,
+        "ranks": ranks_of(scores),
+        "norm": np.repeat(normalizations, len(weights)),
+        "weights": np.tile(weights, (len(normalizations), 1)),
+    }
+
+def rank_stability(counties, result, top_n: int = TOP_N) -> pd.DataFrame:
+    ranks = result["ranks"] + 1
+    base = ranks[:, 0]   # scenario 0 = first normalization x baseline weights
+    q = np.percentile(ranks, [5, 50, 95], axis=1)
+    out = pd.DataFrame({
+        "county": counties["county"].to_numpy(),
+        "baseline_rank": base,
+        "baseline_score": result["scores"][:, 0].round(6),
+        f"top{top_n}_freq": (ranks <= top_n).mean(axis=1).round(4),
+        "top1_freq": (ranks == 1).mean(axis=1).round(4),
+        "rank_mean": ranks.mean(axis=1).round(2),
+        "rank_p05": q[0], "rank_median": q[1], "rank_p95": q[2],
+        "rank_min": ranks.min(axis=1), "rank_max": ranks.max(axis=1),
+    })
+    return out.sort_values(["baseline_rank"]).reset_index(drop=True)
+
+def weight_regions(counties, result, factors) -> pd.DataFrame:
+    """Group scenarios by which county ranks #1; report weight ranges of each group."""
+    top1 = counties["county"].to_numpy()[np.argmin(result["ranks"], axis=0)]
+    w = pd.DataFrame(result["weights"], columns=factors)
+    w["normalization"] = result["norm"]
+    w["top1_county"] = top1
+    agg = {f: ["min", "mean", "max"] for f in factors}
+    g = w.groupby(["normalization", "top1_county"]).agg(agg)
+    g.columns = [f"w_{f}_{stat}" for f, stat in g.columns]
+    g.insert(0, "scenario_share", w.groupby(["normalization", "top1_county"]).size() / len(w))
+    return g.reset_index().sort_values(["normalization", "scenario_share"], ascending=[True, False])
+
+def pair_flips(counties, result, factors, top_n: int = TOP_N) -> pd.DataFrame:
+    """For each adjacent pair in the baseline top-N, how often (and where) they swap."""
+    ranks = result["ranks"]
+    order = np.argsort(ranks[:, 0])[:top_n + 1]
+    names = counties["county"].to_numpy()
+    rows = []
+    for hi, lo in zip(order[:-1], order[1:]):
+        flipped = ranks[hi] > ranks[lo]
+        row = {"higher": names[hi], "lower": names[lo], "flip_share": round(flipped.mean(), 4)}
+        for i, f in enumerate(factors):
+            row[f"w_{f}_when_flipped"] = round(result["weights"][flipped, i].mean(), 4) if flipped.any() else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def county_dcfc_distance(stations, xwalk, index=None) -> pd.DataFrame:
+    """Mean km from each county's stations to the nearest DCFC (county via ZIP crosswalk)."""
+    if index is None:
+        index = StationIndex.from_stations(stations)
+    df = pd.DataFrame({"zip": stations["zip"].to_numpy(),
+                       "km_to_nearest_dcfc": index.distance_to_nearest_dcfc()})
+    df = attach_county_from_zip(df, xwalk)
+    return df.groupby("county", as_index=False)["km_to_nearest_dcfc"].mean()
+
+def build_scenarios(counties, factors=None, samples: int = 5000, normalizations=None,
+                    seed: int = 0, distance=None) -> dict:
+    factors = factors or list(BASELINE_WEIGHTS)
+    normalizations = normalizations or list(NORMALIZATIONS)
+    counties = counties.reset_index(drop=True)
+    if distance is not None:
+        counties = counties.merge(distance, on="county", how="left")
+        counties["km_to_nearest_dcfc"] = counties["km_to_nearest_dcfc"].fillna(counties["km_to_nearest_dcfc"].max())
+    result = sweep(counties, factors, sample_weights(factors, samples, seed), normalizations)
+    return {
+        "stability": rank_stability(counties, result),
+        "regions": weight_regions(counties, result, factors),
+        "flips": pair_flips(counties, result, factors),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Siting-score weight/normalization sweep")
+    ap.add_argument("--factors", nargs="+", default=list(BASELINE_WEIGHTS), choices=list(FACTORS))
+    ap.add_argument("--normalizations", nargs="+", default=list(NORMALIZATIONS), choices=list(NORMALIZATIONS))
+    ap.add_argument("--samples", type=int, default=5000, help="weight vectors per normalization")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--with-distance", action="store_true",
+                    help="add the dcfc_distance factor (needs stations + ZIP crosswalk; "
+                         "implied by --factors ... dcfc_distance)")
+    args = ap.parse_args()
+
+    counties = pd.read_csv(COUNTY_SUPPLY_CSV)
+    distance = None
+    factors = args.factors
+    if args.with_distance or "dcfc_distance" in factors:
+        stations = read_table("stations_ca", columns=["id", "zip", "latitude", "longitude",
+                                                      "ev_dc_fast_num", "ev_level2_evse_num"])
+        distance = county_dcfc_distance(stations, load_zip_xwalk())
+        factors = factors + [f for f in ["dcfc_distance"] if f not in factors]
+
+    out = build_scenarios(counties, factors, args.samples, args.normalizations, args.seed, distance)
+    PROCESSED.mkdir(parents=True, exist_ok=True)
+    out["stability"].to_csv(OUT_STABILITY, index=False)
+    out["regions"].to_csv(OUT_REGIONS, index=False)
+    out["flips"].to_csv(OUT_FLIPS, index=False)
+    scenarios = (args.samples + 1) * len(args.normalizations)
+    print(f"Scored {len(counties)} counties x {scenarios} scenarios ({', '.join(factors)})")
+    print(f"Saved: {OUT_STABILITY}")
+    print(f"Saved: {OUT_REGIONS}")
+    print(f"Saved: {OUT_FLIPS}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# src/transform/snapshots.py
+"""
+Versioned station snapshots stored as deltas.
+
+Every recorded pull becomes a version holding only what changed against the
+previous one: stations added (full rows), removed (full rows, so history can be
+rolled up without re-reading old versions) and, per column, the (old, new)
+values of stations whose value changed. Every CHECKPOINT_EVERY versions a full
+copy is written so reconstructing any point in time replays a bounded number
+of deltas.
+
+County KPIs are rolled up incrementally: a running per-station (zip, county,
+level2, dcfc) projection and the county totals are updated from each delta, so a
+new version costs O(changed stations), not a rebuild. County is ZIP-derived (the
+ZIP crosswalk, one county per ZIP, as in ev_county_supply_vs_demand.csv); the AFDC
+`county` field is blank for CA stations.
+
+    python src/transform/snapshots.py record                 # after make_kpis
+    python src/transform/snapshots.py list
+    python src/transform/snapshots.py show --as-of 2026-03-31 --out stations_q1.csv
+    python src/transform/snapshots.py rollup                 # -> ev_county_kpis_timeseries.csv
+    python src/transform/snapshots.py change --county Riverside --since 2026-07-01
+
+Layout (data/snapshots/):
+  manifest.json                 versions: taken_at, row/added/removed/changed counts, checkpoint flag
+  head.parquet                  latest full state (what the next pull is diffed against)
+  v00001/checkpoint.parquet     full copy (v1 and every CHECKPOINT_EVERY versions)
+  v0000N/added.parquet, removed.parquet, changes/<column>.parquet (id, dup, old, new)
+  rollup_state.parquet          per-station KPI projection at the last rolled-up version
+"""
+import json
+import shutil
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone
+import pandas as pd
+
+from processed_store import STATIONS_SCHEMA, conform, read_table
+from reference import ZIP_XWALK, load_zip_xwalk, attach_county_from_zip
+
+ROOT = Path(__file__).resolve().parents[2]
+SNAP_DIR = ROOT / "data" / "snapshots"
+MANIFEST = SNAP_DIR / "manifest.json"
+HEAD = SNAP_DIR / "head.parquet"
+ROLLUP_STATE = SNAP_DIR / "rollup_state.parquet"
+TIMESERIES_OUT = ROOT / "data" / "processed" / "ev_county_kpis_timeseries.csv"
+
+CHECKPOINT_EVERY = 20
+# (id, dup) identifies a row; dup is the occurrence number of a repeated id (0 for real AFDC data)
+KEY = ["id", "dup"]
+KPI_COLS = ["zip", "ev_level2_evse_num", "ev_dc_fast_num"]
+
+def load_manifest() -> dict:
+    if MANIFEST.exists():
+        return json.loads(MANIFEST.read_text())
+    return {"versions": [], "rolled_up_to": 0}
+
+def save_manifest(manifest: dict):
+    SNAP_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(MANIFEST)
+
+def version_dir(version: int) -> Path:
+    return SNAP_DIR / f"v{version:05d}"
+
+def keyed(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["dup"] = df.groupby("id").cumcount()
+    return df.set_index(KEY).sort_index()
+
+def _plain(s: pd.Series) -> pd.Series:
+    # categories -> plain strings so old/new values of one column share a dtype on disk
+    return s.astype("string") if isinstance(s.dtype, pd.CategoricalDtype) else s
+
+def _same(a: pd.Series, b: pd.Series):
+    a, b = _plain(a), _plain(b)
+    both_na = a.isna().to_numpy() & b.isna().to_numpy()
+    eq = (a == b).fillna(False).to_numpy(dtype=bool)
+    return eq | both_na
+
+def diff(prev: pd.DataFrame, cur: pd.DataFrame) -> dict:
+    """Keyed frames -> {"added": rows, "removed": rows, "changes": {column: (id, dup, old, new)}}."""
+    added = cur.loc[cur.index.difference(prev.index)]
+    removed = prev.loc[prev.index.difference(cur.index)]
+    common = prev.index.intersection(cur.index)
+    p, c = prev.loc[common], cur.loc[common]
+    changes = {}
+    for col in cur.columns:
+        mask = ~_same(p[col], c[col])
+        if mask.any():
+            changes[col] = pd.DataFrame({"old": _plain(p[col])[mask], "new": _plain(c[col])[mask]})
+    return {"added": added, "removed": removed, "changes": changes}
+
+def _write(df: pd.DataFrame, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.reset_index().to_parquet(path, index=False)
+
+def _read(path: Path) -> pd.DataFrame:
+    return pd.read_parquet(path).set_index(KEY)
+
+def record(stations: pd.DataFrame, taken_at: str = None, checkpoint_every: int = CHECKPOINT_EVERY):
+    """Store `stations` as the next version; returns its manifest entry (None if nothing changed)."""
+    manifest = load_manifest()
+    cur = keyed(conform(stations, STATIONS_SCHEMA))
+    taken_at = taken_at or datetime.now(timezone.utc).isoformat(timespec="seconds")
+    versions = manifest["versions"]
+    if versions and taken_at <= versions[-1]["taken_at"]:
+        raise ValueError(f"taken_at {taken_at} is not after the last version ({versions[-1]['taken_at']})")
+    version = len(versions) + 1
+    vdir = version_dir(version)
+
+    if not versions:
+        d = {"added": cur, "removed": cur.iloc[:0], "changes": {}}
+    else:
+        d = diff(_read(HEAD), cur)
+        if not len(d["added"]) and not len(d["removed"]) and not d["changes"]:
+            return None
+
+    checkpoint = version == 1 or (version - 1) % checkpoint_every == 0
+    if vdir.exists():
+        shutil.rmtree(vdir)   # leftover of an interrupted record
+    if checkpoint:
+        _write(cur, vdir / "checkpoint.parquet")
+    _write(d["added"], vdir / "added.parquet")
+    _write(d["removed"], vdir / "removed.parquet")
+    for col, ch in d["changes"].items():
+        _write(ch, vdir / "changes" / f"{col}.parquet")
+    _write(cur, HEAD)
+
+    entry = {
+        "version": version, "taken_at": taken_at, "rows": len(cur),
+        "added": len(d["added"]), "removed": len(d["removed"]),
+        "changed": {col: len(ch) for col, ch in d["changes"].items()},
+        "checkpoint": checkpoint,
+    }
+    versions.append(entry)
+    save_manifest(manifest)
+    return entry
+
+def load_delta(version: int) -> dict:
+    vdir = version_dir(version)
+    changes = {p.stem: _read(p) for p in sorted((vdir / "changes").glob("*.parquet"))}
+    return {"added": _read(vdir / "added.parquet"), "removed": _read(vdir / "removed.parquet"),
+            "changes": changes}
+
+def apply_delta(df: pd.DataFrame, delta: dict) -> pd.DataFrame:
+    df = df.drop(index=delta["removed"].index)
+    for col, ch in delta["changes"].items():
+        values = ch["new"]
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("string")
+        df.loc[ch.index, col] = values.astype(df[col].dtype)
+    return pd.concat([df, delta["added"]]).sort_index()
+
+def version_at(as_of: str, manifest: dict = None) -> int:
+    """Latest version taken at or before `as_of` (ISO date/time)."""
+    manifest = manifest or load_manifest()
+    hits = [v["version"] for v in manifest["versions"] if v["taken_at"][:len(as_of)] <= as_of]
+    if not hits:
+        raise ValueError(f"no snapshot at or before {as_of}")
+    return hits[-1]
+
+def reconstruct(version: int, manifest: dict = None) -> pd.DataFrame:
+    """Full station table as of `version`: nearest checkpoint + the deltas after it."""
+    manifest = manifest or load_manifest()
+    entries = {v["version"]: v for v in manifest["versions"]}
+    if version not in entries:
+        raise ValueError(f"unknown version {version}")
+    base = max(v for v, e in entries.items() if e["checkpoint"] and v <= version)
+    df = _read(version_dir(base) / "checkpoint.parquet")
+    for v in range(base + 1, version + 1):
+        df = apply_delta(df, load_delta(v))
+    return conform(df.reset_index(), STATIONS_SCHEMA).reset_index(drop=True)
+
+# ---------------- incremental county KPI rollup ----------------
+
+def _zip_county(zips: pd.Series, xw: pd.DataFrame) -> pd.Series:
+    """ZIP -> county name; "" = no county (kept as its own group)."""
+    frame = pd.DataFrame({"zip": zips.astype("string").to_numpy()})
+    county = attach_county_from_zip(frame, xw.drop_duplicates("zip"))["county"]
+    return pd.Series(county.to_numpy(), index=zips.index).astype("string").fillna("")
+
+def _kpi_frame(df: pd.DataFrame, xw: pd.DataFrame) -> pd.DataFrame:
+    out = df[KPI_COLS].copy()
+    out["zip"] = out["zip"].astype("string")
+    out["county"] = _zip_county(out["zip"], xw)
+    return out.astype({"ev_level2_evse_num": "int64", "ev_dc_fast_num": "int64"})
+
+def _county_totals(kpi: pd.DataFrame) -> pd.DataFrame:
+    return kpi.groupby("county").agg(level2_ports=("ev_level2_evse_num", "sum"),
+                                     dcfc_ports=("ev_dc_fast_num", "sum"))
+
+def _summary(totals: pd.DataFrame, entry: dict) -> pd.DataFrame:
+    out = totals.reset_index()
+    out["ports_total"] = out["level2_ports"] + out["dcfc_ports"]
+    out["dcfc_share"] = (out["dcfc_ports"] / out["ports_total"]).fillna(0).round(4)
+    out.insert(0, "taken_at", entry["taken_at"])
+    out.insert(0, "version", entry["version"])
+    out["county"] = out["county"].replace("", pd.NA)
+    return out.sort_values("ports_total", ascending=False)
+
+def rollup(out_csv: Path = TIMESERIES_OUT, xw: pd.DataFrame = None) -> int:
+    """Append county KPIs for every version not rolled up yet; returns how many were added."""
+    xw = load_zip_xwalk(ZIP_XWALK) if xw is None else xw
+    manifest = load_manifest()
+    done = manifest.get("rolled_up_to", 0)
+    todo = [e for e in manifest["versions"] if e["version"] > done]
+    if not todo:
+        return 0
+    if done and ROLLUP_STATE.exists() and Path(out_csv).exists():
+        state = _read(ROLLUP_STATE)
+        if "zip" not in state.columns:   # state from before the ZIP-derived county: rebuild
+            done, todo, state = 0, manifest["versions"], None
+            Path(out_csv).unlink(missing_ok=True)
+    else:
+        done, todo, state = 0, manifest["versions"], None
+        Path(out_csv).unlink(missing_ok=True)
+
+    totals = None if state is None else _county_totals(state)
+    frames = []
+    for entry in todo:
+        delta = load_delta(entry["version"])
+        if state is None:
+            state = _kpi_frame(delta["added"], xw)
+            totals = _county_totals(state)
+        else:
+            # stations whose KPI inputs change leave with their old values and re-enter with the new
+            touched = delta["removed"].index
+            for col in KPI_COLS:
+                if col in delta["changes"]:
+                    touched = touched.union(delta["changes"][col].index)
+            old = state.loc[touched]
+            state = state.drop(index=delta["removed"].index)
+            for col in KPI_COLS:
+                if col in delta["changes"]:
+                    new = delta["changes"][col]["new"]
+                    if col == "zip":
+                        state.loc[new.index, "zip"] = new.astype("string")
+                        state.loc[new.index, "county"] = _zip_county(new, xw)
+                    else:
+                        state.loc[new.index, col] = new.astype("int64")
+            added = _kpi_frame(delta["added"], xw)
+            new_rows = pd.concat([state.loc[touched.difference(delta["removed"].index)], added])
+            state = pd.concat([state, added])
+            totals = totals.sub(_county_totals(old), fill_value=0).add(_county_totals(new_rows), fill_value=0)
+            totals = totals.astype("int64")
+        frames.append(_summary(totals, entry))
+
+    out = pd.concat(frames, ignore_index=True)
+    out.to_csv(out_csv, mode="a", header=not Path(out_csv).exists(), index=False)
+    _write(state, ROLLUP_STATE)
+    manifest["rolled_up_to"] = todo[-1]["version"]
+    save_manifest(manifest)
+    return len(todo)
+
+def kpi_change(ts: pd.DataFrame, county: str, since: str, until: str = None) -> pd.Series:
+    """KPI difference for `county` between the last versions at/before `since` and `until`."""
+    rows = ts[ts["county"].str.lower() == county.lower()]
+    def at(when):
+        hit = rows[rows["taken_at"].str[:len(when)] <= when] if when else rows
+        return hit.iloc[-1] if len(hit) else None
+    start, end = at(since), at(until)
+    if end is None:
+        raise ValueError(f"no KPIs for {county} up to {until}")
+    cols = ["level2_ports", "dcfc_ports", "ports_total"]
+    base = start[cols] if start is not None else pd.Series(0, index=cols)
+    return (end[cols] - base).rename(f"{county}: {start['taken_at'] if start is not None else 'start'} -> {end['taken_at']}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Delta-encoded station snapshots + KPI time series")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="store the current stations_ca table as a new version")
+    rec.add_argument("--taken-at", help="ISO timestamp (default: now, UTC)")
+    sub.add_parser("list")
+    show = sub.add_parser("show", help="reconstruct the station table at a version / date")
+    show.add_argument("--version", type=int)
+    show.add_argument("--as-of")
+    show.add_argument("--out", type=Path, required=True)
+    sub.add_parser("rollup", help=f"append new versions to {TIMESERIES_OUT.name}")
+    ch = sub.add_parser("change", help="KPI change for a county between two dates")
+    ch.add_argument("--county", required=True)
+    ch.add_argument("--since", required=True)
+    ch.add_argument("--until")
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        entry = record(read_table("stations_ca"), args.taken_at)
+        if entry is None:
+            print("No changes since the last snapshot; nothing recorded")
+        else:
+            print(f"Recorded v{entry['version']} ({entry['taken_at']}): rows={entry['rows']} "
+                  f"added={entry['added']} removed={entry['removed']} changed={entry['changed']}"
+                  + (" [checkpoint]" if entry["checkpoint"] else ""))
+    elif args.cmd == "list":
+        for e in load_manifest()["versions"]:
+            print(f"v{e['version']:>4}  {e['taken_at']}  rows={e['rows']:>7}  +{e['added']} -{e['removed']} "
+                  f"~{sum(e['changed'].values())}" + ("  [checkpoint]" if e["checkpoint"] else ""))
+    elif args.cmd == "show":
+        if (args.version is None) == (args.as_of is None):
+            raise SystemExit("ERROR: pass exactly one of --version / --as-of")
+        version = args.version or version_at(args.as_of)
+        df = reconstruct(version)
+        df.to_csv(args.out, index=False)
+        print(f"Saved: {args.out} (v{version}, rows={len(df)})")
+    elif args.cmd == "rollup":
+        n = rollup()
+        print(f"Rolled up {n} new version(s) -> {TIMESERIES_OUT}")
+    elif args.cmd == "change":
+        rollup()
+        ts = pd.read_csv(TIMESERIES_OUT, dtype={"county": "string", "taken_at": "string"})
+        print(kpi_change(ts, args.county, args.since, args.until).to_string())
+
+if __name__ == "__main__":
+    main()
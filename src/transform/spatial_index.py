@@ -0,0 +1,118 @@
+# src/transform/spatial_index.py
+"""
+Spatial index over station coordinates.
+
+Stations are projected onto the unit sphere (x, y, z) and indexed with a KD-tree;
+straight-line (chord) distance there is monotonic in great-circle distance, so
+radius and k-nearest queries are exact haversine queries. Everything is batched:
+one call answers all query points.
+
+    python src/transform/spatial_index.py    # build from stations_ca and persist
+"""
+import pickle
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from processed_store import read_table
+
+ROOT = Path(__file__).resolve().parents[2]
+PROCESSED = ROOT / "data" / "processed"
+INDEX_OUT = PROCESSED / "stations_spatial_index.pkl"
+
+EARTH_RADIUS_KM = 6371.0088
+
+def to_xyz(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+def km_to_chord(km):
+    return 2 * np.sin(np.asarray(km, dtype=float) / (2 * EARTH_RADIUS_KM))
+
+def chord_to_km(chord):
+    """Inverse of km_to_chord; inf (no neighbour found) stays inf."""
+    chord = np.asarray(chord, dtype=float)
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.where(np.isinf(chord), 0, chord) / 2, 0, 1))
+    return np.where(np.isinf(chord), np.inf, km)
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class StationIndex:
+    def __init__(self, ids, lat, lon, dcfc_ports, level2_ports):
+        self.ids = np.asarray(ids)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.dcfc_ports = np.asarray(dcfc_ports, dtype=np.int32)
+        self.level2_ports = np.asarray(level2_ports, dtype=np.int32)
+        self.tree = cKDTree(to_xyz(self.lat, self.lon))
+        # positions (into ids/lat/lon) of DCFC sites + their own tree
+        self.dcfc_pos = np.flatnonzero(self.dcfc_ports > 0)
+        self.dcfc_tree = cKDTree(self.tree.data[self.dcfc_pos]) if len(self.dcfc_pos) else None
+
+    @classmethod
+    def from_stations(cls, df: pd.DataFrame) -> "StationIndex":
+        return cls(df["id"].to_numpy(), df["latitude"].to_numpy(), df["longitude"].to_numpy(),
+                   df["ev_dc_fast_num"].to_numpy(), df["ev_level2_evse_num"].to_numpy())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def within_radius(self, lat, lon, radius_km: float) -> list:
+        """For each query point, the positions of stations within `radius_km`."""
+        hits = self.tree.query_ball_point(to_xyz(lat, lon), km_to_chord(radius_km))
+        return [np.asarray(h, dtype=np.int64) for h in hits]
+
+    def count_within_radius(self, lat, lon, radius_km: float) -> np.ndarray:
+        return self.tree.query_ball_point(to_xyz(lat, lon), km_to_chord(radius_km), return_length=True)
+
+    def nearest_dcfc(self, lat, lon, k: int = 1):
+        """
+        (distance_km, station ids) of the `k` nearest DCFC sites to each query point,
+        shape (n, k). Missing neighbours (fewer than k DCFC sites) are inf / None.
+        """
+        n = len(np.atleast_1d(lat))
+        if self.dcfc_tree is None:
+            return np.full((n, k), np.inf), np.full((n, k), None, dtype=object)
+        chord, pos = self.dcfc_tree.query(to_xyz(lat, lon), k=k)
+        chord, pos = chord.reshape(n, k), pos.reshape(n, k)
+        valid = pos < len(self.dcfc_pos)
+        ids = np.full((n, k), None, dtype=object)
+        ids[valid] = self.ids[self.dcfc_pos[pos[valid]]]
+        return chord_to_km(chord), ids
+
+    def distance_to_nearest_dcfc(self, exclude_self: bool = False) -> np.ndarray:
+        """km from every indexed station to the nearest DCFC site (0 for DCFC sites unless exclude_self)."""
+        if self.dcfc_tree is None:
+            return np.full(len(self), np.inf)
+        if not exclude_self:
+            chord, _ = self.dcfc_tree.query(self.tree.data, k=1)
+            return chord_to_km(chord)
+        # a DCFC site's own point is its first neighbour; take the second
+        chord, _ = self.dcfc_tree.query(self.tree.data, k=2)
+        return chord_to_km(np.where(self.dcfc_ports > 0, chord[:, 1], chord[:, 0]))
+
+    def save(self, path=INDEX_OUT):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path=INDEX_OUT) -> "StationIndex":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+def main():
+    stations = read_table("stations_ca", columns=["id", "latitude", "longitude",
+                                                  "ev_dc_fast_num", "ev_level2_evse_num"])
+    index = StationIndex.from_stations(stations)
+    index.save(INDEX_OUT)
+    print(f"Saved spatial index: {INDEX_OUT} (stations={len(index)}, dcfc sites={len(index.dcfc_pos)})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# src/transform/sql_engine.py
+"""
+Embedded SQL over the processed station table (stdlib sqlite3, no server).
+
+stations_ca.parquet is bulk-loaded into a SQLite table `stations_ca` (indexed on
+county, zip and ev_network) and the .sql files in sql/ are run against it.
+A statement preceded by an output annotation names the table it computes:
+
+    -- output: data/processed/ev_summary_by_county.csv
+    SELECT ...;
+
+The CLI writes annotated results under data/processed/sql/ (same relative path),
+next to the pandas outputs rather than over them; --replace writes the annotated
+paths themselves, as `pipeline.py --sql` does. --check only compares, it writes
+nothing. Statements without an annotation are just executed.
+availability_share(access_days_time) (availability.weekly_share_of) is registered
+as a SQL function for effective 24/7 capacity.
+The database is cached in data/processed/stations_ca.sqlite and rebuilt when the
+parquet table is newer, so ad-hoc queries don't reload anything:
+
+    python src/transform/sql_engine.py                       # run every sql/*.sql -> data/processed/sql/
+    python src/transform/sql_engine.py sql/kpis.sql --check  # parity vs make_county_summary, no writes
+    python src/transform/sql_engine.py -q "SELECT ev_network, COUNT(*) n FROM stations_ca GROUP BY 1 ORDER BY n DESC"
+"""
+import re
+import sqlite3
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from processed_store import STATIONS_SCHEMA, parquet_path, read_table
+from availability import weekly_share_of
+
+ROOT = Path(__file__).resolve().parents[2]
+SQL_DIR = ROOT / "sql"
+PROCESSED = ROOT / "data" / "processed"
+DB_PATH = PROCESSED / "stations_ca.sqlite"
+OUT_DIR = PROCESSED / "sql"     # CLI results; the annotated paths belong to the pandas stages
+
+TABLE = "stations_ca"
+INDEXED_COLS = ["county", "zip", "ev_network"]
+OUTPUT_RE = re.compile(r"^\s*--\s*output:\s*(\S+)\s*$", re.IGNORECASE)
+
+def _sql_type(t: pa.DataType) -> str:
+    if pa.types.is_integer(t):
+        return "INTEGER"
+    if pa.types.is_floating(t):
+        return "REAL"
+    return "TEXT"
+
+def connect(path=":memory:") -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    # bulk-load settings: the db is a rebuildable cache, not a system of record
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.create_function("availability_share", 1, weekly_share_of, deterministic=True)
+    return conn
+
+def load_stations(conn: sqlite3.Connection, df: pd.DataFrame, table: str = TABLE):
+    """(Re)create `table` from a processed stations frame and index it."""
+    cols = [f.name for f in STATIONS_SCHEMA]
+    ddl = ", ".join(f'"{f.name}" {_sql_type(f.type)}' for f in STATIONS_SCHEMA)
+    # one object array per column, NA -> None, then rows straight to executemany
+    arrays = []
+    for c in cols:
+        s = df[c]
+        if pd.api.types.is_integer_dtype(s) and not s.hasnans:
+            arrays.append(s.to_numpy().astype(object))
+        else:
+            arrays.append(s.astype(object).where(s.notna(), None).to_numpy())
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} ({ddl})")
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(cols))})",
+                         zip(*[a.tolist() for a in arrays]))
+        for c in INDEXED_COLS:
+            conn.execute(f"CREATE INDEX idx_{table}_{c} ON {table} ({c})")
+    conn.execute("ANALYZE")
+
+def open_db(path=DB_PATH, stations: pd.DataFrame = None) -> sqlite3.Connection:
+    """Cached on-disk db; rebuilt when missing or older than stations_ca.parquet."""
+    path = Path(path)
+    src = parquet_path(TABLE)
+    stale = not path.exists() or (src.exists() and src.stat().st_mtime > path.stat().st_mtime)
+    conn = connect(path)
+    if stale or stations is not None:
+        load_stations(conn, stations if stations is not None else read_table(TABLE))
+    return conn
+
+def parse_sql(text: str) -> list:
+    """Split a .sql script into [(output or None, statement)]."""
+    out, buf, target = [], [], None
+    for line in text.splitlines():
+        m = OUTPUT_RE.match(line)
+        if m and not buf:
+            target = m.group(1)
+            continue
+        if not buf and (not line.strip() or line.lstrip().startswith("--")):
+            continue   # blank lines / comments between statements
+        buf.append(line)
+        stmt = "\n".join(buf)
+        if sqlite3.complete_statement(stmt):
+            out.append((target, stmt.strip()))
+            buf, target = [], None
+    if "\n".join(buf).strip():
+        out.append((target, "\n".join(buf).strip()))
+    return out
+
+def sql_outputs(path) -> list:
+    """Output paths annotated in a .sql file, in order."""
+    return [t for t, _ in parse_sql(Path(path).read_text(encoding="utf-8")) if t]
+
+def query(conn: sqlite3.Connection, sql: str) -> pd.DataFrame:
+    cur = conn.execute(sql)
+    if cur.description is None:
+        return None
+    return pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description])
+
+def run_sql_file(conn: sqlite3.Connection, path) -> dict:
+    """Run every statement; returns {output path: result} for the annotated ones."""
+    results = {}
+    for target, stmt in parse_sql(Path(path).read_text(encoding="utf-8")):
+        df = query(conn, stmt)
+        if target:
+            if df is None:
+                raise ValueError(f"{path}: statement for {target} returns no rows")
+            results[target] = df
+    return results
+
+def check_parity(sql_summary: pd.DataFrame, pandas_summary: pd.DataFrame) -> pd.DataFrame:
+    """Rows where the SQL and pandas county summaries disagree (empty frame = parity)."""
+    key = "county"
+    a = sql_summary.assign(**{key: sql_summary[key].astype("object").fillna("<NA>")})
+    b = pandas_summary.assign(**{key: pandas_summary[key].astype("object").fillna("<NA>")})
+    m = a.merge(b, on=key, how="outer", suffixes=("_sql", "_pandas"), indicator=True)
+    bad = m["_merge"] != "both"
+    for c in ["level2_ports", "dcfc_ports", "ports_total"]:
+        bad |= m[f"{c}_sql"].to_numpy() != m[f"{c}_pandas"].to_numpy()
+    bad |= ~np.isclose(m["dcfc_share_sql"].astype(float).round(4),
+                       m["dcfc_share_pandas"].astype(float).round(4), atol=1e-9)
+    if "effective_ports_sql" in m.columns:
+        bad |= ~np.isclose(m["effective_ports_sql"].astype(float), m["effective_ports_pandas"].astype(float), atol=0.051)
+    return m.loc[bad]
+
+def output_path(target: str, replace: bool = False) -> Path:
+    """Where the CLI writes an annotated result: OUT_DIR/<path under data/processed>, or the target itself."""
+    path = ROOT / target
+    if replace:
+        return path
+    try:
+        return OUT_DIR / path.relative_to(PROCESSED)
+    except ValueError:
+        return OUT_DIR / Path(target).name
+
+def _write(df: pd.DataFrame, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+def main():
+    ap = argparse.ArgumentParser(description="Run sql/*.sql against the processed stations in SQLite")
+    ap.add_argument("files", nargs="*", type=Path, help="default: every sql/*.sql")
+    ap.add_argument("-q", "--query", help="run one ad-hoc query and print the result")
+    ap.add_argument("--db", type=Path, default=DB_PATH)
+    ap.add_argument("--rebuild", action="store_true", help="reload stations even if the db is fresh")
+    ap.add_argument("--check", action="store_true",
+                    help="compare the SQL county summary with make_kpis.make_county_summary (writes nothing)")
+    ap.add_argument("--replace", action="store_true",
+                    help="write results to the annotated paths (overwrites the pandas outputs) "
+                         f"instead of {OUT_DIR.relative_to(ROOT)}")
+    args = ap.parse_args()
+
+    stations = read_table(TABLE) if (args.rebuild or args.check) else None
+    conn = open_db(args.db, stations)
+
+    if args.query:
+        with pd.option_context("display.max_rows", 200, "display.width", 200):
+            print(query(conn, args.query))
+        return
+
+    files = args.files or sorted(SQL_DIR.glob("*.sql"))
+    results = {}
+    for f in files:
+        results.update(run_sql_file(conn, f))
+    if not args.check:
+        for target, df in results.items():
+            print(f"Saved: {_write(df, output_path(target, args.replace))} (rows={len(df)})")
+
+    if args.check:
+        from make_kpis import COUNTY_SUMMARY_OUT, make_county_summary
+        sql_summary = results.get(str(COUNTY_SUMMARY_OUT).replace("\\", "/"))
+        if sql_summary is None:
+            raise SystemExit(f"ERROR: no SQL statement writes {COUNTY_SUMMARY_OUT}")
+        diff = check_parity(sql_summary, make_county_summary(stations))
+        if len(diff):
+            print(diff.to_string())
+            raise SystemExit(f"ERROR: SQL and pandas county summaries differ in {len(diff)} rows")
+        print(f"Parity OK: {len(sql_summary)} counties match make_county_summary")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# src/transform/station_table.py
+"""
+Compact in-memory station table for analytics.
+
+The cleaned stations frame carries free-text columns and `ev_connector_types` as a
+comma-separated string ("CHADEMO,J1772,J1772COMBO"), so every connector filter
+re-parses strings row by row. compact() keeps only the analytic columns, with
+
+  - network / city / county / region / state / zip / facility_type as categoricals
+  - int32 id and port counts, float32 coordinates
+  - connector types parsed once per distinct string into a uint16 bitmask
+
+and connector predicates become integer mask operations:
+
+    t = compact(read_table("stations_ca"))
+    t[has_all(t, "CCS", "CHADEMO")]          # both
+    t[only(t, "NACS")]                       # Tesla / J3400 only
+    connector_kpis(t)                        # stations + ports per connector type
+
+    python src/transform/station_table.py                       # memory before/after
+    python src/transform/station_table.py --has CCS CHADEMO
+    python src/transform/station_table.py --only NACS
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+from processed_store import read_table
+
+STATIONS_IN = "stations_ca"
+
+# AFDC ev_connector_types codes -> bit; anything unrecognized sets OTHER
+CONNECTOR_BITS = {
+    "J1772": 1 << 0,
+    "J1772COMBO": 1 << 1,     # CCS1
+    "CHADEMO": 1 << 2,
+    "TESLA": 1 << 3,          # NACS (legacy AFDC code)
+    "J3400": 1 << 4,          # NACS (SAE J3400)
+    "NEMA515": 1 << 5,
+    "NEMA520": 1 << 6,
+    "NEMA1450": 1 << 7,
+    "OTHER": 1 << 15,
+}
+# other spellings seen in feeds, parsed to the AFDC code
+CODE_SPELLINGS = {"NACS": "J3400", "CCS": "J1772COMBO", "CCS1": "J1772COMBO"}
+ALIASES = {
+    "CCS": ("J1772COMBO",),
+    "NACS": ("TESLA", "J3400"),
+    "NEMA": ("NEMA515", "NEMA520", "NEMA1450"),
+}
+MASK_DTYPE = np.uint16
+
+CATEGORY_COLS = ["ev_network", "city", "county", "region", "state", "zip", "facility_type"]
+COMPACT_COLS = ["id"] + CATEGORY_COLS + ["latitude", "longitude", "ev_level2_evse_num",
+                                         "ev_dc_fast_num", "connector_mask"]
+
+def parse_connectors(value: str) -> int:
+    mask = 0
+    for code in str(value).split(","):
+        code = code.strip().upper()
+        code = CODE_SPELLINGS.get(code, code)
+        if code:
+            mask |= CONNECTOR_BITS.get(code, CONNECTOR_BITS["OTHER"])
+    return mask
+
+def encode_connectors(connectors: pd.Series) -> np.ndarray:
+    """Connector strings -> bitmask array; each distinct string is parsed once."""
+    codes, uniques = pd.factorize(connectors.fillna(""), sort=False)
+    lut = np.fromiter((parse_connectors(u) for u in uniques), dtype=MASK_DTYPE, count=len(uniques))
+    return lut[codes] if len(codes) else np.zeros(0, dtype=MASK_DTYPE)
+
+def decode_connectors(mask: int) -> list:
+    return [name for name, bit in CONNECTOR_BITS.items() if mask & bit]
+
+def mask_of(*names) -> int:
+    """Bits for connector codes and/or aliases ("CCS", "NACS", "NEMA")."""
+    mask = 0
+    for name in names:
+        key = name.strip().upper()
+        codes = ALIASES.get(key, (key,))
+        for code in codes:
+            if code not in CONNECTOR_BITS:
+                raise ValueError(f"unknown connector type: {name!r} (known: "
+                                 f"{', '.join(list(CONNECTOR_BITS) + list(ALIASES))})")
+            mask |= CONNECTOR_BITS[code]
+    return mask
+
+def _mask(table) -> np.ndarray:
+    return table["connector_mask"].to_numpy() if isinstance(table, pd.DataFrame) else np.asarray(table)
+
+# Predicates take the compact table (or a mask array) and return a boolean array.
+# An alias counts as one type: has_all(t, "NACS", "CCS") = (TESLA or J3400) and CCS.
+
+def has_any(table, *names) -> np.ndarray:
+    return (_mask(table) & mask_of(*names)) != 0
+
+def has_all(table, *names) -> np.ndarray:
+    m = _mask(table)
+    out = np.ones(len(m), dtype=bool)
+    for name in names:
+        out &= (m & mask_of(name)) != 0
+    return out
+
+def only(table, *names) -> np.ndarray:
+    """Has at least one of `names` and nothing else."""
+    m = _mask(table)
+    return (m != 0) & ((m & ~MASK_DTYPE(mask_of(*names))) == 0)
+
+def compact(stations: pd.DataFrame) -> pd.DataFrame:
+    """Cleaned stations -> compact table (COMPACT_COLS)."""
+    ids = pd.to_numeric(stations["id"], errors="coerce").fillna(0)
+    if len(ids) and ids.abs().max() > np.iinfo(np.int32).max:
+        raise ValueError("station id does not fit in int32")
+    out = pd.DataFrame({"id": ids.to_numpy(dtype=np.int32)}, index=stations.index)
+    for c in CATEGORY_COLS:
+        out[c] = stations[c].astype("category") if c in stations.columns else pd.Categorical([None] * len(stations))
+    for c in ["latitude", "longitude"]:
+        out[c] = pd.to_numeric(stations[c], errors="coerce").astype(np.float32)
+    for c in ["ev_level2_evse_num", "ev_dc_fast_num"]:
+        out[c] = pd.to_numeric(stations[c], errors="coerce").fillna(0).astype(np.int32)
+    out["connector_mask"] = encode_connectors(stations["ev_connector_types"])
+    return out.reset_index(drop=True)
+
+def connector_kpis(table: pd.DataFrame) -> pd.DataFrame:
+    """Stations and ports offering each connector type (a station counts once per type)."""
+    m = _mask(table)
+    l2 = table["ev_level2_evse_num"].to_numpy(dtype=np.int64)
+    dc = table["ev_dc_fast_num"].to_numpy(dtype=np.int64)
+    rows = []
+    for name, bit in CONNECTOR_BITS.items():
+        sel = (m & bit) != 0
+        if sel.any():
+            rows.append({"connector": name, "stations": int(sel.sum()),
+                         "level2_ports": int(l2[sel].sum()), "dcfc_ports": int(dc[sel].sum())})
+    out = pd.DataFrame(rows, columns=["connector", "stations", "level2_ports", "dcfc_ports"])
+    out["ports_total"] = out["level2_ports"] + out["dcfc_ports"]
+    out["dcfc_share"] = (out["dcfc_ports"] / out["ports_total"]).fillna(0).round(4)
+    return out.sort_values("stations", ascending=False)
+
+def bytes_per_row(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+def main():
+    ap = argparse.ArgumentParser(description="Compact station table with connector bitmasks")
+    ap.add_argument("--has", nargs="+", metavar="TYPE", help="stations offering all of these connector types")
+    ap.add_argument("--any", nargs="+", metavar="TYPE", help="stations offering any of these")
+    ap.add_argument("--only", nargs="+", metavar="TYPE", help="stations offering only these")
+    args = ap.parse_args()
+
+    stations = read_table(STATIONS_IN)
+    table = compact(stations)
+    try:
+        sel = np.ones(len(table), dtype=bool)
+        if args.has:
+            sel &= has_all(table, *args.has)
+        if args.any:
+            sel &= has_any(table, *args.any)
+        if args.only:
+            sel &= only(table, *args.only)
+    except ValueError as e:
+        raise SystemExit(f"ERROR: {e}")
+
+    print(f"stations: {len(table)}  "
+          f"memory/row: {bytes_per_row(stations):.0f} B (stations_ca) -> {bytes_per_row(table):.0f} B (compact)")
+    if args.has or args.any or args.only:
+        hit = table[sel]
+        print(f"matching: {len(hit)} stations, {int(hit['ev_level2_evse_num'].sum())} Level 2 ports, "
+              f"{int(hit['ev_dc_fast_num'].sum())} DCFC ports")
+    else:
+        print(connector_kpis(table).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
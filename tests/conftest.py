@@ -0,0 +1,31 @@
+# tests/conftest.py
+# The scripts import their siblings by bare name, as when run from src/transform.
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+for p in [ROOT / "src" / "transform", ROOT / "src" / "extract", ROOT / "src", ROOT / "bench"]:
+    sys.path.insert(0, str(p))
+
+import numpy as np
+import pytest
+
+import synth_stations as synth
+import make_kpis
+
+@pytest.fixture
+def raw_stations():
+    """Synthetic raw AFDC frame (load_raw layout) with the untidy values the cleaning rules handle."""
+    n = 3_000
+    raw = synth.to_raw_frame(synth.make_stations(n, seed=0))
+    rng = np.random.default_rng(0)
+    pick = lambda share: rng.random(n) < share
+    raw.loc[pick(0.05), "county"] = "  santa clara COUNTY "
+    raw.loc[pick(0.03), "county"] = "   "
+    raw.loc[pick(0.05), "city"] = " san jose "
+    raw.loc[pick(0.03), "city"] = ""
+    raw.loc[pick(0.02), "latitude"] = "n/a"
+    raw.loc[pick(0.02), "longitude"] = np.nan
+    raw.loc[pick(0.02), "ev_level2_evse_num"] = "?"
+    raw.loc[pick(0.03), "ev_connector_types"] = np.nan
+    return make_kpis._keep_cols(raw)
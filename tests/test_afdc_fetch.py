@@ -0,0 +1,95 @@
+# tests/test_afdc_fetch.py
+# The concurrent AFDC fetch against a local stub server (no network, no API key):
+# retries, pagination with a repeated record, and the token bucket's hourly budget.
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+import afdc_fetch
+
+TOTAL = 450
+
+class StubAFDC(BaseHTTPRequestHandler):
+    """Pages of {"id": n}; pages from offset 200 on start one record early (the listing
+    shifted mid-pull), and each offset in `fail` answers its statuses first."""
+    fail = {}
+    hits = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        offset = int(parse_qs(urlparse(self.path).query)["offset"][0])
+        with self.lock:
+            self.hits.append(offset)
+            pending = self.fail.get(offset, [])
+            status = pending.pop(0) if pending else 200
+        if status != 200:
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            return
+        start = offset - 1 if offset >= 200 else offset
+        ids = range(start + 1, min(start + afdc_fetch.PAGE_SIZE, TOTAL) + 1)
+        body = json.dumps({"total_results": TOTAL, "fuel_stations": [{"id": i} for i in ids]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    monkeypatch.setattr(afdc_fetch, "BACKOFF_BASE", 0.01)
+    StubAFDC.fail, StubAFDC.hits = {}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAFDC)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/stations.json"
+    server.shutdown()
+    server.server_close()
+
+def test_concurrent_fetch_retries_and_dedupes(stub, capsys):
+    StubAFDC.fail = {200: [429], 400: [503, 502]}
+    stations = afdc_fetch.fetch_all_stations_concurrent("key", endpoint=stub, max_workers=3,
+                                                        bucket=afdc_fetch.TokenBucket(100, capacity=10))
+    assert [s["id"] for s in stations] == list(range(1, TOTAL + 1))
+    assert sorted(StubAFDC.hits) == [0, 200, 200, 400, 400, 400]
+    out = capsys.readouterr().out
+    assert "Retrying offset=200 in 1.0s" in out          # Retry-After honoured
+    assert "Retrying offset=400" in out and "attempt 2/" in out
+    assert "1 duplicate station ids" in out
+    assert "total_results" not in out                     # count matches once deduped
+
+def test_fetch_page_gives_up_after_max_retries(stub):
+    StubAFDC.fail = {0: [500] * 3}
+    bucket = afdc_fetch.TokenBucket(100, capacity=10)
+    with pytest.raises(requests.HTTPError):
+        afdc_fetch.fetch_page(requests.Session(), {}, 0, bucket, endpoint=stub, max_retries=2)
+    assert StubAFDC.hits == [0, 0, 0]
+
+def test_token_bucket_stays_within_hourly_limit(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    def sleep(seconds):
+        clock.now += seconds
+    monkeypatch.setattr(afdc_fetch, "time", SimpleNamespace(monotonic=lambda: clock.now, sleep=sleep))
+
+    bucket = afdc_fetch.TokenBucket(afdc_fetch.DEFAULT_RATE_PER_SEC, capacity=afdc_fetch.RATE_BURST)
+    stamps = []
+    while clock.now < 3 * 3600:
+        bucket.acquire()
+        stamps.append(clock.now)
+    assert stamps[afdc_fetch.RATE_BURST - 1] == 0.0       # the burst goes out at once
+    # every 60-minute window, starting at any request, holds at most HOURLY_LIMIT requests
+    j = 0
+    for i, t in enumerate(stamps):
+        while j < len(stamps) and stamps[j] < t + 3600:
+            j += 1
+        assert j - i <= afdc_fetch.HOURLY_LIMIT
@@ -0,0 +1,55 @@
+# tests/test_afdc_refresh.py
+# Incremental refresh: stations deleted outright from AFDC leave the store once the
+# id list is reconciled. AFDC calls are replaced by in-memory fakes; files go to tmp_path.
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import afdc_refresh
+
+NOW = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+@pytest.fixture
+def afdc(tmp_path, monkeypatch):
+    """Live AFDC state the fakes serve; the store starts with stations 1, 2, 3."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "raw").mkdir(parents=True)
+    live = {"open": {1: "E", 3: "E"}, "updated": [{"id": 1, "status_code": "E", "station_name": "new"}],
+            "pulls": []}
+
+    def fetch_all(api_key, extra_params=None, **kw):
+        live["pulls"].append(extra_params)
+        if extra_params and "fields" in extra_params:
+            return [{"id": i} for i in live["open"]]
+        return live["updated"]
+    monkeypatch.setattr(afdc_refresh, "fetch_all_stations_concurrent", fetch_all)
+    monkeypatch.setattr(afdc_refresh, "live_count", lambda *a, **kw: len(live["open"]))
+    monkeypatch.setattr(afdc_refresh, "fetch_last_updated", lambda *a, **kw: {"last_updated": "t2"})
+    stations = {str(i): {"id": i, "status_code": "E"} for i in (1, 2, 3)}
+    afdc_refresh.save_store({"last_updated": "t1", "reconciled_at": NOW, "stations": stations})
+    return live
+
+def stored_ids():
+    return sorted(int(k) for k in afdc_refresh.load_store()["stations"])
+
+def test_count_drift_reconciles_deleted_station(afdc):
+    assert afdc_refresh.refresh("key")
+    assert stored_ids() == [1, 3]
+    assert afdc_refresh.load_store()["stations"]["1"]["station_name"] == "new"
+    assert afdc["pulls"][-1] == {"fields": "id"}
+    assert [s["id"] for s in json.load(open(afdc_refresh.OUT_JSON))["fuel_stations"]] == [1, 3]
+
+def test_no_drift_skips_id_pull(afdc):
+    afdc["open"][2] = "E"
+    afdc_refresh.refresh("key")
+    assert stored_ids() == [1, 2, 3]
+    assert all("fields" not in (p or {}) for p in afdc["pulls"])
+
+def test_overdue_reconcile_runs_without_drift(afdc):
+    store = afdc_refresh.load_store()
+    afdc_refresh.save_store(dict(store, reconciled_at="2020-01-01T00:00:00+00:00"))
+    afdc["open"] = {1: "E", 3: "E", 4: "E"}       # same count, station 2 replaced by 4
+    afdc_refresh.refresh("key")
+    assert stored_ids() == [1, 3]
+    assert afdc_refresh.load_store()["reconciled_at"] > "2020"
@@ -0,0 +1,59 @@
+# tests/test_api.py
+# Query API: parameter validation and cache consistency across reloads, on a
+# small in-memory store (no processed files needed).
+import json
+
+import pandas as pd
+import pytest
+
+import api
+
+def make_store(n: int, name: str = "Station") -> api.Store:
+    stations = pd.DataFrame({
+        "id": range(1, n + 1), "station_name": [f"{name} {i}" for i in range(1, n + 1)],
+        "city": "Fresno", "zip": "93701", "county": "Fresno", "ev_network": "Tesla",
+        "latitude": 36.7, "longitude": -119.8, "level2_ports": 2, "dcfc_ports": range(n),
+    })
+    stations["total_ports"] = stations["level2_ports"] + stations["dcfc_ports"]
+    stations["likely_busy_score"] = stations["dcfc_ports"].astype(float)
+    counties = pd.DataFrame({"county": ["Fresno"], "ports_total": [int(stations["total_ports"].sum())]})
+    return api.Store(stations[api.STATION_FIELDS], counties, counties)
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(api, "watched_files", lambda: [])
+    monkeypatch.setattr(api.Store, "load", classmethod(lambda cls: make_store(10)))
+    return api.App(cache_size=16)
+
+def get(app, target):
+    status, body, _ = app.respond(target)
+    return status, json.loads(body)
+
+@pytest.mark.parametrize("target", [
+    "/stations?offset=-1", "/stations?limit=-5", "/stations?limit=0",
+    "/top?n=0", "/top?n=-3", "/stations?limit=abc",
+])
+def test_out_of_range_parameters_are_rejected(app, target):
+    status, payload = get(app, target)
+    assert status == 400 and "error" in payload
+
+def test_paging(app):
+    status, payload = get(app, "/stations?limit=3&offset=8")
+    assert status == 200 and [r["id"] for r in payload["results"]] == [9, 10]
+    assert [r["id"] for r in get(app, "/top?n=2")[1]["results"]] == [10, 9]
+
+def test_request_in_flight_during_reload_does_not_cache_old_data(app, monkeypatch):
+    monkeypatch.setattr(api.Store, "load", classmethod(lambda cls: make_store(4, "Reloaded")))
+    route = app.route
+
+    def reload_mid_request(path, qs, store):
+        payload = route(path, qs, store)      # answered from the old snapshot ...
+        app.mtimes = None                     # ... while the files change and a reload lands
+        assert app.maybe_reload()
+        return payload
+    monkeypatch.setattr(app, "route", reload_mid_request)
+    assert get(app, "/stations")[1]["count"] == 10
+
+    monkeypatch.setattr(app, "route", route)
+    payload = get(app, "/stations")[1]
+    assert payload["count"] == 4 and payload["results"][0]["station_name"] == "Reloaded 1"
@@ -0,0 +1,43 @@
+# tests/test_availability.py
+# access_days_time parsing: weekly public hours of common AFDC strings.
+import pytest
+
+from availability import parse, public_hours_of
+
+@pytest.mark.parametrize("text, hours", [
+    ("24 hours daily", 168),
+    ("8am-5pm daily", 63),
+    ("6am-2am", 140),
+    ("MON: 7:00am-6:00pm; TUE: 7:00am-6:00pm; WED: 7:00am-6:00pm; THU: 7:00am-6:00pm; FRI: 7:00am-6:00pm", 55),
+    # two-letter day prefixes; "WE: closed" closes Wednesday only
+    ("MO: 6:00am-11:59pm; TU: 6:00am-11:59pm; WE: closed", 36),
+    ("FR: 8am-5pm", 9),
+    # no am/pm and the end before the start: the end is pm
+    ("8-5", 63),
+    ("Mon-Fri 8-5", 45),
+    ("22-2", 28),
+    # one range per day list
+    ("7am-7pm M-F, 8am-5pm Sat-Sun", 78),
+    ("M-F 7am-7pm, Sat-Sun 8am-5pm", 78),
+    ("8am-12pm, 1pm-5pm M-F", 40),
+    # closures
+    ("Closed", 0),
+    ("Temporarily closed", 0),
+    ("Closed Sun", 144),
+    ("8am-6pm; closed weekends", 50),
+    ("24 hours daily; closed on holidays", 168),
+    ("XX: closed", 168),
+    # phone numbers are not hours
+    ("Dealership business hours; 916-969-5700", 50),
+    ("Fleet use only", 0),
+])
+def test_public_hours(text, hours):
+    assert public_hours_of(text) == hours
+
+def test_flags():
+    _, flags = parse("Dealership business hours")
+    assert flags["hours_assumed"] and not flags["hours_known"]
+    _, flags = parse("")
+    assert not flags["hours_known"] and not flags["restricted"]
+    _, flags = parse("24 hours daily; pay lot")
+    assert flags["hours_known"] and flags["pay_lot"]
@@ -0,0 +1,38 @@
+# tests/test_cleaning.py
+# cleaning.STATION_RULES must clean exactly like the original row-wise clean_stations.
+import pandas as pd
+
+import make_kpis
+
+def legacy_clean_stations(df: pd.DataFrame) -> pd.DataFrame:
+    """make_kpis.clean_stations before cleaning.STATION_RULES (row-wise applies)."""
+    df = df.copy()
+    for c in ["latitude", "longitude", "ev_dc_fast_num", "ev_level2_evse_num"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    def norm_county(x):
+        if pd.isna(x):
+            return x
+        x = str(x).strip()
+        if x.lower().endswith(" county"):
+            x = x[:-7]
+        return x.title()
+    df["county"] = df["county"].apply(norm_county)
+    df = df.dropna(subset=["latitude", "longitude"])
+    df["ev_dc_fast_num"] = df["ev_dc_fast_num"].fillna(0).astype(int)
+    df["ev_level2_evse_num"] = df["ev_level2_evse_num"].fillna(0).astype(int)
+    df["ev_connector_types"] = df["ev_connector_types"].fillna("").astype(str)
+
+    def title_or_na(x):
+        if pd.isna(x) or str(x).strip() == "":
+            return pd.NA
+        return str(x).strip().title()
+    df["county"] = df["county"].apply(title_or_na)
+    df["city"] = df["city"].apply(title_or_na)
+    df["region"] = df["county"]
+    df.loc[df["region"].isna(), "region"] = df["city"]
+    return df
+
+def test_rule_cleaning_matches_legacy(raw_stations):
+    cleaned = make_kpis.clean_stations(raw_stations)
+    assert cleaned.to_csv(index=False) == legacy_clean_stations(raw_stations).to_csv(index=False)
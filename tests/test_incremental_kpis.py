@@ -0,0 +1,51 @@
+# tests/test_incremental_kpis.py
+# Folding snapshot deltas into the rollups must give the tables of a full recompute.
+# Snapshots and rollup state go to a temp directory.
+import numpy as np
+import pandas as pd
+
+import synth_stations as synth
+import make_kpis
+import snapshots
+import incremental_kpis
+from make_county_supply import normalize_ev_counts
+
+N = 3_000
+
+def _edit(stations: pd.DataFrame, seed: int = 1) -> pd.DataFrame:
+    """Next pull: some stations gone, some port counts / ZIPs / hours changed, some new."""
+    rng = np.random.default_rng(seed)
+    df = stations[rng.random(len(stations)) >= 0.02].copy()
+    bump = rng.random(len(df)) < 0.05
+    df.loc[bump, "ev_level2_evse_num"] += 2
+    df.loc[rng.random(len(df)) < 0.03, "ev_dc_fast_num"] = 0
+    df.loc[rng.random(len(df)) < 0.02, "zip"] = "90000"
+    df.loc[rng.random(len(df)) < 0.02, "access_days_time"] = "8am-5pm daily"
+    new = synth.make_stations(50, seed=seed)
+    new["id"] += 10_000_000
+    new = make_kpis.clean_stations(synth.to_raw_frame(new))
+    return pd.concat([df, new], ignore_index=True)
+
+def test_incremental_kpis_match_full_recompute(tmp_path, monkeypatch):
+    snap, rollups = tmp_path / "snapshots", tmp_path / "rollups"
+    for name, path in {"SNAP_DIR": snap, "MANIFEST": snap / "manifest.json", "HEAD": snap / "head.parquet",
+                       "ROLLUP_STATE": snap / "rollup_state.parquet"}.items():
+        monkeypatch.setattr(snapshots, name, path)
+    for name, path in {"ROLLUP_DIR": rollups, "STATE": rollups / "state.json",
+                       "PROJECTION": rollups / "stations.parquet",
+                       "METRICS": rollups / "county_metrics.parquet"}.items():
+        monkeypatch.setattr(incremental_kpis, name, path)
+    xw, ev = synth.make_zip_xwalk(), normalize_ev_counts(synth.make_ev_counts())
+
+    v1 = make_kpis.clean_stations(synth.to_raw_frame(synth.make_stations(N)))
+    snapshots.record(v1, taken_at="2026-01-01T00:00:00+00:00")
+    incremental_kpis.Rollups.build(incremental_kpis.head_stations(), ev, xw, version=1).save()
+
+    v2 = _edit(v1)
+    snapshots.record(v2, taken_at="2026-02-01T00:00:00+00:00")
+    roll = incremental_kpis.Rollups.load(xw)
+    roll.apply(snapshots.load_delta(2))
+    assert incremental_kpis.check(roll, incremental_kpis.head_stations(), ev) == []
+
+    roll.save()   # the persisted state reloads to the same tables
+    assert incremental_kpis.check(incremental_kpis.Rollups.load(xw), incremental_kpis.head_stations(), ev) == []
@@ -0,0 +1,38 @@
+# tests/test_insight_rules.py
+# Top-N insight tables: rows tied at the cut-off are chosen by the rule's tie-break
+# column, whatever order the source rows come in.
+import numpy as np
+import pandas as pd
+
+from insight_rules import RULES, STATION_COLS, evaluate, select
+
+def stations(seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = 500
+    df = pd.DataFrame({c: "x" for c in STATION_COLS}, index=range(n))
+    df["id"] = np.arange(1, n + 1)
+    df["ev_dc_fast_num"] = rng.integers(0, 5, n)          # many ties at every value
+    df["ev_level2_evse_num"] = rng.integers(0, 5, n)
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def test_station_rules_break_ties_by_id():
+    rules = [r for r in RULES if r["output"].startswith("likely_busy_top_stations")]
+    a = evaluate(rules, {"stations": stations(0)})
+    b = evaluate(rules, {"stations": stations(0).iloc[::-1]})
+    for r in rules:
+        top = a[r["output"]]
+        assert top["id"].tolist() == b[r["output"]]["id"].tolist()
+        metric = top[r["by"][0]]
+        assert metric.is_monotonic_decreasing
+        for _, ids in top.groupby(metric, sort=False)["id"]:
+            assert ids.is_monotonic_increasing
+        cut = metric.iloc[-1]       # the tied rows kept at the cut-off are the lowest ids
+        pool = stations(0).assign(total_ports=lambda d: d["ev_level2_evse_num"] + d["ev_dc_fast_num"])
+        tied = np.sort(pool.loc[pool[r["by"][0]] == cut, "id"].to_numpy())
+        kept = top.loc[metric == cut, "id"].to_numpy()
+        assert kept.tolist() == tied[:len(kept)].tolist()
+
+def test_select_mixed_directions_is_stable():
+    df = pd.DataFrame({"a": [1, 1, 2, 2], "b": [5, 5, 5, 6], "k": [3, 1, 2, 0]})
+    out = select(df, ["a", "b"], [True, False], 3)
+    assert out["k"].tolist() == [3, 1, 0]
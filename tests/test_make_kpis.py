@@ -0,0 +1,38 @@
+# tests/test_make_kpis.py
+# Chunked (out-of-core) make_kpis must write exactly what the in-memory build does,
+# with one worker or several. Inputs come from the synthetic generator.
+import functools
+import pandas as pd
+import pytest
+
+import make_kpis
+from processed_store import TableWriter, read_table
+
+def as_csv(df: pd.DataFrame) -> str:
+    return df.to_csv(index=False)
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_chunked_make_kpis_matches_in_memory(tmp_path, monkeypatch, raw_stations, workers):
+    raw_csv = tmp_path / "afdc_stations_ca.csv"
+    raw_stations.to_csv(raw_csv, index=False)
+    full = make_kpis.build_kpis(make_kpis.load_raw(raw_csv))
+
+    out = tmp_path / "processed"
+    out.mkdir()   # main() creates PROCESSED_DIR
+    monkeypatch.setattr(make_kpis, "PORTS_OUT", out / "ports_ca.csv")
+    monkeypatch.setattr(make_kpis, "PORTS_EXPANDED_OUT", out / "ports_ca_expanded.csv")
+    monkeypatch.setattr(make_kpis, "TableWriter", functools.partial(TableWriter, root=out))
+    chunked = make_kpis.build_kpis_chunked(raw_csv, chunk_rows=700, workers=workers, expanded_ports=True)
+
+    for name in ["county_summary", "region_summary"]:
+        assert as_csv(chunked[name]) == as_csv(full[name])
+    assert (out / "ports_ca.csv").read_text() == as_csv(full["ports"])
+    assert chunked["ports_rows"] == len(full["ports"])
+    assert chunked["expanded_rows"] == full["ports"]["ports"].sum()
+    stations = read_table("stations_ca", root=out)
+    assert stations.equals(read_table("stations_ca", root=_write_stations(full["stations"], tmp_path / "full")))
+
+def _write_stations(df: pd.DataFrame, root):
+    with TableWriter("stations_ca", root=root) as w:
+        w.write(df)
+    return root
@@ -0,0 +1,31 @@
+# tests/test_sql_engine.py
+# sql/kpis.sql must compute the tables the pandas stages write, on a station table
+# with many counties (the AFDC county field is blank for CA, so the real data has one).
+import numpy as np
+
+import make_kpis
+import sql_engine
+from insight_rules import RULES, evaluate
+from processed_store import STATIONS_SCHEMA, conform
+
+def test_kpis_sql_matches_pandas(raw_stations):
+    stations = conform(make_kpis.clean_stations(raw_stations), STATIONS_SCHEMA)
+    conn = sql_engine.connect()
+    sql_engine.load_stations(conn, stations)
+    results = sql_engine.run_sql_file(conn, sql_engine.SQL_DIR / "kpis.sql")
+
+    county = make_kpis.make_county_summary(stations)
+    assert county["county"].nunique() > 20
+    sql_county = results["data/processed/ev_summary_by_county.csv"]
+    assert list(sql_county.columns) == list(county.columns)
+    assert sql_engine.check_parity(sql_county, county).empty
+
+    rule = next(r for r in RULES if r["output"] == "top10_dcfc_share.csv")
+    top10 = evaluate([rule], {"county_summary": county})[rule["output"]]
+    sql_top10 = results["data/processed/insights/top10_dcfc_share.csv"]
+    assert list(sql_top10.columns) == list(top10.columns)
+    assert sql_top10["county"].tolist() == top10["county"].tolist()
+    for c in ["level2_ports", "dcfc_ports", "ports_total"]:
+        assert sql_top10[c].tolist() == top10[c].tolist()
+    assert np.allclose(sql_top10["dcfc_share"], top10["dcfc_share"])
+    assert np.allclose(sql_top10["effective_ports"], top10["effective_ports"], atol=0.051)